@@ -3,6 +3,7 @@ import { Card, Button, Select, Table, Progress, Alert, Spin, Tag, Space, message
 import { RobotOutlined, PlayCircleOutlined, CheckCircleOutlined, ExclamationCircleOutlined } from '@ant-design/icons';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, RadarChart, PolarGrid, PolarAngleAxis, PolarRadiusAxis, Radar } from 'recharts';
 import axios from 'axios';
+import { io } from 'socket.io-client';
 
 const { Option } = Select;
 
@@ -13,6 +14,35 @@ const ModelTraining = () => {
   const [trainingProgress, setTrainingProgress] = useState(0);
   const [trainingResults, setTrainingResults] = useState(null);
   const [error, setError] = useState(null);
+  const [modelStatus, setModelStatus] = useState({});
+
+  useEffect(() => {
+    // Per-model progress streamed by the server while training runs
+    const socket = io('http://localhost:5000');
+
+    socket.on('training_progress', (progress) => {
+      if (progress.event === 'training_started') {
+        setModelStatus(Object.fromEntries(progress.models.map(model => [model, { status: 'queued' }])));
+        return;
+      }
+      if (!progress.model) return;
+      const status = {
+        model_started: 'training',
+        model_finished: 'done',
+        model_failed: 'failed',
+      }[progress.event];
+      setModelStatus(prev => {
+        const next = { ...prev, [progress.model]: { status, seconds: progress.seconds, error: progress.error } };
+        const models = Object.values(next);
+        const finished = models.filter(m => m.status === 'done' || m.status === 'failed').length;
+        // The ensemble is built after the last model, so stop short of 100 until the response
+        setTrainingProgress(Math.round((finished / models.length) * 95));
+        return next;
+      });
+    });
+
+    return () => socket.close();
+  }, []);
 
   useEffect(() => {
     // In a real app, you'd fetch available files from the server
@@ -31,19 +61,9 @@ const ModelTraining = () => {
 
     setTraining(true);
     setTrainingProgress(0);
+    setModelStatus({});
     setError(null);
 
-    // Simulate progress updates
-    const progressInterval = setInterval(() => {
-      setTrainingProgress(prev => {
-        if (prev >= 90) {
-          clearInterval(progressInterval);
-          return 90;
-        }
-        return prev + 10;
-      });
-    }, 500);
-
     try {
       const response = await axios.post('http://localhost:5000/train', {
         filename: selectedFile
@@ -56,7 +76,6 @@ const ModelTraining = () => {
       setError('Training failed: ' + (err.response?.data?.error || err.message));
       message.error('Training failed');
     } finally {
-      clearInterval(progressInterval);
       setTraining(false);
     }
   };
@@ -215,6 +234,18 @@ const ModelTraining = () => {
               <p style={{ textAlign: 'center', marginTop: 8 }}>
                 Training machine learning models... This may take several minutes.
               </p>
+              <Space wrap>
+                {Object.entries(modelStatus).map(([model, state]) => (
+                  <Tag
+                    key={model}
+                    color={{ queued: 'default', training: 'processing', done: 'success', failed: 'error' }[state.status]}
+                    icon={state.status === 'done' ? <CheckCircleOutlined /> : state.status === 'failed' ? <ExclamationCircleOutlined /> : null}
+                  >
+                    {model.replace('_', ' ').toUpperCase()}
+                    {state.seconds != null && ` (${state.seconds.toFixed(1)}s)`}
+                  </Tag>
+                ))}
+              </Space>
             </div>
           )}
         </Space>
@@ -51,10 +51,10 @@ const NetworkCapture = () => {
     });
 
     // Real-time data events
-    newSocket.on('network_data', (data) => {
-      console.log('Received network data:', data);
+    newSocket.on('network_frame', (frame) => {
+      // Frames carry the latest events of the interval, oldest first
       setNetworkData(prev => {
-        const newData = [data, ...prev].slice(0, 100);
+        const newData = [...frame.events].reverse().concat(prev).slice(0, 100);
         return newData;
       });
     });
@@ -37,10 +37,10 @@ const RealTimeMonitoring = () => {
     });
 
     // Real-time data events
-    newSocket.on('network_data', (data) => {
-      console.log('Received network data:', data);
+    newSocket.on('network_frame', (frame) => {
+      // Frames carry the latest events of the interval, oldest first
       setNetworkData(prev => {
-        const newData = [data, ...prev].slice(0, 100); // Keep last 100 records
+        const newData = [...frame.events].reverse().concat(prev).slice(0, 100); // Keep last 100 records
         return newData;
       });
     });
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+DEFAULT_SIGNATURE = ('type', 'source', 'src_ip', 'dst_ip', 'dst_port', 'threat_level')
+
+
+class _AlertGroup:
+    """Running roll-up for one alert signature"""
+
+    __slots__ = ('first_seen', 'last_seen', 'count', 'pending', 'max_probability', 'latest')
+
+    def __init__(self, alert, now):
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 1
+        self.pending = 0  # Suppressed since the last alert sent for this signature
+        self.max_probability = alert.get('probability', 0.0)
+        self.latest = alert
+
+
+class AlertAggregator:
+    """Deduplicates alerts by signature and sends periodic roll-ups instead.
+
+    The first alert for a signature (by default type, source, src/dst
+    address, destination port and threat level) goes out immediately.
+    Repeats within ``window_seconds`` of the last one are suppressed and
+    counted; every ``rollup_interval`` seconds each signature with suppressed
+    repeats gets one roll-up alert carrying count, first_seen, last_seen and
+    max_probability. A signature idle for a whole window is closed (with a
+    final roll-up if needed), so the next alert for it goes out again.
+
+    ``add`` is O(1): a dict lookup and an ordered-dict move. Groups are kept
+    in last-seen order, so expiry only touches closed groups, and at most
+    ``max_signatures`` are tracked.
+    """
+
+    def __init__(self, on_emit, signature=DEFAULT_SIGNATURE, window_seconds=30.0,
+                 rollup_interval=5.0, max_signatures=10000, enabled=True):
+        self.on_emit = on_emit
+        self.signature = tuple(signature)
+        self.window_seconds = float(window_seconds)
+        self.rollup_interval = float(rollup_interval)
+        self.max_signatures = int(max_signatures)
+        self.enabled = enabled
+        self.groups = OrderedDict()  # signature -> _AlertGroup, least recently seen first
+        self.dirty = set()  # Signatures with suppressed alerts awaiting a roll-up
+        self.last_rollup = None
+        self.lock = threading.Lock()
+        self.stats = {'received': 0, 'emitted': 0, 'suppressed': 0, 'rollups': 0}
+
+    def _signature_of(self, alert):
+        data = alert.get('data') or {}
+        return tuple(alert[field] if field in alert else data.get(field) for field in self.signature)
+
+    def add(self, alert, now=None):
+        """Record an alert; it is sent right away unless its signature is being suppressed"""
+        now = now or time.time()
+        with self.lock:
+            self.stats['received'] += 1
+            if not self.enabled:
+                self.stats['emitted'] += 1
+                send = [alert]
+            else:
+                send = []
+                key = self._signature_of(alert)
+                group = self.groups.get(key)
+                if group is not None and now - group.last_seen >= self.window_seconds:
+                    self._close(key, send)
+                    group = None
+
+                if group is None:
+                    self.groups[key] = _AlertGroup(alert, now)
+                    if len(self.groups) > self.max_signatures:
+                        self._close(next(iter(self.groups)), send)
+                    self.stats['emitted'] += 1
+                    send.append(dict(alert, count=1, first_seen=self._iso(now), last_seen=self._iso(now)))
+                else:
+                    group.count += 1
+                    group.pending += 1
+                    group.last_seen = now
+                    group.latest = alert
+                    probability = alert.get('probability', 0.0)
+                    if probability > group.max_probability:
+                        group.max_probability = probability
+                    self.groups.move_to_end(key)
+                    self.dirty.add(key)
+                    self.stats['suppressed'] += 1
+        self._send(send)
+        return bool(send)
+
+    def tick(self, now=None):
+        """Send due roll-ups and close idle signatures; call this periodically"""
+        now = now or time.time()
+        if self.last_rollup is not None and now - self.last_rollup < self.rollup_interval:
+            return
+        send = []
+        with self.lock:
+            self.last_rollup = now
+            while self.groups:
+                key, group = next(iter(self.groups.items()))
+                if now - group.last_seen < self.window_seconds:
+                    break
+                self._close(key, send)
+            for key in self.dirty:
+                send.append(self._rollup(key, self.groups[key]))
+            self.dirty.clear()
+        self._send(send)
+
+    def flush(self):
+        """Send roll-ups for everything still suppressed and forget all signatures"""
+        send = []
+        with self.lock:
+            for key in list(self.groups):
+                self._close(key, send)
+        self._send(send)
+
+    def _close(self, key, send):
+        group = self.groups.pop(key)
+        if key in self.dirty:
+            self.dirty.discard(key)
+            send.append(self._rollup(key, group))
+
+    def _rollup(self, key, group):
+        suppressed, group.pending = group.pending, 0
+        self.stats['rollups'] += 1
+        alert = dict(group.latest)
+        alert.update({
+            'id': f"rollup-{self.stats['rollups']}",
+            'aggregated': True,
+            'signature': dict(zip(self.signature, key)),
+            'count': group.count,
+            'suppressed': suppressed,
+            'first_seen': self._iso(group.first_seen),
+            'last_seen': self._iso(group.last_seen),
+            'max_probability': group.max_probability,
+            'probability': group.max_probability,
+            'message': (f"{group.latest.get('message', 'Alert')} "
+                        f"(x{group.count} since {self._iso(group.first_seen)})")
+        })
+        return alert
+
+    @staticmethod
+    def _iso(timestamp):
+        return datetime.fromtimestamp(timestamp).isoformat()
+
+    def _send(self, alerts):
+        # Outside the lock: emission goes over the network
+        for alert in alerts:
+            try:
+                self.on_emit(alert)
+            except Exception as e:
+                print(f"Alert emission error: {e}")
+
+    def configure(self, signature=None, window_seconds=None, rollup_interval=None,
+                  max_signatures=None, enabled=None):
+        """Change the aggregation settings; a new signature starts from a clean slate"""
+        if signature is not None and tuple(signature) != self.signature:
+            self.flush()
+        with self.lock:
+            if signature is not None:
+                self.signature = tuple(signature)
+            if window_seconds is not None:
+                self.window_seconds = max(0.0, float(window_seconds))
+            if rollup_interval is not None:
+                self.rollup_interval = max(0.1, float(rollup_interval))
+            if max_signatures is not None:
+                self.max_signatures = max(1, int(max_signatures))
+            if enabled is not None:
+                self.enabled = bool(enabled)
+
+    def get_stats(self):
+        """Get settings, counters and how many signatures are open"""
+        with self.lock:
+            received = self.stats['received']
+            return dict(
+                self.stats,
+                enabled=self.enabled,
+                signature=list(self.signature),
+                window_seconds=self.window_seconds,
+                rollup_interval=self.rollup_interval,
+                max_signatures=self.max_signatures,
+                open_signatures=len(self.groups),
+                reduction=1.0 - (self.stats['emitted'] + self.stats['rollups']) / received if received else 0.0
+            )
@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class AlertStore:
+    """Persists alerts to the ``alerts`` table without blocking the caller.
+
+    ``record`` assigns the alert its id (monotonic across restarts, continuing
+    from the highest stored one) and queues it; a writer thread inserts
+    queued alerts in batches of up to ``batch_size`` every
+    ``flush_interval`` seconds. If SQLite falls behind by more than
+    ``max_pending`` alerts the oldest unwritten ones are dropped and counted.
+    """
+
+    def __init__(self, db, batch_size=500, flush_interval=0.5, max_pending=100000):
+        self.db = db
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.pending = deque(maxlen=int(max_pending))
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.next_id = db.get_max_alert_id() + 1
+        self.writing = 0
+        self.thread = None
+        self.stats = {'recorded': 0, 'written': 0, 'batches': 0, 'dropped': 0, 'write_errors': 0}
+
+    @staticmethod
+    def _to_row(alert_id, recorded_at, alert):
+        data = alert.get('data') or {}
+        try:
+            dst_port = int(data.get('dst_port'))
+        except (TypeError, ValueError):
+            dst_port = None
+        return (
+            alert_id,
+            recorded_at,
+            alert.get('type', 'model'),
+            alert.get('source', 'streaming'),
+            alert.get('threat_level'),
+            alert.get('probability'),
+            data.get('src_ip'),
+            data.get('dst_ip'),
+            dst_port,
+            alert.get('message'),
+            json.dumps(alert, default=str)
+        )
+
+    def record(self, alert):
+        """Give an alert its id and queue it for writing; returns the alert with the id set"""
+        with self.lock:
+            alert = dict(alert, id=self.next_id)
+            self.next_id += 1
+            if len(self.pending) == self.pending.maxlen:
+                self.stats['dropped'] += 1
+            self.pending.append((alert['id'], time.time(), alert))
+            self.stats['recorded'] += 1
+            if len(self.pending) >= self.batch_size:
+                self.wake.notify()
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._writer_loop)
+            self.thread.daemon = True
+            self.thread.start()
+        return alert
+
+    def _writer_loop(self):
+        while True:
+            with self.lock:
+                if len(self.pending) < self.batch_size:
+                    self.wake.wait(self.flush_interval)
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.batch_size))]
+                self.writing = len(batch)
+            if not batch:
+                continue
+            try:
+                self.db.save_alerts([self._to_row(*entry) for entry in batch])
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                print(f"Alert store write error: {e}")
+            finally:
+                with self.lock:
+                    self.writing = 0
+                    self.wake.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Wait until everything recorded so far is written (or ``timeout`` passes)"""
+        deadline = time.time() + timeout
+        with self.lock:
+            self.wake.notify_all()
+            while (self.pending or self.writing) and time.time() < deadline:
+                self.wake.wait(max(0.0, deadline - time.time()))
+
+    def query(self, start=None, end=None, host=None, threat_level=None, dst_port=None,
+              cursor=None, limit=50):
+        """Query stored alerts; returns (alerts, next_cursor)"""
+        return self.db.query_alerts(start, end, host, threat_level, dst_port, cursor,
+                                    max(1, min(int(limit), 1000)))
+
+    def count(self, start=None):
+        """Alerts recorded (at or after ``start``, a Unix time), including ones not yet written"""
+        with self.lock:
+            pending = sum(1 for _, recorded_at, _ in self.pending
+                          if start is None or recorded_at >= start)
+        return self.db.count_alerts(start) + pending
+
+    def get_stats(self):
+        """Get write counters and how many alerts are waiting"""
+        with self.lock:
+            return dict(self.stats, pending=len(self.pending), next_id=self.next_id)
@@ -1,17 +1,20 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import pandas as pd
 import numpy as np
 import joblib
 import os
+import multiprocessing
 from datetime import datetime
 import json
-from data_preprocessor import DataPreprocessor
-from ml_models import MLModels
 from database import Database
+from alert_store import AlertStore
 from realtime_processor import RealTimeProcessor
 from network_capture import NetworkCapture
+from emitter import EventEmitter
+from model_bundle import list_bundles, memory_usage
+from model_manager import ModelManager
 
 app = Flask(__name__)
 CORS(app)
@@ -26,12 +29,27 @@ app.config['MODEL_FOLDER'] = 'models'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['MODEL_FOLDER'], exist_ok=True)
 
-# Initialize components
-db = Database()
-preprocessor = DataPreprocessor()
-ml_models = MLModels()
-realtime_processor = RealTimeProcessor(ml_models, preprocessor, socketio)
-network_capture = NetworkCapture(socketio, ml_models, preprocessor)
+# Components, created by init_components()
+db = model_manager = alert_store = emitter = realtime_processor = network_capture = None
+
+def init_components():
+    """Initialize the database, model manager, alert store and processors, and warm-start the models"""
+    global db, model_manager, alert_store, emitter, realtime_processor, network_capture
+    db = Database()
+    # Live scoring always uses the manager's active model version; retraining swaps in a new one
+    model_manager = ModelManager(db, app.config['MODEL_FOLDER'])
+    alert_store = AlertStore(db)
+    emitter = EventEmitter(socketio, alert_store=alert_store)
+    realtime_processor = RealTimeProcessor(None, None, socketio, emitter, model_manager=model_manager)
+    network_capture = NetworkCapture(socketio, None, None, emitter, model_manager=model_manager)
+    
+    # Warm start: load the active (or newest) saved version, memory-mapped so workers share its arrays
+    model_manager.warm_start()
+
+# Spawned training and capture workers import the entry script (this module or run.py) again
+# before they run, under their own process name: only the server process sets up components
+if multiprocessing.current_process().name == 'MainProcess':
+    init_components()
 
 @app.route('/')
 def index():
@@ -89,21 +107,32 @@ def train_models():
         if not os.path.exists(filepath):
             return jsonify({"error": "File not found"}), 404
         
-        # Preprocess data
-        X_train, X_test, y_train, y_test = preprocessor.preprocess_data(filepath)
-        
-        # Train models
-        results = ml_models.train_all_models(X_train, X_test, y_train, y_test)
-        
-        # Save models
-        ml_models.save_models(app.config['MODEL_FOLDER'])
+        # Train models in parallel; per-model progress goes out as 'training_progress' events
+        def on_progress(event, progress):
+            socketio.emit('training_progress', dict(progress, event=event, filename=filename))
+        
+        # Trained as a new model version; live scoring keeps using the active one until it's swapped in
+        results, manifest = model_manager.train(
+            filepath,
+            metadata={'dataset': filename},
+            activate=data.get('activate', True),
+            out_of_core=data.get('out_of_core'),  # Default: chunked training for files over 512 MB
+            chunk_size=data.get('chunk_size', 100000),  # Rows per chunk; bounds out-of-core memory
+            n_workers=data.get('n_workers'),
+            n_jobs=data.get('n_jobs'),
+            on_progress=on_progress,
+            ensemble=data.get('ensemble'),  # e.g. {"method": "stacking"} or {"tune_weights": true}
+            cascade=data.get('cascade')  # e.g. {"first_stage": "decision_tree", "max_accuracy_loss": 0.005}
+        )
         
         # Store training results in database
         db.save_training_results(filename, results)
         
         return jsonify({
             "message": "Models trained successfully",
-            "results": results
+            "results": results,
+            "bundle_version": manifest['version'],
+            "active_version": model_manager.current().version
         })
         
     except Exception as e:
@@ -126,14 +155,17 @@ def predict_threats():
         
         # Load and preprocess data
         df = pd.read_csv(filepath)
+        ml_models, preprocessor = model_manager.snapshot()
         X_processed = preprocessor.transform_data(df)
         
-        # Make predictions
-        predictions = ml_models.predict(X_processed, model_type)
+        # Labels and probabilities from a single pass over the model(s)
+        scored = ml_models.score(X_processed, model_type)
+        predictions = scored['labels']
+        probabilities = scored['probabilities']
         
         # Add predictions to original data
         df['threat_prediction'] = predictions
-        df['threat_probability'] = ml_models.predict_proba(X_processed, model_type)
+        df['threat_probability'] = probabilities[:, 1]
         df['timestamp'] = datetime.now().isoformat()
         
         # Store results
@@ -149,7 +181,9 @@ def predict_threats():
         
         return jsonify({
             "predictions": predictions.tolist(),
-            "probabilities": ml_models.predict_proba(X_processed, model_type).tolist(),
+            "probabilities": probabilities.tolist(),
+            "timings_ms": scored['timings_ms'],
+            "escalated_fraction": scored.get('escalated_fraction'),
             "summary": threat_summary,
             "detailed_data": df.head(100).to_dict('records')  # Return first 100 records
         })
@@ -161,11 +195,63 @@ def predict_threats():
 def get_available_models():
     """Get list of available trained models"""
     try:
-        models = ml_models.get_available_models(app.config['MODEL_FOLDER'])
+        models = model_manager.current().ml_models.get_available_models(app.config['MODEL_FOLDER'])
         return jsonify({"models": models})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/models/bundle', methods=['GET'])
+def get_model_bundles():
+    """Get the bundle loaded at boot (with its time-to-ready), saved bundles and current memory"""
+    try:
+        return jsonify({
+            "loaded": model_manager.load_report,
+            "bundles": list_bundles(app.config['MODEL_FOLDER']),
+            "memory": memory_usage()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/models/versions', methods=['GET'])
+def get_model_versions():
+    """Get the registered model versions and which one is active"""
+    try:
+        return jsonify({"versions": model_manager.list_versions(), "status": model_manager.get_status()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/models/versions/<version>/activate', methods=['POST'])
+def activate_model_version(version):
+    """Swap a saved model version in for live scoring"""
+    try:
+        report = model_manager.activate(version)
+        return jsonify({"message": f"Model version {version} active", "activation": report})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/models/rollback', methods=['POST'])
+def rollback_model_version():
+    """Go back to the previously active model version (or the one given)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        report = model_manager.rollback(data.get('version'))
+        return jsonify({"message": f"Rolled back to model version {report.get('version')}",
+                        "activation": report})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/models/cascade', methods=['GET'])
+def get_cascade_stats():
+    """Get the confidence cascade's band, calibration and escalated share"""
+    try:
+        return jsonify(model_manager.current().ml_models.get_cascade_stats())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/history', methods=['GET'])
 def get_detection_history():
     """Get history of threat detections"""
@@ -193,6 +279,15 @@ def start_streaming():
         config = data.get('config', {})
         config.setdefault('interval', 1)  # Default 1 second interval
         
+        if config.get('mode') == 'replay':
+            filename = config.get('filename')
+            if not filename:
+                return jsonify({"error": "No filename provided"}), 400
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            if not os.path.exists(filepath):
+                return jsonify({"error": f"File {filename} not found in uploads folder"}), 404
+            config['path'] = filepath
+        
         result = realtime_processor.start_streaming(config)
         return jsonify(result)
         
@@ -219,13 +314,52 @@ def get_streaming_status():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/streaming/emission', methods=['GET', 'POST'])
+def streaming_emission():
+    """Get or change the Socket.IO frame rate and sample size"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            emitter.configure(data.get('rate_hz'), data.get('sample_size'))
+        return jsonify(emitter.get_stats())
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Alert System Endpoints
 @app.route('/alerts', methods=['GET'])
 def get_alerts():
-    """Get recent security alerts"""
+    """Query stored security alerts, newest first, with cursor pagination"""
+    try:
+        level = request.args.get('level')
+        alerts, next_cursor = alert_store.query(
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            host=request.args.get('host'),
+            threat_level=level.upper().split(',') if level else None,
+            dst_port=request.args.get('port', type=int),
+            cursor=request.args.get('cursor', type=int),
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return jsonify({"alerts": alerts, "next_cursor": next_cursor})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/alerts/aggregation', methods=['GET', 'POST'])
+def alert_aggregation():
+    """Get or change alert deduplication (signature fields, suppression window, roll-up interval)"""
     try:
-        alerts = realtime_processor.get_alerts()
-        return jsonify({"alerts": alerts})
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            emitter.alert_aggregator.configure(
+                signature=data.get('signature'),
+                window_seconds=data.get('window_seconds'),
+                rollup_interval=data.get('rollup_interval'),
+                max_signatures=data.get('max_signatures'),
+                enabled=data.get('enabled')
+            )
+        return jsonify(emitter.alert_aggregator.get_stats())
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -289,6 +423,52 @@ def get_capture_status():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/network/capture/events', methods=['GET'])
+def get_capture_events():
+    """Query recent scored capture events"""
+    try:
+        events = network_capture.get_events(
+            last=request.args.get('last', type=int),
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            min_probability=request.args.get('min_probability', type=float),
+            host=request.args.get('host')
+        )
+        return jsonify({"events": events})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/network/capture/inference', methods=['GET'])
+def get_capture_inference_status():
+    """Get batch sizes and queue depth of the capture scoring stage"""
+    try:
+        status = network_capture.get_inference_status()
+        return jsonify(status)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/network/capture/heavy-hitters', methods=['GET'])
+def get_capture_heavy_hitters():
+    """Get the heaviest sources, destinations and destination ports right now"""
+    try:
+        top = network_capture.get_heavy_hitters(request.args.get('k', 10, type=int))
+        return jsonify(top)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/network/capture/backpressure', methods=['GET'])
+def get_capture_backpressure():
+    """Get queue depth, lag and drop counters of the capture pipeline stages"""
+    try:
+        status = network_capture.get_backpressure_status()
+        return jsonify(status)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/network/capture/logfile', methods=['POST'])
 def set_capture_log_file():
     """Set log file for capture mode"""
@@ -299,7 +479,7 @@ def set_capture_log_file():
         if not log_file:
             return jsonify({"error": "Log file path required"}), 400
         
-        result = network_capture.set_log_file(log_file)
+        result = network_capture.set_log_file(log_file, data.get('format'), data.get('follow'))
         return jsonify(result)
         
     except Exception as e:
@@ -309,13 +489,34 @@ def set_capture_log_file():
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
+    _, room = emitter.subscribe(request.sid)
+    join_room(room)
     emit('connected', {'message': 'Connected to Intrusion Detection System'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
+    emitter.unsubscribe(request.sid)
     print('Client disconnected')
 
+@socketio.on('subscribe')
+def handle_subscribe(filters):
+    """Only receive frames matching the given threat_levels/protocols/hosts/sources"""
+    old_room, room = emitter.subscribe(request.sid, filters or {})
+    if old_room and old_room != room:
+        leave_room(old_room)
+    join_room(room)
+    emit('subscribed', {'room': room})
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe():
+    """Go back to the unfiltered stream"""
+    old_room, room = emitter.subscribe(request.sid)
+    if old_room and old_room != room:
+        leave_room(old_room)
+    join_room(room)
+    emit('subscribed', {'room': room})
+
 @socketio.on('get_status')
 def handle_get_status():
     """Handle status request"""
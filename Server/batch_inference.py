@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+
+from stage_queue import StageQueue, Empty
+
+
+class BatchScorer:
+    """Micro-batching stage between a producer (capture thread) and the models.
+
+    Items are put on a bounded queue; a worker thread collects them into
+    batches that are flushed when ``batch_size`` items are waiting or when the
+    oldest item has waited ``max_latency_ms``, whichever comes first. Each batch
+    is handed to ``score_fn`` in one call and every item's result is passed to
+    ``result_fn``. When the queue is full, ``overload_policy`` decides what
+    happens (see ``StageQueue``); with ``cheap_rules`` rejected items go to
+    ``shed_fn`` instead of the models.
+    """
+
+    def __init__(self, score_fn, result_fn, batch_size=512, max_latency_ms=20,
+                 queue_size=10000, overload_policy='drop_newest', shed_fn=None,
+                 name='scorer'):
+        self.score_fn = score_fn
+        self.result_fn = result_fn
+        self.batch_size = max(1, int(batch_size))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self.queue_size = int(queue_size)
+        self.overload_policy = overload_policy
+        self.name = name
+        self.queue = StageQueue(name, self.queue_size, overload_policy, on_shed=shed_fn)
+        self.is_running = False
+        self.worker_thread = None
+        self.recent_batch_sizes = deque(maxlen=100)
+        self.stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'scored': 0,
+            'batches': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+            'total_score_time': 0.0,
+            'total_queue_wait': 0.0
+        }
+
+    def start(self):
+        """Start the scoring worker"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.worker_thread = threading.Thread(target=self._worker_loop, name=self.name)
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+
+    def stop(self, timeout=5):
+        """Score everything already queued, then stop the worker"""
+        self.is_running = False
+        if self.worker_thread:
+            self.worker_thread.join(timeout=timeout)
+            self.worker_thread = None
+
+    def submit(self, item, block=False, key=None):
+        """Queue an item for scoring; returns False if the overload policy rejected it.
+
+        With ``block=True`` the caller waits for room instead (offline sources
+        that should be slowed down rather than lose data). ``key`` is the
+        item's flow key, used by the ``flow_sampled`` policy.
+        """
+        if self.queue.put(item, key=key, block=block):
+            self.stats['submitted'] += 1
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def wait_idle(self):
+        """Block until every queued item has been scored"""
+        self.queue.join()
+
+    def _worker_loop(self):
+        while self.is_running or not self.queue.empty():
+            try:
+                first = self.queue.get(timeout=0.1)
+            except Empty:
+                continue
+
+            batch = [first]
+            deadline = first[0] + self.max_latency
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                try:
+                    if remaining > 0:
+                        batch.append(self.queue.get(timeout=remaining))
+                    else:
+                        # Deadline passed: take only what is already waiting
+                        batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            try:
+                self._score(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _score(self, batch):
+        enqueued_times = [entry[0] for entry in batch]
+        items = [entry[1] for entry in batch]
+        started = time.time()
+
+        try:
+            results = self.score_fn(items)
+        except Exception as e:
+            print(f"Batch scoring error: {e}")
+            self.stats['errors'] += 1
+            return
+
+        finished = time.time()
+        size = len(items)
+        self.stats['batches'] += 1
+        self.stats['scored'] += size
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], size)
+        self.stats['total_score_time'] += finished - started
+        self.stats['total_queue_wait'] += sum(started - t for t in enqueued_times)
+        self.recent_batch_sizes.append(size)
+
+        for item, result in zip(items, results):
+            try:
+                self.result_fn(item, result)
+            except Exception as e:
+                print(f"Batch result handling error: {e}")
+
+    def get_stats(self):
+        """Get batching configuration, achieved batch sizes and queue depth"""
+        stats = dict(self.stats)
+        stage = self.queue.get_stats()
+        stats['dropped'] = stage['dropped']
+        stats['shed'] = stage['shed']
+        batches = stats['batches']
+        scored = stats['scored']
+        recent = list(self.recent_batch_sizes)
+        stats.update({
+            'is_running': self.is_running,
+            'batch_size': self.batch_size,
+            'max_latency_ms': self.max_latency * 1000.0,
+            'queue_size': self.queue_size,
+            'overload_policy': self.overload_policy,
+            'queue_depth': stage['depth'],
+            'lag_ms': stage['lag_ms'],
+            'avg_batch_size': scored / batches if batches else 0.0,
+            'recent_avg_batch_size': sum(recent) / len(recent) if recent else 0.0,
+            'avg_score_time_ms': stats['total_score_time'] / batches * 1000.0 if batches else 0.0,
+            'avg_queue_wait_ms': stats['total_queue_wait'] / scored * 1000.0 if scored else 0.0
+        })
+        return stats
@@ -0,0 +1,404 @@
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+
+from flow_table import FlowTable
+
+# Seconds the reader waits to hand a shard its stop marker before giving up on it
+SHUTDOWN_TIMEOUT = 5.0
+
+
+def client_ip(packet_info):
+    """Address of the connection's client, the same for both directions of a flow.
+
+    The client is the endpoint on the higher (ephemeral) port; for ICMP the
+    sender of an echo request, which replies and errors are returned to.
+    """
+    src, dst = packet_info.get('src_ip'), packet_info.get('dst_ip')
+    if packet_info.get('transport_protocol') == 'ICMP':
+        return src if packet_info.get('icmp_type', 8) in (8, 128) else dst
+    src_port, dst_port = packet_info.get('src_port') or 0, packet_info.get('dst_port') or 0
+    if src_port != dst_port:
+        return src if src_port > dst_port else dst
+    return min(str(src), str(dst))
+
+
+def shard_for(packet_info, num_shards):
+    """Shard by client address: a flow's two directions, and all of a source's
+    connections, map to the same shard"""
+    return zlib.crc32(str(client_ip(packet_info)).encode()) % num_shards
+
+
+class ShardedCapture:
+    """Multi-process capture.
+
+    A reader process only decodes frames (live interface or pcap files) and
+    dispatches each packet to one of ``num_shards`` worker processes by a
+    hash of the connection's client address. Every worker anonymizes its
+    packets and runs its own flow table, traffic window, pre-ML detectors
+    and model copy, and sends scored results back to the main process, where
+    ``on_result`` publishes them; detector alerts go to ``on_alert``.
+
+    Sharding by client keeps a source's connections in one worker, so its
+    fan-out detector sees the whole of that source's port and host fan-out
+    and flows get the same fan-out features as in single-process capture.
+    Destination heavy-hitter rate floors are divided across the shards,
+    since a heavy destination's traffic is spread over them; source floors
+    are not.
+
+    Sharding by client does not scale out a flood from a single source: all
+    of its packets go to one worker, which caps that source's throughput at
+    one worker's. ``get_stats`` reports the busiest shard's share of the
+    dispatched packets so this imbalance is visible.
+    """
+
+    def __init__(self, config, ml_models, preprocessor, on_result, num_shards=None,
+                 queue_size=1000, dispatch_batch=256, on_alert=None):
+        self.config = config
+        self.ml_models = ml_models
+        self.preprocessor = preprocessor
+        self.on_result = on_result
+        self.on_alert = on_alert
+        self.num_shards = max(1, int(num_shards or multiprocessing.cpu_count()))
+        self.queue_size = queue_size
+        self.dispatch_batch = dispatch_batch
+        # Spawned, not forked: forking after OpenMP (LightGBM, XGBoost) scoring ran can deadlock
+        self.ctx = multiprocessing.get_context('spawn')
+        self.stop_event = None
+        self.reader = None
+        self.workers = []
+        self.shard_queues = []
+        self.result_queue = None
+        self.collector_thread = None
+        self.reader_stats = {}
+        self.shard_stats = {}
+        self.shards_done = set()
+        self.reader_done = False
+        self.results_received = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        """Start the reader, the shard workers and the result collector"""
+        self.stop_event = self.ctx.Event()
+        self.result_queue = self.ctx.Queue()
+        self.shard_queues = [self.ctx.Queue(maxsize=self.queue_size)
+                             for _ in range(self.num_shards)]
+        self.started_at = time.time()
+
+        for shard_id, shard_queue in enumerate(self.shard_queues):
+            worker = self.ctx.Process(
+                target=_worker_main,
+                args=(shard_id, self.num_shards, self.config, self.ml_models,
+                      self.preprocessor, shard_queue, self.result_queue),
+                name=f'capture-shard-{shard_id}'
+            )
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+        self.reader = self.ctx.Process(
+            target=_reader_main,
+            args=(self.config, self.shard_queues, self.result_queue,
+                  self.stop_event, self.dispatch_batch),
+            name='capture-reader'
+        )
+        self.reader.daemon = True
+        self.reader.start()
+
+        self.collector_thread = threading.Thread(target=self._collect_results)
+        self.collector_thread.daemon = True
+        self.collector_thread.start()
+
+    def stop(self, timeout=10):
+        """Stop reading; workers flush their flows and exit"""
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if self.reader is not None:
+            self.reader.join(timeout=timeout)
+        for worker in self.workers:
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                worker.terminate()
+        if self.reader is not None and self.reader.is_alive():
+            self.reader.terminate()
+        if self.collector_thread:
+            self.collector_thread.join(timeout=timeout)
+
+    def is_finished(self):
+        """Whether every shard has drained (e.g. all pcap files processed)"""
+        return len(self.shards_done) == self.num_shards
+
+    def _collect_results(self):
+        while not self.is_finished():
+            try:
+                message = self.result_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(w.is_alive() for w in self.workers):
+                    break
+                continue
+
+            kind = message[0]
+            if kind == 'results':
+                _, shard_id, results = message
+                self.results_received += len(results)
+                for result in results:
+                    try:
+                        self.on_result(result)
+                    except Exception as e:
+                        print(f"Shard result handling error: {e}")
+            elif kind == 'stats':
+                _, shard_id, stats = message
+                self.shard_stats[shard_id] = stats
+            elif kind == 'done':
+                _, shard_id, stats = message
+                self.shard_stats[shard_id] = stats
+                self.shards_done.add(shard_id)
+            elif kind == 'alerts':
+                _, alerts = message
+                for alert in alerts:
+                    if self.on_alert is not None:
+                        try:
+                            self.on_alert(alert)
+                        except Exception as e:
+                            print(f"Shard alert handling error: {e}")
+            elif kind == 'reader':
+                _, stats, done = message
+                self.reader_stats = stats
+                self.reader_done = self.reader_done or done
+                for shard_id in stats.get('unstopped_shards', []):
+                    # Dead or stalled: its queue never took the stop marker
+                    if shard_id not in self.shards_done:
+                        print(f"Capture shard {shard_id} did not accept stop, terminating it")
+                        self.workers[shard_id].terminate()
+                        self.shards_done.add(shard_id)
+
+        self.finished_at = time.time()
+
+    def get_stats(self):
+        """Get reader and per-shard counters"""
+        elapsed = max((self.finished_at or time.time()) - (self.started_at or time.time()), 1e-9)
+        packets = self.reader_stats.get('packets', 0)
+        flows = sum(s.get('flows_completed', 0) for s in self.shard_stats.values())
+        per_shard = self.reader_stats.get('per_shard') or [0]
+        return {
+            'num_shards': self.num_shards,
+            'shard_key': 'client_ip',
+            # Near 1.0 when one source (e.g. a single-source flood) dominates:
+            # its traffic can't be spread over the shards
+            'busiest_shard_share': max(per_shard) / max(sum(per_shard), 1),
+            'reader': dict(self.reader_stats, done=self.reader_done),
+            'shards': [
+                dict(self.shard_stats.get(i, {}), shard=i, done=i in self.shards_done,
+                     alive=self.workers[i].is_alive() if i < len(self.workers) else False)
+                for i in range(self.num_shards)
+            ],
+            'results_received': self.results_received,
+            'elapsed_seconds': elapsed,
+            'packets_per_second': packets / elapsed,
+            'flows_per_second': flows / elapsed
+        }
+
+
+def _reader_main(config, shard_queues, result_queue, stop_event, dispatch_batch):
+    """Reader process: decode frames and dispatch them to shards by client hash"""
+    from scapy.all import RawPcapReader, conf
+    from network_capture import extract_packet_info, build_filter_expression
+    from packet_parser import parse_frame, pcap_record_time, pcap_record_linktype
+
+    fast_path = config.get('fast_path', True)
+    num_shards = len(shard_queues)
+    offline = config.get('mode') == 'pcap'
+    buffers = [[] for _ in range(num_shards)]
+    stats = {'packets': 0, 'decoded': 0, 'dispatched': 0, 'dropped': 0,
+             'per_shard': [0] * num_shards, 'unstopped_shards': []}
+    last_report = time.time()
+
+    def flush(shard_id):
+        batch = buffers[shard_id]
+        if not batch:
+            return
+        buffers[shard_id] = []
+        while True:
+            try:
+                # Offline sources wait for slow shards (until stopped), live capture drops instead
+                shard_queues[shard_id].put(batch, block=offline, timeout=1.0 if offline else 0)
+                stats['dispatched'] += len(batch)
+                stats['per_shard'][shard_id] += len(batch)
+                return
+            except queue.Full:
+                if not offline or stop_event.is_set():
+                    stats['dropped'] += len(batch)
+                    return
+
+    def decode(data, linktype, timestamp, layer):
+        if fast_path and linktype is not None:
+            info = parse_frame(data, linktype, timestamp)
+            if info is not None:
+                return info
+        if layer is None:
+            layer = conf.l2types.get(linktype, conf.raw_layer)
+        packet = layer(data)
+        packet.time = timestamp
+        return extract_packet_info(packet)
+
+    def dispatch(data, linktype, timestamp, layer=None):
+        stats['packets'] += 1
+        info = decode(data, linktype, timestamp, layer)
+        if not info:
+            return
+        stats['decoded'] += 1
+        shard_id = shard_for(info, num_shards)
+        buffers[shard_id].append(info)
+        if len(buffers[shard_id]) >= dispatch_batch:
+            flush(shard_id)
+
+    def report(done=False):
+        result_queue.put(('reader', dict(stats, per_shard=list(stats['per_shard'])), done))
+
+    try:
+        if offline:
+            for pcap_file in config.get('pcap_files', []):
+                if stop_event.is_set():
+                    break
+                with RawPcapReader(pcap_file) as reader:
+                    for data, metadata in reader:
+                        if stop_event.is_set():
+                            break
+                        dispatch(data, pcap_record_linktype(metadata, reader),
+                                 pcap_record_time(metadata, reader))
+                        if time.time() - last_report >= 1.0:
+                            report()
+                            last_report = time.time()
+        else:
+            filter_expr = build_filter_expression(config.get('filters') or {})
+            sock = conf.L2listen(iface=config.get('interface'), filter=filter_expr or None)
+            last_flush = time.time()
+            try:
+                while not stop_event.is_set():
+                    if sock.select([sock], 0.05):
+                        layer, data, timestamp = sock.recv_raw()
+                        if data is not None:
+                            dispatch(data, conf.l2types.layer2num.get(layer),
+                                     timestamp or time.time(), layer)
+                    now = time.time()
+                    # Don't let quiet shards hold packets back
+                    if now - last_flush >= 0.05:
+                        for shard_id in range(num_shards):
+                            flush(shard_id)
+                        last_flush = now
+                    if now - last_report >= 1.0:
+                        report()
+                        last_report = now
+            finally:
+                sock.close()
+    except Exception as e:
+        print(f"Capture reader error: {e}")
+    finally:
+        for shard_id in range(num_shards):
+            flush(shard_id)
+        for shard_id, shard_queue in enumerate(shard_queues):
+            try:
+                shard_queue.put(None, timeout=SHUTDOWN_TIMEOUT)
+            except queue.Full:
+                # The main process terminates it when it sees this report
+                stats['unstopped_shards'].append(shard_id)
+        report(done=True)
+
+
+def _worker_main(shard_id, num_shards, config, ml_models, preprocessor, shard_queue, result_queue):
+    """Shard worker process: detectors, flow state, features and scoring for one hash shard"""
+    from network_capture import NetworkCapture
+
+    # A source's traffic is all in its shard; a destination's is spread over
+    # the shards, so each sees about 1/num_shards of it
+    heavy_hitters = dict(config.get('heavy_hitters', {}), shards=num_shards)
+    for floor in ('packet_rate_floor', 'byte_rate_floor'):
+        if floor in heavy_hitters:
+            value = heavy_hitters[floor]
+            heavy_hitters[floor] = {'src': value, 'dst': value / num_shards,
+                                    'dst_port': value / num_shards}
+    config = dict(config, heavy_hitters=heavy_hitters)
+
+    capture = NetworkCapture(None, ml_models, preprocessor)
+    capture._apply_config(config)
+    capture.is_capturing = True
+    live = capture.capture_mode != 'pcap'
+    privacy_mode = capture.privacy_mode
+
+    pending_alerts = []
+    capture.heavy_hitters.on_alert = pending_alerts.append
+    capture.fanout.on_alert = pending_alerts.append
+
+    pending = deque()
+    capture.batch_scorer.result_fn = lambda item, scored: pending.append(
+        capture._build_result(item, scored))
+    capture.batch_scorer.start()
+
+    def send_results():
+        if pending:
+            results = [pending.popleft() for _ in range(len(pending))]
+            result_queue.put(('results', shard_id, results))
+        if pending_alerts:
+            result_queue.put(('alerts', list(pending_alerts)))
+            pending_alerts.clear()
+
+    def shard_stats():
+        stats = capture.flow_table.get_stats()
+        scorer_stats = capture.batch_scorer.get_stats()
+        stats['scored'] = scorer_stats['scored']
+        stats['dropped'] = scorer_stats['dropped']
+        stats['shed'] = scorer_stats['shed']
+        stats['queue_depth'] = scorer_stats['queue_depth']
+        stats['lag_ms'] = scorer_stats['lag_ms']
+        stats['heavy_hitters'] = capture.heavy_hitters.get_stats()
+        stats['fanout'] = capture.fanout.get_stats()
+        return stats
+
+    last_sweep = time.time()
+    last_report = last_sweep
+
+    try:
+        while True:
+            try:
+                batch = shard_queue.get(timeout=0.1)
+            except queue.Empty:
+                batch = ()
+            if batch is None:
+                break
+
+            packets = [p for p in batch if capture._should_process_packet(p)]
+            if privacy_mode:
+                for packet_info in (p for p in packets if 'src_ip' in p):
+                    packet_info['src_ip'] = capture._anonymize_ip(packet_info['src_ip'])
+                    packet_info['dst_ip'] = capture._anonymize_ip(packet_info['dst_ip'])
+            if packets:
+                capture.heavy_hitters.add_many(packets)
+                capture.fanout.add_many(packets)
+            for packet_info in packets:
+                capture._handle_packet(packet_info)
+
+            now = time.time()
+            if live and now - last_sweep >= 1.0:
+                for flow in capture.flow_table.expire(now):
+                    capture._process_flow(flow)
+                last_sweep = now
+
+            send_results()
+            if now - last_report >= 1.0:
+                result_queue.put(('stats', shard_id, shard_stats()))
+                last_report = now
+    except Exception as e:
+        print(f"Capture shard {shard_id} error: {e}")
+    finally:
+        capture.heavy_hitters.flush()
+        capture.fanout.flush()
+        for flow in capture.flow_table.flush():
+            capture._process_flow(flow)
+        capture.batch_scorer.wait_idle()
+        capture.batch_scorer.stop()
+        send_results()
+        result_queue.put(('done', shard_id, shard_stats()))
@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class ConfidenceCascade:
+    """Two-stage scoring: a cheap model decides confident events, the ensemble the rest.
+
+    For binary models an event is escalated to the second stage when the
+    first stage's attack probability (column 1) lies strictly inside
+    ``(low, high)``; with more classes, when its top class probability is
+    below ``high``. ``calibrate`` picks the band on a labelled split so the
+    cascade loses at most ``max_accuracy_loss`` accuracy (and attack recall)
+    against the ensemble alone while escalating as little traffic as
+    possible.
+    """
+
+    def __init__(self, first_stage, low=-1.0, high=2.0):
+        self.first_stage = first_stage
+        self.low = float(low)
+        self.high = float(high)
+        self.calibration = None
+
+    def confidence(self, proba):
+        proba = np.asarray(proba)
+        return proba[:, 1] if proba.shape[1] == 2 else proba.max(axis=1)
+
+    def escalate(self, proba):
+        """Mask of the rows the first stage isn't confident about"""
+        score = self.confidence(proba)
+        if np.asarray(proba).shape[1] == 2:
+            return (score > self.low) & (score < self.high)
+        return score < self.high
+
+    @staticmethod
+    def _candidates(score, n=200):
+        return np.unique(np.quantile(score, np.linspace(0.0, 1.0, n + 1)))
+
+    def calibrate(self, first_proba, final_proba, y, classes, max_accuracy_loss=0.001,
+                  max_recall_loss=None):
+        """Choose the band from both stages' probabilities on a labelled split"""
+        classes = np.asarray(classes)
+        y = np.asarray(y)
+        first_proba, final_proba = np.asarray(first_proba), np.asarray(final_proba)
+        max_recall_loss = max_accuracy_loss if max_recall_loss is None else max_recall_loss
+        n = len(y)
+        first_correct = classes[np.argmax(first_proba, axis=1)] == y
+        final_correct = classes[np.argmax(final_proba, axis=1)] == y
+        # Accuracy given up wherever the first stage's answer is kept
+        gain = final_correct.astype(float) - first_correct
+        attack = y != classes[0] if len(classes) == 2 else np.ones(n, dtype=bool)
+        n_attacks = max(int(attack.sum()), 1)
+        score = self.confidence(first_proba)
+
+        order = np.argsort(score, kind='stable')
+        sorted_score = score[order]
+        gain_sum = np.concatenate([[0.0], np.cumsum(gain[order])])
+        recall_sum = np.concatenate([[0.0], np.cumsum((gain * attack)[order])])
+        candidates = self._candidates(score)
+
+        # Rows kept by the first stage at the top end: score >= high
+        high = np.concatenate([candidates[candidates >= 0.5], [np.inf]])
+        start = np.searchsorted(sorted_score, high, side='left')
+        kept_high = n - start
+        loss_high = gain_sum[-1] - gain_sum[start]
+        recall_high = recall_sum[-1] - recall_sum[start]
+
+        if len(classes) == 2:
+            # ...and at the bottom end: score <= low
+            low = np.concatenate([[-np.inf], candidates[candidates < 0.5]])
+            end = np.searchsorted(sorted_score, low, side='right')
+            kept_low, loss_low, recall_low = end, gain_sum[end], recall_sum[end]
+        else:
+            low = np.array([-np.inf])
+            kept_low = loss_low = recall_low = np.zeros(1)
+
+        escalated = n - (kept_low[:, None] + kept_high[None, :])
+        loss = (loss_low[:, None] + loss_high[None, :]) / n
+        recall_loss = (recall_low[:, None] + recall_high[None, :]) / n_attacks
+        feasible = (loss <= max_accuracy_loss + 1e-12) & (recall_loss <= max_recall_loss + 1e-12)
+        # Always feasible: escalating everything (low=-inf, high=inf) loses nothing
+        cost = np.where(feasible, escalated + loss, np.inf)
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+
+        # Probabilities are in [0, 1]: -1 / 2 mean "never keep" on that side
+        self.low = float(low[i]) if np.isfinite(low[i]) else -1.0
+        self.high = float(high[j]) if np.isfinite(high[j]) else 2.0
+        escalate = self.escalate(first_proba)
+        cascade_correct = np.where(escalate, final_correct, first_correct)
+        self.calibration = {
+            'first_stage': self.first_stage,
+            'low': self.low,
+            'high': self.high,
+            'samples': n,
+            'escalated_fraction': float(escalate.mean()) if n else 0.0,
+            'first_stage_accuracy': float(first_correct.mean()) if n else 0.0,
+            'ensemble_accuracy': float(final_correct.mean()) if n else 0.0,
+            'cascade_accuracy': float(cascade_correct.mean()) if n else 0.0,
+            'ensemble_attack_recall': float(final_correct[attack].mean()) if attack.any() else 0.0,
+            'cascade_attack_recall': float(cascade_correct[attack].mean()) if attack.any() else 0.0,
+            'max_accuracy_loss': max_accuracy_loss,
+            'max_recall_loss': max_recall_loss
+        }
+        return self.calibration
+
+    def to_dict(self):
+        return {'first_stage': self.first_stage, 'low': self.low, 'high': self.high,
+                'calibration': self.calibration}
+
+    @classmethod
+    def from_dict(cls, data):
+        cascade = cls(data['first_stage'], data['low'], data['high'])
+        cascade.calibration = data.get('calibration')
+        return cascade
@@ -0,0 +1,230 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import lightgbm as lgb
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier
+
+from ml_models import MLModels
+
+DEFAULT_MODELS = ('logistic_regression', 'naive_bayes', 'neural_network', 'lightgbm')
+
+
+class BoosterClassifier:
+    """Classifier interface (classes_, predict_proba, predict) over a LightGBM Booster from ``lgb.train``"""
+
+    def __init__(self, booster, classes):
+        self.booster_ = booster
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = booster.num_feature()
+
+    @property
+    def feature_importances_(self):
+        return self.booster_.feature_importance()
+
+    def predict_proba(self, X):
+        proba = self.booster_.predict(np.asarray(X, dtype=np.float64))
+        if proba.ndim == 1:
+            return np.column_stack([1.0 - proba, proba])
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class _RowSequence(lgb.Sequence):
+    """Feeds LightGBM's Dataset construction from an on-disk array in batches"""
+
+    def __init__(self, array, batch_size):
+        self.array = array
+        self.batch_size = batch_size
+
+    def __getitem__(self, idx):
+        # LightGBM samples and bins rows from float64 batches
+        return np.asarray(self.array[idx], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.array)
+
+
+class _Reservoir:
+    """Uniform sample of at most ``capacity`` rows from a stream of chunks (Algorithm R)"""
+
+    def __init__(self, capacity, n_features, rng):
+        self.capacity = int(capacity)
+        self.X = np.empty((self.capacity, n_features), dtype=np.float32)
+        self.y = None
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, X, y):
+        if self.y is None:
+            self.y = np.empty(self.capacity, dtype=np.asarray(y).dtype)
+        n = len(y)
+        fill = max(0, min(n, self.capacity - self.seen))
+        if fill:
+            self.X[self.seen:self.seen + fill] = X[:fill]
+            self.y[self.seen:self.seen + fill] = y[:fill]
+        if fill < n:
+            # Row i of the stream replaces a random slot with probability capacity / (i + 1)
+            slots = self.rng.integers(0, self.seen + np.arange(fill, n) + 1)
+            keep = slots < self.capacity
+            self.X[slots[keep]] = X[fill:][keep]
+            self.y[slots[keep]] = y[fill:][keep]
+        self.seen += n
+
+    def arrays(self):
+        size = min(self.seen, self.capacity)
+        return self.X[:size], (self.y[:size] if self.y is not None else np.empty(0))
+
+
+def _incremental_model(name):
+    return {
+        # Logistic regression fitted by SGD, so it can learn one chunk at a time
+        'logistic_regression': SGDClassifier(loss='log_loss', random_state=42),
+        'naive_bayes': GaussianNB(),
+        'neural_network': MLPClassifier(random_state=42, hidden_layer_sizes=(100, 50))
+    }[name]
+
+
+def train_out_of_core(filepath, preprocessor, ml_models, chunk_size=100000, test_size=0.2,
+                      max_test_rows=200000, models=None, epochs=1, n_jobs=None, on_progress=None,
+                      ensemble=None, cascade=None, workdir=None):
+    """Train ``ml_models`` on a CSV too large to load, reading ``chunk_size`` rows at a time.
+
+    Pass 1 fits the preprocessor's statistics (``fit_streaming``). Pass 2
+    transforms each chunk and splits its rows at random into test (up to
+    ``max_test_rows`` kept, uniformly sampled), optional validation and
+    training rows. Training rows update the ``partial_fit`` learners
+    (SGD logistic regression, naive Bayes, MLP; ``epochs`` passes) and are
+    written to a float32 array on disk under ``workdir``, from which
+    LightGBM builds its binned dataset in batches. Memory is bounded by
+    the chunk size and ``max_test_rows``, plus LightGBM's binned data
+    (about one byte per feature per training row) instead of the dataset.
+
+    Models are evaluated on the test sample, then the ensemble, compiled
+    models and cascade are built as in ``train_all_models``. Returns results
+    in the same format.
+    """
+    started = time.time()
+    progress = MLModels._progress_callback(on_progress)
+    names = [name for name in (models or DEFAULT_MODELS) if name in DEFAULT_MODELS]
+    ensemble = dict({'method': 'voting', 'tune_weights': False, 'validation_size': 0.2}, **(ensemble or {}))
+    validation_size = ensemble['validation_size'] if (ensemble['tune_weights'] or
+                                                      ensemble['method'] == 'stacking') else 0.0
+    n_jobs = int(n_jobs or os.cpu_count() or 1)
+    progress('training_started', {'models': names, 'workers': 1, 'n_jobs': n_jobs,
+                                  'out_of_core': True, 'chunk_size': chunk_size})
+
+    summary = preprocessor.fit_streaming(filepath, chunk_size=chunk_size,
+                                         on_chunk=lambda rows: progress('stats_pass', {'rows': rows}))
+    classes = summary['classes']
+    n_features = len(preprocessor.get_feature_names())
+    progress('stats_complete', {'rows': summary['rows'], 'class_counts': summary['class_counts'],
+                                'features': n_features, 'seconds': time.time() - started})
+
+    scratch = tempfile.mkdtemp(prefix='ids-train-', dir=workdir)
+    results = {}
+    try:
+        learners = {name: _incremental_model(name) for name in names if name != 'lightgbm'}
+        seconds = {name: 0.0 for name in names}
+        errors = {}
+        for name in names:
+            progress('model_started', {'model': name, 'worker': os.getpid()})
+
+        sample_rng = np.random.default_rng(7)
+        test = _Reservoir(max_test_rows, n_features, sample_rng)
+        val = _Reservoir(max_test_rows, n_features, sample_rng) if validation_size else None
+        spill = y_spill = None
+        if 'lightgbm' in names:
+            spill = np.lib.format.open_memmap(os.path.join(scratch, 'train_X.npy'), mode='w+',
+                                              dtype=np.float32, shape=(summary['rows'], n_features))
+            y_spill = np.lib.format.open_memmap(os.path.join(scratch, 'train_y.npy'), mode='w+',
+                                                dtype=np.int32, shape=(summary['rows'],))
+        n_train = 0
+        shuffle_rng = np.random.default_rng(42)
+
+        for epoch in range(max(1, int(epochs))):
+            # The same split every epoch
+            split_rng = np.random.default_rng(42)
+            rows = 0
+            for X, y in preprocessor.iter_transformed_chunks(filepath, chunk_size):
+                u = split_rng.random(len(y))
+                is_test = u < test_size
+                is_val = ~is_test & (u < test_size + validation_size * (1 - test_size))
+                is_train = ~(is_test | is_val)
+                X_train, y_train = X[is_train], y[is_train]
+                if epoch == 0:
+                    test.add(X[is_test], y[is_test])
+                    if val is not None:
+                        val.add(X[is_val], y[is_val])
+                    if spill is not None:
+                        spill[n_train:n_train + len(y_train)] = X_train
+                        y_spill[n_train:n_train + len(y_train)] = np.searchsorted(classes, y_train)
+                    n_train += len(y_train)
+
+                if len(y_train) and learners:
+                    # Files are often sorted by time or attack: shuffle within the chunk
+                    order = shuffle_rng.permutation(len(y_train))
+                    X_train, y_train = X_train[order], y_train[order]
+                    for name, model in list(learners.items()):
+                        fit_started = time.time()
+                        try:
+                            model.partial_fit(X_train, y_train, classes=classes)
+                        except Exception as e:
+                            errors[name] = str(e)
+                            del learners[name]
+                        seconds[name] += time.time() - fit_started
+                rows += len(y)
+                progress('training_pass', {'epoch': epoch + 1, 'epochs': epochs, 'rows': rows,
+                                           'total_rows': summary['rows']})
+
+        if spill is not None and n_train:
+            fit_started = time.time()
+            try:
+                spill.flush()
+                binary = len(classes) == 2
+                params = {'objective': 'binary' if binary else 'multiclass', 'verbose': -1,
+                          'num_threads': n_jobs, 'seed': 42}
+                if not binary:
+                    params['num_class'] = len(classes)
+                dataset = lgb.Dataset(_RowSequence(spill[:n_train], max(1, min(chunk_size, n_train))),
+                                      label=y_spill[:n_train], params={'verbose': -1})
+                learners['lightgbm'] = BoosterClassifier(lgb.train(params, dataset, num_boost_round=100),
+                                                         classes)
+                del dataset
+            except Exception as e:
+                errors['lightgbm'] = str(e)
+            seconds['lightgbm'] += time.time() - fit_started
+        elif 'lightgbm' in names:
+            errors['lightgbm'] = "No training rows"
+        del spill, y_spill
+
+        X_test, y_test = test.arrays()
+        X_val, y_val = val.arrays() if val is not None else (None, None)
+        for name in names:
+            if name in errors:
+                print(f"Error training {name}: {errors[name]}")
+                results[name] = {'error': errors[name]}
+                progress('model_failed', {'model': name, 'error': errors[name], 'seconds': seconds[name]})
+                continue
+            model = learners[name]
+            ml_models.models[name] = model
+            results[name] = MLModels._evaluate(model, X_test, y_test)
+            ml_models.model_performance[name] = results[name]['metrics']
+            progress('model_finished', {'model': name, 'metrics': results[name]['metrics'],
+                                        'seconds': seconds[name]})
+
+        ml_models._finish_training(results, X_val, y_val, X_test, y_test, ensemble, cascade, progress)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    progress('training_complete', {'seconds': time.time() - started,
+                                   'failed': [n for n, r in results.items() if 'error' in r],
+                                   'rows': summary['rows'], 'train_rows': n_train,
+                                   'test_rows': int(min(test.seen, test.capacity))})
+    return results
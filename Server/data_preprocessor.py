@@ -6,6 +6,8 @@ from sklearn.impute import SimpleImputer
 import warnings
 warnings.filterwarnings('ignore')
 
+TARGET_CANDIDATES = ['label', 'class', 'attack_type', 'attack', 'target']
+
 class DataPreprocessor:
     def __init__(self):
         self.scaler = StandardScaler()
@@ -31,8 +33,7 @@ class DataPreprocessor:
             }
             
             # Try to identify target column (common names for attack labels)
-            possible_targets = ['label', 'class', 'attack_type', 'attack', 'target']
-            for col in possible_targets:
+            for col in TARGET_CANDIDATES:
                 if col in df.columns:
                     analysis['suggested_target'] = col
                     break
@@ -48,17 +49,7 @@ class DataPreprocessor:
             df = pd.read_csv(filepath)
             
             # Auto-detect target column if not provided
-            if target_column is None:
-                possible_targets = ['label', 'class', 'attack_type', 'attack', 'target']
-                for col in possible_targets:
-                    if col in df.columns:
-                        target_column = col
-                        break
-                
-                if target_column is None:
-                    # Assume last column is target
-                    target_column = df.columns[-1]
-            
+            target_column = self._detect_target(df.columns, target_column)
             self.target_column = target_column
             
             # Separate features and target
@@ -68,16 +59,17 @@ class DataPreprocessor:
             # Store original feature columns
             self.feature_columns = list(X.columns)
             
-            # Handle missing values
-            X = pd.DataFrame(self.imputer.fit_transform(X), columns=X.columns)
-            
-            # Encode categorical variables
+            # Encode categorical variables (before imputing: the mean of a string is undefined)
             categorical_cols = X.select_dtypes(include=['object']).columns
             for col in categorical_cols:
                 if col not in self.label_encoders:
                     self.label_encoders[col] = LabelEncoder()
                 X[col] = self.label_encoders[col].fit_transform(X[col].astype(str))
             
+            # Handle missing values; infinities (e.g. CICIDS rates) count as missing
+            X = X.replace([np.inf, -np.inf], np.nan)
+            X = pd.DataFrame(self.imputer.fit_transform(X), columns=X.columns)
+            
             # Encode target variable if it's categorical
             if y.dtype == 'object':
                 if 'target_encoder' not in self.label_encoders:
@@ -97,6 +89,126 @@ class DataPreprocessor:
         except Exception as e:
             raise Exception(f"Error preprocessing data: {str(e)}")
     
+    def _detect_target(self, columns, target_column=None):
+        """The given target column, else the first common label name, else the last column"""
+        if target_column is not None:
+            return target_column
+        for col in TARGET_CANDIDATES:
+            if col in columns:
+                return col
+        return list(columns)[-1]
+    
+    def _categorical_features(self):
+        return [col for col in self.feature_columns if col in self.label_encoders]
+    
+    def _read_chunks(self, filepath, chunk_size):
+        """Read ``filepath`` in chunks with the fitted column types: strings for categorical
+        columns (and a categorical target), numbers (unparseable -> NaN) for the rest"""
+        dtypes = {col: str for col in self._categorical_features()}
+        if 'target_encoder' in self.label_encoders:
+            dtypes[self.target_column] = str
+        for chunk in pd.read_csv(filepath, chunksize=chunk_size, dtype=dtypes, low_memory=False):
+            for col in self.feature_columns:
+                if col not in dtypes and not pd.api.types.is_numeric_dtype(chunk[col]):
+                    chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+            yield chunk
+    
+    def fit_streaming(self, filepath, target_column=None, chunk_size=100000, on_chunk=None):
+        """Fit encoders, imputer and scaler in one pass over a file too large to load.
+
+        Reads ``chunk_size`` rows at a time and keeps only per-column
+        statistics: category counts, and running count/mean/variance of the
+        numeric columns (``StandardScaler.partial_fit``, which skips NaNs).
+        The fitted objects then transform exactly like those from
+        ``preprocess_data`` on the whole file would, with one exception:
+        a column with no values at all is imputed with 0 rather than dropped.
+        Column types are taken from the first chunk. ``on_chunk(rows)`` is
+        called after every chunk. Returns the row count, the (encoded) classes
+        and class counts.
+        """
+        try:
+            head = pd.read_csv(filepath, nrows=min(chunk_size, 10000), low_memory=False)
+            self.target_column = self._detect_target(head.columns, target_column)
+            self.feature_columns = [col for col in head.columns if col != self.target_column]
+            categorical_cols = [col for col in self.feature_columns
+                                if not pd.api.types.is_numeric_dtype(head[col])]
+            self.label_encoders = {col: LabelEncoder() for col in categorical_cols}
+            if not pd.api.types.is_numeric_dtype(head[self.target_column]):
+                self.label_encoders['target_encoder'] = LabelEncoder()
+            numeric_cols = [col for col in self.feature_columns if col not in self.label_encoders]
+            
+            category_counts = {col: {} for col in categorical_cols}
+            class_counts = {}
+            numeric_scaler = StandardScaler()
+            rows = 0
+            for chunk in self._read_chunks(filepath, chunk_size):
+                for col in categorical_cols:
+                    for value, count in chunk[col].astype(str).value_counts().items():
+                        category_counts[col][value] = category_counts[col].get(value, 0) + count
+                target = chunk[self.target_column]
+                for value, count in (target.astype(str) if 'target_encoder' in self.label_encoders
+                                     else target).value_counts().items():
+                    class_counts[value] = class_counts.get(value, 0) + count
+                if numeric_cols:
+                    values = chunk[numeric_cols].to_numpy(dtype=np.float64)
+                    values[np.isinf(values)] = np.nan
+                    numeric_scaler.partial_fit(values)
+                rows += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(rows)
+            if not rows:
+                raise Exception("Dataset is empty")
+            
+            means, variances = {}, {}
+            if numeric_cols:
+                seen = np.broadcast_to(numeric_scaler.n_samples_seen_, (len(numeric_cols),))
+                for i, col in enumerate(numeric_cols):
+                    if seen[i] == 0:
+                        means[col], variances[col] = 0.0, 0.0
+                    else:
+                        # Imputing the mean adds rows at the mean: same mean, variance scaled by seen/rows
+                        means[col] = float(numeric_scaler.mean_[i])
+                        variances[col] = float(numeric_scaler.var_[i]) * seen[i] / rows
+            for col in categorical_cols:
+                classes = sorted(category_counts[col])
+                self.label_encoders[col].fit(classes)
+                counts = np.array([category_counts[col][c] for c in classes], dtype=np.float64)
+                codes = np.arange(len(classes))
+                means[col] = float((counts * codes).sum() / rows)
+                variances[col] = float((counts * (codes - means[col]) ** 2).sum() / rows)
+            
+            mean = np.array([means[col] for col in self.feature_columns])
+            var = np.array([variances[col] for col in self.feature_columns])
+            # Fit on stand-in rows for the fitted attributes, then set the streamed statistics
+            self.imputer = SimpleImputer(strategy='mean').fit(pd.DataFrame([mean], columns=self.feature_columns))
+            self.imputer.statistics_ = mean
+            std = np.sqrt(var)
+            self.scaler = StandardScaler().fit(pd.DataFrame([mean - std, mean + std], columns=self.feature_columns))
+            self.scaler.mean_ = mean
+            self.scaler.var_ = var
+            self.scaler.scale_ = np.where(std > 0, std, 1.0)
+            self.scaler.n_samples_seen_ = rows
+            
+            if 'target_encoder' in self.label_encoders:
+                self.label_encoders['target_encoder'].fit(sorted(class_counts))
+                classes = np.arange(len(class_counts))
+            else:
+                classes = np.array(sorted(class_counts))
+            return {'rows': rows, 'classes': classes,
+                    'class_counts': {str(k): int(v) for k, v in class_counts.items()}}
+            
+        except Exception as e:
+            raise Exception(f"Error fitting preprocessors: {str(e)}")
+    
+    def iter_transformed_chunks(self, filepath, chunk_size=100000):
+        """Yield (features as float32 array, encoded labels) per chunk of ``filepath``, using the fitted preprocessors"""
+        for chunk in self._read_chunks(filepath, chunk_size):
+            y = chunk[self.target_column]
+            if 'target_encoder' in self.label_encoders:
+                y = self.label_encoders['target_encoder'].transform(y.astype(str))
+            X = self.transform_data(chunk[self.feature_columns])
+            yield X.to_numpy(dtype=np.float32), np.asarray(y)
+    
     def transform_data(self, df):
         """Transform new data using fitted preprocessors"""
         try:
@@ -107,9 +219,6 @@ class DataPreprocessor:
             if self.target_column and self.target_column in X.columns:
                 X = X.drop(columns=[self.target_column])
             
-            # Handle missing values
-            X = pd.DataFrame(self.imputer.transform(X), columns=X.columns)
-            
             # Encode categorical variables
             categorical_cols = X.select_dtypes(include=['object']).columns
             for col in categorical_cols:
@@ -119,6 +228,10 @@ class DataPreprocessor:
                     # Handle unseen categories
                     X[col] = 0
             
+            # Handle missing values
+            X = X.replace([np.inf, -np.inf], np.nan)
+            X = pd.DataFrame(self.imputer.transform(X), columns=X.columns)
+            
             # Scale features
             X_scaled = pd.DataFrame(self.scaler.transform(X), columns=X.columns)
             
@@ -137,24 +250,30 @@ class DataPreprocessor:
             return self.label_encoders['target_encoder'].classes_.tolist()
         return None
     
-    def save_preprocessors(self, filepath):
-        """Save fitted preprocessors"""
-        import joblib
-        preprocessors = {
+    def get_state(self):
+        """Fitted preprocessors as a dict"""
+        return {
             'scaler': self.scaler,
             'label_encoders': self.label_encoders,
             'imputer': self.imputer,
             'feature_columns': self.feature_columns,
             'target_column': self.target_column
         }
-        joblib.dump(preprocessors, filepath)
     
-    def load_preprocessors(self, filepath):
-        """Load fitted preprocessors"""
-        import joblib
-        preprocessors = joblib.load(filepath)
+    def set_state(self, preprocessors):
+        """Restore fitted preprocessors from ``get_state``"""
         self.scaler = preprocessors['scaler']
         self.label_encoders = preprocessors['label_encoders']
         self.imputer = preprocessors['imputer']
         self.feature_columns = preprocessors['feature_columns']
         self.target_column = preprocessors['target_column']
+    
+    def save_preprocessors(self, filepath):
+        """Save fitted preprocessors"""
+        import joblib
+        joblib.dump(self.get_state(), filepath)
+    
+    def load_preprocessors(self, filepath):
+        """Load fitted preprocessors"""
+        import joblib
+        self.set_state(joblib.load(filepath))
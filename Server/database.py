@@ -64,6 +64,29 @@ class Database:
             )
         ''')
         
+        # Create alerts table; ids are assigned by AlertStore, in emission order
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                alert_type TEXT,
+                source TEXT,
+                threat_level TEXT,
+                probability REAL,
+                src_ip TEXT,
+                dst_ip TEXT,
+                dst_port INTEGER,
+                message TEXT,
+                details TEXT NOT NULL
+            )
+        ''')
+        # Every filter ends in id so cursor pagination stays on the index
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_src_ip ON alerts (src_ip, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_dst_ip ON alerts (dst_ip, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_dst_port ON alerts (dst_port, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_threat_level ON alerts (threat_level, id)')
+        
         conn.commit()
         conn.close()
     
@@ -251,19 +274,20 @@ class Database:
             for row in results
         ]
     
-    def register_model(self, model_name, model_path, performance_metrics):
+    def register_model(self, model_name, model_path, performance_metrics, is_active=True):
         """Register a new model in the system"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
             INSERT OR REPLACE INTO model_registry 
-            (model_name, model_path, performance_metrics, updated_at)
-            VALUES (?, ?, ?, ?)
+            (model_name, model_path, performance_metrics, is_active, updated_at)
+            VALUES (?, ?, ?, ?, ?)
         ''', (
             model_name,
             model_path,
             json.dumps(performance_metrics),
+            1 if is_active else 0,
             datetime.now().isoformat()
         ))
         
@@ -293,3 +317,138 @@ class Database:
             }
             for row in results
         ]
+    
+    def activate_model(self, model_name):
+        """Mark one registered model as the only active one; False if it isn't registered"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT 1 FROM model_registry WHERE model_name = ?', (model_name,))
+        found = cursor.fetchone() is not None
+        if found:
+            # One transaction: readers never see zero or two active models
+            cursor.execute('UPDATE model_registry SET is_active = 0 WHERE is_active = 1 AND model_name != ?',
+                           (model_name,))
+            cursor.execute('UPDATE model_registry SET is_active = 1, updated_at = ? WHERE model_name = ?',
+                           (datetime.now().isoformat(), model_name))
+        
+        conn.commit()
+        conn.close()
+        return found
+    
+    def get_model_registry(self):
+        """Get every registered model, oldest first"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT id, model_name, model_path, performance_metrics, is_active, created_at, updated_at
+            FROM model_registry
+            ORDER BY id
+        ''')
+        
+        results = cursor.fetchall()
+        conn.close()
+        
+        return [
+            {
+                'id': row[0],
+                'model_name': row[1],
+                'model_path': row[2],
+                'performance_metrics': json.loads(row[3]),
+                'is_active': bool(row[4]),
+                'created_at': row[5],
+                'updated_at': row[6]
+            }
+            for row in results
+        ]
+    
+    def save_alerts(self, rows):
+        """Insert a batch of alert rows (see AlertStore) in one transaction"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        # WAL lets API reads run while the writer thread commits
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
+        cursor.executemany('''
+            INSERT OR REPLACE INTO alerts
+            (id, timestamp, alert_type, source, threat_level, probability,
+             src_ip, dst_ip, dst_port, message, details)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        conn.commit()
+        conn.close()
+    
+    def get_max_alert_id(self):
+        """Highest stored alert id (0 if there are none)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT MAX(id) FROM alerts')
+        max_id = cursor.fetchone()[0]
+        conn.close()
+        
+        return max_id or 0
+    
+    def count_alerts(self, start=None):
+        """Number of stored alerts, or of those recorded at or after ``start``"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if start is None:
+            cursor.execute('SELECT COUNT(*) FROM alerts')
+        else:
+            # Range scan on idx_alerts_timestamp
+            cursor.execute('SELECT COUNT(*) FROM alerts WHERE timestamp >= ?', (start,))
+        count = cursor.fetchone()[0]
+        conn.close()
+        
+        return count
+    
+    def query_alerts(self, start=None, end=None, host=None, threat_level=None, dst_port=None,
+                     cursor_id=None, limit=50):
+        """Get alerts newest first; pass the returned next_cursor back to page further"""
+        conditions = []
+        params = []
+        # Ids follow record time, so a time bound becomes an id bound found with
+        # one seek on the timestamp index, and paging stays on the primary key
+        first_at = 'SELECT id FROM alerts WHERE timestamp >= ? ORDER BY timestamp, id LIMIT 1'
+        if start is not None:
+            conditions.append(f'id >= ({first_at})')
+            params.append(start)
+        if end is not None:
+            conditions.append(f'id < IFNULL(({first_at}), 9223372036854775807)')
+            params.append(end)
+        if host:
+            conditions.append('(src_ip = ? OR dst_ip = ?)')
+            params.extend([host, host])
+        if threat_level:
+            levels = [threat_level] if isinstance(threat_level, str) else list(threat_level)
+            conditions.append(f"threat_level IN ({', '.join('?' * len(levels))})")
+            params.extend(levels)
+        if dst_port is not None:
+            conditions.append('dst_port = ?')
+            params.append(dst_port)
+        if cursor_id is not None:
+            conditions.append('id < ?')
+            params.append(cursor_id)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT id, details
+            FROM alerts
+            {where}
+            ORDER BY id DESC
+            LIMIT ?
+        ''', params + [limit + 1])
+        
+        results = cursor.fetchall()
+        conn.close()
+        
+        alerts = [dict(json.loads(row[1]), id=row[0]) for row in results[:limit]]
+        next_cursor = results[limit - 1][0] if len(results) > limit else None
+        return alerts, next_cursor
@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+from collections import deque
+
+from alert_aggregator import AlertAggregator
+
+DEFAULT_ROOM = 'frames:all'
+
+
+class _RoomState:
+    """Aggregates events for one room between two frames"""
+
+    def __init__(self, filters, sample_size):
+        self.filters = filters
+        self.threat_levels = set(filters.get('threat_levels') or [])
+        self.protocols = {p.upper() for p in filters.get('protocols') or []}
+        self.hosts = set(filters.get('hosts') or [])
+        self.sources = set(filters.get('sources') or [])
+        self.members = set()
+        self.sample = deque(maxlen=sample_size)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.threats = 0
+        self.by_threat_level = {}
+        self.by_protocol = {}
+        self.max_probability = 0.0
+        self.sample.clear()
+
+    def matches(self, result):
+        if self.threat_levels and result.get('threat_level') not in self.threat_levels:
+            return False
+        data = result.get('data') or {}
+        if self.protocols:
+            protocol = str(data.get('transport_protocol') or data.get('protocol') or '').upper()
+            if protocol not in self.protocols:
+                return False
+        if self.hosts and data.get('src_ip') not in self.hosts and data.get('dst_ip') not in self.hosts:
+            return False
+        if self.sources and result.get('source', 'streaming') not in self.sources:
+            return False
+        return True
+
+    def add(self, result):
+        self.count += 1
+        if result.get('prediction'):
+            self.threats += 1
+        level = result.get('threat_level', 'LOW')
+        self.by_threat_level[level] = self.by_threat_level.get(level, 0) + 1
+        data = result.get('data') or {}
+        protocol = str(data.get('transport_protocol') or data.get('protocol') or 'OTHER')
+        self.by_protocol[protocol] = self.by_protocol.get(protocol, 0) + 1
+        self.max_probability = max(self.max_probability, result.get('probability', 0.0))
+        self.sample.append(result)
+
+
+class EventEmitter:
+    """Coalesces per-event results into periodic Socket.IO frames.
+
+    Results are folded into one aggregate per room as they arrive; a
+    background thread emits each room's aggregate counts plus its most recent
+    ``sample_size`` events as a single 'network_frame' at ``rate_hz``.
+    Clients pick a room by subscribing with server-side filters (threat
+    levels, protocols, hosts, sources), so each only receives what it shows.
+    Alerts bypass frames: they go through an ``AlertAggregator``, which
+    sends the first alert of each signature immediately and rolls repeats up.
+    Sent alerts are persisted through ``alert_store`` when one is given.
+    """
+
+    def __init__(self, socketio, rate_hz=10, sample_size=50, alert_store=None):
+        self.socketio = socketio
+        self.alert_store = alert_store
+        self.rate_hz = rate_hz
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.rooms = {DEFAULT_ROOM: _RoomState({}, sample_size)}
+        self.client_rooms = {}
+        self.thread = None
+        self.stats = {'published': 0, 'frames': 0, 'alerts': 0, 'emit_errors': 0}
+        self.alert_aggregator = AlertAggregator(self._send_alert)
+
+    def _ensure_running(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._emit_loop)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def publish(self, result):
+        """Queue a result for the next frame of every room whose filters it matches"""
+        with self.lock:
+            self.stats['published'] += 1
+            for room in self.rooms.values():
+                if room.matches(result):
+                    room.add(result)
+        self._ensure_running()
+
+    def emit_alert(self, alert):
+        """Send an alert to every client, or fold it into its signature's roll-up"""
+        self.alert_aggregator.add(alert)
+        # Roll-ups are sent from the frame loop
+        self._ensure_running()
+
+    def _send_alert(self, alert):
+        if self.alert_store is not None:
+            # Stored alerts carry the store's id, so clients can look them up later
+            alert = self.alert_store.record(alert)
+        self.stats['alerts'] += 1
+        self.socketio.emit('security_alert', alert)
+
+    def subscribe(self, sid, filters=None):
+        """Move a client to the room for ``filters``; returns (old_room, new_room)"""
+        filters = {k: sorted(v) for k, v in (filters or {}).items() if v}
+        room_name = DEFAULT_ROOM if not filters else 'frames:' + json.dumps(filters, sort_keys=True)
+        with self.lock:
+            old_room = self._leave(sid)
+            room = self.rooms.get(room_name)
+            if room is None:
+                room = self.rooms[room_name] = _RoomState(filters, self.sample_size)
+            room.members.add(sid)
+            self.client_rooms[sid] = room_name
+        return old_room, room_name
+
+    def unsubscribe(self, sid):
+        """Forget a client (on disconnect); returns the room it was in"""
+        with self.lock:
+            return self._leave(sid)
+
+    def _leave(self, sid):
+        room_name = self.client_rooms.pop(sid, None)
+        if room_name is not None:
+            room = self.rooms.get(room_name)
+            if room is not None:
+                room.members.discard(sid)
+                if not room.members and room_name != DEFAULT_ROOM:
+                    del self.rooms[room_name]
+        return room_name
+
+    def configure(self, rate_hz=None, sample_size=None):
+        """Change frame rate and/or per-frame sample size"""
+        with self.lock:
+            if rate_hz is not None:
+                self.rate_hz = max(0.1, float(rate_hz))
+            if sample_size is not None:
+                self.sample_size = max(0, int(sample_size))
+                for room in self.rooms.values():
+                    room.sample = deque(room.sample, maxlen=self.sample_size)
+
+    def _emit_loop(self):
+        last_frame = time.time()
+        while True:
+            time.sleep(1.0 / self.rate_hz)
+            now = time.time()
+            frames = []
+            with self.lock:
+                for name, room in self.rooms.items():
+                    if not room.count:
+                        continue
+                    frames.append((name, {
+                        'timestamp': now,
+                        'interval': now - last_frame,
+                        'filters': room.filters,
+                        'counts': {
+                            'total': room.count,
+                            'threats': room.threats,
+                            'by_threat_level': dict(room.by_threat_level),
+                            'by_protocol': dict(room.by_protocol),
+                            'max_probability': room.max_probability
+                        },
+                        'events': list(room.sample)
+                    }))
+                    room.reset()
+            last_frame = now
+            self.alert_aggregator.tick(now)
+
+            for room_name, frame in frames:
+                try:
+                    self.socketio.emit('network_frame', frame, to=room_name)
+                    self.stats['frames'] += 1
+                except Exception as e:
+                    self.stats['emit_errors'] += 1
+                    print(f"Frame emission error: {e}")
+
+    def get_stats(self):
+        """Get emission settings, counters and rooms"""
+        with self.lock:
+            rooms = {name: {'filters': room.filters, 'clients': len(room.members)}
+                     for name, room in self.rooms.items()}
+        return dict(self.stats, rate_hz=self.rate_hz, sample_size=self.sample_size, rooms=rooms,
+                    alert_aggregation=self.alert_aggregator.get_stats())
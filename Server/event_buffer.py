@@ -0,0 +1,148 @@
+import threading
+import time
+
+import numpy as np
+
+THREAT_LEVELS = ('LOW', 'MEDIUM', 'HIGH')
+
+EVENT_DTYPE = np.dtype([
+    ('seq', np.uint64),          # Monotonic event number
+    ('timestamp', np.float64),   # Wall-clock time the event was scored
+    ('src_ip', 'S39'),           # Wide enough for a textual IPv6 address
+    ('dst_ip', 'S39'),
+    ('src_port', np.uint16),
+    ('dst_port', np.uint16),
+    ('protocol', 'S8'),
+    ('size', np.int64),
+    ('probability', np.float32),
+    ('prediction', np.int8),
+    ('threat_level', np.int8)    # Index into THREAT_LEVELS
+])
+
+
+class EventRingBuffer:
+    """Preallocated ring buffer of recent scored events backed by a NumPy structured array.
+
+    Appending overwrites the oldest slot in place, so memory stays fixed at
+    ``capacity`` rows (120 bytes each). Range queries (``last``,
+    ``time_range``) return views into the buffer whenever the requested rows
+    don't straddle the wrap point; filter queries return only the matching rows.
+    Views are live: rows may be overwritten by later appends.
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = max(1, int(capacity))
+        self.data = np.zeros(self.capacity, dtype=EVENT_DTYPE)
+        self.total = 0  # Events ever appended; the next slot is total % capacity
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, result):
+        """Store a scored result dict (as produced by the capture pipeline)"""
+        data = result.get('data', {})
+        with self.lock:
+            seq = self.total
+            self.data[seq % self.capacity] = (
+                seq,
+                time.time(),
+                str(data.get('src_ip') or '').encode()[:39],
+                str(data.get('dst_ip') or '').encode()[:39],
+                int(data.get('src_port') or 0) & 0xFFFF,
+                int(data.get('dst_port') or 0) & 0xFFFF,
+                str(data.get('transport_protocol') or '').encode()[:8],
+                int(data.get('packet_size') or 0),
+                result.get('probability', 0.0),
+                result.get('prediction', 0),
+                THREAT_LEVELS.index(result['threat_level']) if result.get('threat_level') in THREAT_LEVELS else 0
+            )
+            self.total = seq + 1
+        return seq
+
+    def _segments(self):
+        """Stored rows as up to two views, oldest first"""
+        if self.total <= self.capacity:
+            return [self.data[:self.total]]
+        head = self.total % self.capacity
+        if head == 0:
+            return [self.data]
+        return [self.data[head:], self.data[:head]]
+
+    @staticmethod
+    def _join(parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def last(self, n):
+        """The most recent ``n`` events, oldest first"""
+        n = max(0, min(int(n), len(self)))
+        if n == 0:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        segments = self._segments()
+        newest = segments[-1]
+        if n <= len(newest):
+            return newest[len(newest) - n:]
+        older = segments[0]
+        return self._join([older[len(older) - (n - len(newest)):], newest])
+
+    def time_range(self, start=None, end=None):
+        """Events scored within [start, end] (epoch seconds)"""
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        parts = []
+        # Timestamps are appended in order, so each segment can be binary searched
+        for segment in self._segments():
+            ts = segment['timestamp']
+            lo = np.searchsorted(ts, start, side='left')
+            hi = np.searchsorted(ts, end, side='right')
+            parts.append(segment[lo:hi])
+        return self._join(parts)
+
+    def above_probability(self, threshold, limit=None):
+        """Events with probability >= threshold, oldest first"""
+        return self._filter(lambda s: s['probability'] >= threshold, limit)
+
+    def by_host(self, host, limit=None):
+        """Events where ``host`` is the source or destination"""
+        host = str(host).encode()
+        return self._filter(lambda s: (s['src_ip'] == host) | (s['dst_ip'] == host), limit)
+
+    def _filter(self, predicate, limit):
+        matches = self._join([segment[predicate(segment)] for segment in self._segments()])
+        if limit is not None:
+            matches = matches[-int(limit):] if limit else matches[:0]
+        return matches
+
+    @staticmethod
+    def to_dicts(records):
+        """Convert buffer rows to JSON-friendly dicts"""
+        return [
+            {
+                'id': int(r['seq']),
+                'timestamp': float(r['timestamp']),
+                'src_ip': r['src_ip'].decode(),
+                'dst_ip': r['dst_ip'].decode(),
+                'src_port': int(r['src_port']),
+                'dst_port': int(r['dst_port']),
+                'transport_protocol': r['protocol'].decode(),
+                'packet_size': int(r['size']),
+                'probability': float(r['probability']),
+                'prediction': int(r['prediction']),
+                'threat_level': THREAT_LEVELS[int(r['threat_level'])]
+            }
+            for r in records
+        ]
+
+    def get_stats(self):
+        """Get buffer occupancy"""
+        return {
+            'capacity': self.capacity,
+            'stored': len(self),
+            'total_events': self.total,
+            'memory_bytes': int(self.data.nbytes)
+        }
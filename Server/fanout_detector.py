@@ -0,0 +1,285 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+PORTS = 0
+HOSTS = 1
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix64(values):
+    """splitmix64 finalizer: spreads Python hashes (identity for small ints) over 64 bits"""
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class FanoutDetector:
+    """Per-source fan-out (port scan / host sweep) detector built on HyperLogLog.
+
+    For every tracked source two HyperLogLog sketches estimate the distinct
+    destination ports and the distinct destination hosts it has contacted.
+    Only connection attempts count (TCP SYNs, UDP requests, ICMP echo
+    requests), so busy servers answering many clients don't look like
+    scanners. Registers live in one preallocated array of ``max_sources``
+    rows, so memory is fixed; the least recently seen source is evicted when
+    it is full, and sources idle for two windows are dropped.
+
+    The window is approximated with two epochs of registers: estimates merge
+    the current and previous epoch, covering between one and two windows.
+    A source crossing ``port_threshold`` or ``host_threshold`` raises an
+    alert through ``on_alert``; ``scores`` exposes the same estimates as
+    model features.
+    """
+
+    def __init__(self, on_alert=None, precision=7, max_sources=20000, window_seconds=60.0,
+                 port_threshold=100, host_threshold=50, batch_size=256, flush_interval=0.1,
+                 enabled=True):
+        self.on_alert = on_alert
+        self.enabled = enabled
+        self.precision = int(precision)
+        self.m = 1 << self.precision
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+        self.max_sources = int(max_sources)
+        self.window_seconds = float(window_seconds)
+        self.port_threshold = float(port_threshold)
+        self.host_threshold = float(host_threshold)
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+
+        # rows x epoch x (ports, hosts) x registers
+        self.registers = np.zeros((self.max_sources, 2, 2, self.m), dtype=np.uint8)
+        self.last_seen = np.zeros(self.max_sources)
+        self.rows = OrderedDict()  # source -> row, least recently seen first
+        self.free_rows = list(range(self.max_sources - 1, -1, -1))
+        self.epoch = 0
+        self.epoch_start = None
+        self.alerting = {}  # (kind, source) -> time the alert was raised
+
+        self.buffer = []
+        self.last_flush = None
+        self.lock = threading.Lock()
+        self.stats = {'packets': 0, 'counted': 0, 'evicted': 0, 'expired': 0, 'alerts': 0}
+
+    @staticmethod
+    def _is_initiation(packet_info):
+        """Whether a packet opens a connection (so its destination is the source's choice)"""
+        protocol = packet_info.get('transport_protocol')
+        if protocol == 'TCP':
+            flags = int(packet_info.get('tcp_flags') or 0)
+            return bool(flags & 0x02) and not flags & 0x10  # SYN without ACK
+        if protocol == 'UDP':
+            # Replies come from a well-known port back to an ephemeral one
+            return not (packet_info.get('src_port', 0) < 1024 <= packet_info.get('dst_port', 0))
+        if protocol == 'ICMP':
+            return packet_info.get('icmp_type', 8) in (8, 128)  # Echo request (v4, v6)
+        return False
+
+    def add(self, packet_info, initiation=None):
+        """Count a packet (or, with ``initiation=True``, a logged connection) from its source"""
+        if not self.enabled:
+            return
+        self.stats['packets'] += 1
+        if initiation is None:
+            initiation = self._is_initiation(packet_info)
+        if not initiation:
+            return
+        timestamp = packet_info.get('timestamp') or time.time()
+        with self.lock:
+            self.buffer.append(packet_info)
+            if self.last_flush is None:
+                self.last_flush = timestamp
+            if len(self.buffer) >= self.batch_size or timestamp - self.last_flush >= self.flush_interval:
+                self._flush(timestamp)
+
+    def add_many(self, packets):
+        """Count a batch of packets"""
+        if not self.enabled or not packets:
+            return
+        self.stats['packets'] += len(packets)
+        initiations = [p for p in packets if self._is_initiation(p)]
+        timestamp = packets[-1].get('timestamp') or time.time()
+        with self.lock:
+            self.buffer.extend(initiations)
+            self._flush(timestamp)
+
+    def flush(self, now=None):
+        """Fold buffered packets in (e.g. from a housekeeping timer when traffic is sparse)"""
+        with self.lock:
+            if self.buffer:
+                self._flush(now or self.buffer[-1].get('timestamp') or time.time())
+
+    def _row_for(self, source, timestamp):
+        row = self.rows.get(source)
+        if row is not None:
+            self.rows.move_to_end(source)
+        else:
+            if not self.free_rows:
+                _, row = self.rows.popitem(last=False)
+                self.registers[row] = 0
+                self.stats['evicted'] += 1
+            else:
+                row = self.free_rows.pop()
+            self.rows[source] = row
+        self.last_seen[row] = timestamp
+        return row
+
+    def _advance(self, timestamp):
+        if self.epoch_start is None:
+            self.epoch_start = timestamp
+            return
+        if timestamp - self.epoch_start < self.window_seconds:
+            return
+        idle_epochs = min(2, int((timestamp - self.epoch_start) // self.window_seconds))
+        for _ in range(idle_epochs):
+            self.epoch ^= 1
+            self.registers[:, self.epoch] = 0
+        self.epoch_start = timestamp
+
+        # Drop sources that haven't initiated anything for two windows
+        while self.rows:
+            source, row = next(iter(self.rows.items()))
+            if timestamp - self.last_seen[row] < 2 * self.window_seconds:
+                break
+            del self.rows[source]
+            self.registers[row] = 0
+            self.free_rows.append(row)
+            self.stats['expired'] += 1
+
+        for key, raised_at in list(self.alerting.items()):
+            if timestamp - raised_at >= self.window_seconds:
+                del self.alerting[key]
+
+    def _flush(self, timestamp):
+        packets, self.buffer = self.buffer, []
+        self.last_flush = timestamp
+        if not packets:
+            return
+        self._advance(timestamp)
+        self.stats['counted'] += len(packets)
+
+        # A chunk never holds more sources than there are rows, so resolving
+        # a row can't evict a source that is still being counted
+        alerts = []
+        chunk, sources = [], set()
+        for packet_info in packets:
+            source = packet_info.get('src_ip')
+            if source not in sources and len(sources) >= self.max_sources:
+                alerts.extend(self._count(chunk, timestamp))
+                chunk, sources = [], set()
+            chunk.append(packet_info)
+            sources.add(source)
+        alerts.extend(self._count(chunk, timestamp))
+
+        if alerts:
+            self.stats['alerts'] += len(alerts)
+            if self.on_alert is not None:
+                for alert in alerts:
+                    try:
+                        self.on_alert(alert)
+                    except Exception as e:
+                        print(f"Fan-out alert error: {e}")
+
+    def _count(self, packets, timestamp):
+        """Fold packets from at most ``max_sources`` sources into the registers; returns new alerts"""
+        sources = [p.get('src_ip') for p in packets]
+        rows = np.array([self._row_for(source, timestamp) for source in sources])
+        port_hashes = _mix64(np.array([hash((p.get('transport_protocol'), p.get('dst_port') or 0))
+                                       for p in packets], dtype=np.int64).view(np.uint64))
+        host_hashes = _mix64(np.array([hash(p.get('dst_ip')) for p in packets],
+                                      dtype=np.int64).view(np.uint64))
+        # ICMP has no ports: it only counts towards host sweeps
+        has_port = np.array([p.get('transport_protocol') != 'ICMP' for p in packets])
+
+        for kind, hashes, mask in ((PORTS, port_hashes, has_port), (HOSTS, host_hashes, None)):
+            kind_rows = rows if mask is None else rows[mask]
+            if mask is not None:
+                hashes = hashes[mask]
+            if not len(hashes):
+                continue
+            index, rank = self._register_updates(hashes)
+            np.maximum.at(self.registers, (kind_rows, self.epoch, kind, index), rank)
+
+        touched = list(dict.fromkeys(sources))
+        estimates = self._estimate_rows(np.array([self.rows[s] for s in touched]))
+        alerts = []
+        for source, (ports, hosts) in zip(touched, estimates.tolist()):
+            for kind, value, threshold in (('port_scan', ports, self.port_threshold),
+                                           ('host_sweep', hosts, self.host_threshold)):
+                if value >= threshold and (kind, source) not in self.alerting:
+                    self.alerting[(kind, source)] = timestamp
+                    alerts.append(self._build_alert(kind, source, ports, hosts, value / threshold, timestamp))
+
+        return alerts
+
+    def _register_updates(self, hashes):
+        """Register index (top bits) and rank (position of the first 1 bit in the rest)"""
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        rest = (hashes << p) & _MASK64
+        # Leading zeros of the remaining 64 - p bits, plus one; all-zero gets the maximum
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, 64 - self.precision + 1, 65 - exponent)
+        return index, np.minimum(rank, 64 - self.precision + 1).astype(np.uint8)
+
+    def _estimate_rows(self, rows):
+        """Distinct (ports, hosts) estimates for register rows, shape n x 2"""
+        if not len(rows):
+            return np.zeros((0, 2))
+        merged = self.registers[rows].max(axis=1).astype(np.float64)  # n x 2 x m
+        raw = self.alpha * self.m * self.m / np.power(2.0, -merged).sum(axis=2)
+        zeros = (merged == 0).sum(axis=2)
+        # Small-range correction (linear counting)
+        with np.errstate(divide='ignore'):
+            linear = self.m * np.log(self.m / np.maximum(zeros, 1))
+        return np.where((raw <= 2.5 * self.m) & (zeros > 0), linear, raw)
+
+    def scores(self, sources):
+        """Per-source fan-out features: distinct ports/hosts and their scores vs. the thresholds"""
+        with self.lock:
+            rows = [self.rows.get(source) for source in sources]
+            known = [i for i, row in enumerate(rows) if row is not None]
+            estimates = np.zeros((len(sources), 2))
+            if known:
+                estimates[known] = self._estimate_rows(np.array([rows[i] for i in known]))
+        return {
+            'src_distinct_dst_ports': estimates[:, PORTS],
+            'src_distinct_dst_hosts': estimates[:, HOSTS],
+            'port_scan_score': np.minimum(estimates[:, PORTS] / self.port_threshold, 1.0),
+            'host_sweep_score': np.minimum(estimates[:, HOSTS] / self.host_threshold, 1.0)
+        }
+
+    def _build_alert(self, kind, source, ports, hosts, score, timestamp):
+        if kind == 'port_scan':
+            message = f"Port scan: {source} probed ~{ports:.0f} distinct ports"
+        else:
+            message = f"Host sweep: {source} contacted ~{hosts:.0f} distinct hosts"
+        return {
+            'type': kind,
+            'timestamp': timestamp,
+            'threat_level': 'HIGH' if score >= 2 else 'MEDIUM',
+            'probability': min(1.0, 0.5 + 0.25 * score),
+            'source': 'fanout',
+            'data': {'src_ip': source, 'distinct_dst_ports': ports, 'distinct_dst_hosts': hosts,
+                     'score': score, 'window': self.window_seconds},
+            'message': f"{message} in the last {self.window_seconds:.0f}s"
+        }
+
+    def get_stats(self):
+        """Get counters, tracked sources and memory footprint"""
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            tracked_sources=len(self.rows),
+            max_sources=self.max_sources,
+            precision=self.precision,
+            standard_error=1.04 / math.sqrt(self.m),
+            active_alerts=len(self.alerting),
+            memory_bytes=int(self.registers.nbytes + self.last_seen.nbytes)
+        )
@@ -0,0 +1,326 @@
+from collections import OrderedDict
+
+# TCP flag bits
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+PORT_SERVICE_MAP = {
+    80: 'http', 443: 'https', 22: 'ssh', 21: 'ftp',
+    25: 'smtp', 53: 'dns', 110: 'pop3', 143: 'imap',
+    993: 'imaps', 995: 'pop3s', 23: 'telnet', 3306: 'mysql'
+}
+
+
+def map_port_to_service(port):
+    """Map port number to service name"""
+    return PORT_SERVICE_MAP.get(port, 'other')
+
+
+class Flow:
+    """Bidirectional connection state for a single 5-tuple"""
+
+    __slots__ = (
+        'key', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'protocol',
+        'transport_protocol', 'start_time', 'last_time',
+        'src_bytes', 'dst_bytes', 'src_packets', 'dst_packets',
+        'syn_seen', 'synack_seen', 'orig_fin', 'resp_fin',
+        'orig_rst', 'resp_rst', 'end_reason', 'conn_state'
+    )
+
+    def __init__(self, key, packet_info, timestamp):
+        self.key = key
+        # The originator is whoever sent the first packet we saw
+        self.src_ip = packet_info.get('src_ip')
+        self.dst_ip = packet_info.get('dst_ip')
+        self.src_port = packet_info.get('src_port', 0)
+        self.dst_port = packet_info.get('dst_port', 0)
+        self.protocol = packet_info.get('protocol')
+        self.transport_protocol = packet_info.get('transport_protocol', 'OTHER')
+        self.start_time = timestamp
+        self.last_time = timestamp
+        self.src_bytes = 0
+        self.dst_bytes = 0
+        self.src_packets = 0
+        self.dst_packets = 0
+        self.syn_seen = False
+        self.synack_seen = False
+        self.orig_fin = False
+        self.resp_fin = False
+        self.orig_rst = False
+        self.resp_rst = False
+        self.end_reason = None
+        self.conn_state = None  # Set when the flow comes from a connection log
+
+    @classmethod
+    def from_record(cls, record):
+        """Build a completed flow from a connection-level log record (Zeek, CSV flows)"""
+        start = record.get('timestamp') or 0.0
+        flow = cls(FlowTable.flow_key(record), record, start)
+        flow.last_time = start + (record.get('duration') or 0.0)
+        flow.src_bytes = int(record.get('src_bytes') or 0)
+        flow.dst_bytes = int(record.get('dst_bytes') or 0)
+        flow.src_packets = int(record.get('src_packets') or 0)
+        flow.dst_packets = int(record.get('dst_packets') or 0)
+        flow.conn_state = record.get('conn_state') or None
+        flow.end_reason = 'log_record'
+        return flow
+
+    def add_packet(self, packet_info, timestamp):
+        """Account a packet to the flow, in whichever direction it travels"""
+        size = packet_info.get('packet_size', 0)
+        from_orig = (packet_info.get('src_ip') == self.src_ip and
+                     packet_info.get('src_port', 0) == self.src_port)
+
+        if from_orig:
+            self.src_bytes += size
+            self.src_packets += 1
+        else:
+            self.dst_bytes += size
+            self.dst_packets += 1
+
+        if timestamp > self.last_time:
+            self.last_time = timestamp
+
+        if self.transport_protocol == 'TCP':
+            flags = int(packet_info.get('tcp_flags') or 0)
+            if flags & TCP_SYN:
+                if flags & TCP_ACK:
+                    if not from_orig:
+                        self.synack_seen = True
+                elif from_orig:
+                    self.syn_seen = True
+            if flags & TCP_FIN:
+                if from_orig:
+                    self.orig_fin = True
+                else:
+                    self.resp_fin = True
+            if flags & TCP_RST:
+                if from_orig:
+                    self.orig_rst = True
+                else:
+                    self.resp_rst = True
+
+    @property
+    def duration(self):
+        return self.last_time - self.start_time
+
+    @property
+    def is_terminated(self):
+        """Whether the TCP connection has been closed by both sides or reset"""
+        return (self.orig_rst or self.resp_rst or
+                (self.orig_fin and self.resp_fin))
+
+    @property
+    def state_flag(self):
+        """KDD-style connection status flag (SF, S0, REJ, RSTO, ...)"""
+        if self.conn_state:
+            return self.conn_state
+        if self.transport_protocol != 'TCP':
+            return 'SF'
+        if self.syn_seen and not self.synack_seen:
+            if self.resp_rst:
+                return 'REJ'
+            if self.orig_rst:
+                return 'RSTOS0'
+            return 'S0'
+        if self.orig_rst:
+            return 'RSTO'
+        if self.resp_rst:
+            return 'RSTR'
+        if self.orig_fin and self.resp_fin:
+            return 'SF'
+        if self.syn_seen:
+            return 'S1'
+        return 'OTH'
+
+    @property
+    def is_serror(self):
+        """SYN error: connection attempt that never completed the handshake"""
+        return self.state_flag in ('S0', 'S1', 'S2', 'S3', 'RSTOS0', 'SH')
+
+    @property
+    def is_rerror(self):
+        """REJ error: connection rejected by the responder"""
+        return self.state_flag == 'REJ'
+
+    @property
+    def service(self):
+        return map_port_to_service(self.dst_port)
+
+    def to_dict(self):
+        """Summary of the flow, shaped like the packet_info dicts clients expect"""
+        return {
+            'src_ip': self.src_ip,
+            'dst_ip': self.dst_ip,
+            'src_port': self.src_port,
+            'dst_port': self.dst_port,
+            'protocol': self.protocol,
+            'transport_protocol': self.transport_protocol,
+            'service': self.service,
+            'start_time': self.start_time,
+            'timestamp': self.last_time,
+            'duration': self.duration,
+            'src_bytes': self.src_bytes,
+            'dst_bytes': self.dst_bytes,
+            'src_packets': self.src_packets,
+            'dst_packets': self.dst_packets,
+            'packet_size': self.src_bytes + self.dst_bytes,
+            'flag': self.state_flag,
+            'end_reason': self.end_reason
+        }
+
+    def to_features(self):
+        """Per-connection KDD features; traffic-window features default to this flow alone"""
+        serror = 1.0 if self.is_serror else 0.0
+        rerror = 1.0 if self.is_rerror else 0.0
+        return {
+            'duration': self.duration,
+            'protocol': self.transport_protocol,
+            'service': self.service,
+            'src_bytes': self.src_bytes,
+            'dst_bytes': self.dst_bytes,
+            'count': 1,
+            'srv_count': 1,
+            'serror_rate': serror,
+            'srv_serror_rate': serror,
+            'rerror_rate': rerror,
+            'srv_rerror_rate': rerror,
+            'same_srv_rate': 1.0,
+            'diff_srv_rate': 0.0,
+            'dst_host_count': 1,
+            'dst_host_srv_count': 1,
+            'dst_host_same_srv_rate': 1.0,
+            'dst_host_diff_srv_rate': 0.0,
+            'dst_host_serror_rate': serror,
+            'dst_host_srv_serror_rate': serror
+        }
+
+
+class FlowTable:
+    """Bidirectional flow table keyed by the 5-tuple.
+
+    Flows are kept in an OrderedDict in least-recently-seen order, so idle
+    expiry only has to look at the front of the table and the memory cap is
+    enforced by evicting the least recently used flow.
+    """
+
+    def __init__(self, idle_timeout=15.0, active_timeout=120.0, max_flows=100000,
+                 close_linger=2.0):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.close_linger = close_linger
+        self.flows = OrderedDict()
+        # Recently terminated TCP flows, so trailing ACKs don't open new flows
+        self.closed = OrderedDict()
+        self.stats = {
+            'packets': 0,
+            'flows_created': 0,
+            'flows_completed': 0,
+            'idle_expired': 0,
+            'active_expired': 0,
+            'terminated': 0,
+            'evicted': 0,
+            'late_packets': 0
+        }
+
+    @staticmethod
+    def flow_key(packet_info):
+        """Direction-independent 5-tuple key"""
+        a = (packet_info.get('src_ip'), packet_info.get('src_port', 0))
+        b = (packet_info.get('dst_ip'), packet_info.get('dst_port', 0))
+        proto = packet_info.get('transport_protocol', packet_info.get('protocol'))
+        if (str(a[0]), a[1] or 0) <= (str(b[0]), b[1] or 0):
+            return (proto, a, b)
+        return (proto, b, a)
+
+    def update(self, packet_info, timestamp=None):
+        """Add a packet to its flow and return any flows completed as a result"""
+        if timestamp is None:
+            timestamp = packet_info.get('timestamp', 0.0)
+
+        completed = []
+        key = self.flow_key(packet_info)
+        flow = self.flows.get(key)
+        self.stats['packets'] += 1
+
+        if flow is not None and timestamp - flow.start_time >= self.active_timeout:
+            # Long-lived connection: report what we have and start a new record
+            completed.append(self._complete(key, 'active_timeout'))
+            flow = None
+
+        if flow is None and key in self.closed:
+            if (timestamp - self.closed[key] < self.close_linger and
+                    not int(packet_info.get('tcp_flags') or 0) & TCP_SYN):
+                self.stats['late_packets'] += 1
+                return completed
+            del self.closed[key]
+
+        if flow is None:
+            flow = Flow(key, packet_info, timestamp)
+            self.flows[key] = flow
+            self.stats['flows_created'] += 1
+            while len(self.flows) > self.max_flows:
+                oldest_key = next(iter(self.flows))
+                completed.append(self._complete(oldest_key, 'evicted'))
+        else:
+            self.flows.move_to_end(key)
+
+        flow.add_packet(packet_info, timestamp)
+
+        if flow.is_terminated:
+            completed.append(self._complete(key, 'terminated'))
+            self.closed[key] = timestamp
+            while len(self.closed) > self.max_flows:
+                self.closed.popitem(last=False)
+
+        return completed
+
+    def expire(self, now):
+        """Complete all flows idle for longer than idle_timeout"""
+        while self.closed:
+            key, closed_at = next(iter(self.closed.items()))
+            if now - closed_at < self.close_linger:
+                break
+            del self.closed[key]
+
+        completed = []
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if now - flow.last_time < self.idle_timeout:
+                break
+            completed.append(self._complete(key, 'idle_timeout'))
+        return completed
+
+    def flush(self):
+        """Complete every remaining flow (end of capture)"""
+        self.closed.clear()
+        completed = []
+        while self.flows:
+            completed.append(self._complete(next(iter(self.flows)), 'flushed'))
+        return completed
+
+    def _complete(self, key, reason):
+        flow = self.flows.pop(key)
+        flow.end_reason = reason
+        self.stats['flows_completed'] += 1
+        if reason == 'idle_timeout':
+            self.stats['idle_expired'] += 1
+        elif reason == 'active_timeout':
+            self.stats['active_expired'] += 1
+        elif reason == 'terminated':
+            self.stats['terminated'] += 1
+        elif reason == 'evicted':
+            self.stats['evicted'] += 1
+        return flow
+
+    def get_stats(self):
+        """Get flow table counters"""
+        stats = dict(self.stats)
+        stats['active_flows'] = len(self.flows)
+        stats['max_flows'] = self.max_flows
+        stats['idle_timeout'] = self.idle_timeout
+        stats['active_timeout'] = self.active_timeout
+        return stats
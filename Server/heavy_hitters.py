@@ -0,0 +1,336 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+# What a packet is counted under, per dimension
+DIMENSIONS = ('src', 'dst', 'dst_port')
+METRICS = ('packets', 'bytes')
+
+
+def _dimension_key(dimension, packet_info):
+    if dimension == 'src':
+        return packet_info.get('src_ip')
+    if dimension == 'dst':
+        return packet_info.get('dst_ip')
+    return f"{packet_info.get('transport_protocol', 'OTHER')}/{packet_info.get('dst_port') or 0}"
+
+
+def _floor_for(floor, dimension):
+    return floor[dimension] if isinstance(floor, dict) else floor
+
+
+class SlidingCountMinSketch:
+    """Count-Min Sketch over a sliding time window, for several metrics at once.
+
+    The window is split into ``slots`` sub-windows; each has its own
+    ``depth`` x ``width`` counter table and a running ``total`` holds their
+    sum, so a point query is one gather and a min. Memory is fixed by the
+    dimensions, whatever the number of distinct keys. Rows are indexed with
+    multiply-shift hashing of the key's 64-bit hash, vectorized over batches.
+    """
+
+    def __init__(self, width=2048, depth=4, slots=5, slot_seconds=2.0, metrics=1, seed=0):
+        self.width = 1 << max(1, int(math.ceil(math.log2(width))))  # Power of two for multiply-shift
+        self.depth = int(depth)
+        self.slots = int(slots)
+        self.slot_seconds = float(slot_seconds)
+        self.shift = np.uint64(64 - int(math.log2(self.width)))
+        rng = np.random.default_rng(seed)
+        self.multipliers = (rng.integers(1, 2 ** 63, size=self.depth, dtype=np.uint64) * np.uint64(2)
+                            + np.uint64(1))[:, None]
+        self.tables = np.zeros((self.slots, metrics, self.depth, self.width), dtype=np.int64)
+        self.total = np.zeros((metrics, self.depth, self.width), dtype=np.int64)
+        self.rows = np.arange(self.depth)[:, None]
+        self.current = 0
+        self.slot_start = None
+
+    @property
+    def window_seconds(self):
+        return self.slots * self.slot_seconds
+
+    def _indexes(self, hashes):
+        with np.errstate(over='ignore'):
+            # Below width, so safe as signed indexes (bincount refuses uint64)
+            return ((hashes[None, :] * self.multipliers) >> self.shift).astype(np.intp)
+
+    def advance(self, timestamp):
+        """Rotate out sub-windows older than the window; returns how many were rotated"""
+        if self.slot_start is None:
+            self.slot_start = timestamp
+            return 0
+        rotated = 0
+        while timestamp - self.slot_start >= self.slot_seconds and rotated < self.slots:
+            self.current = (self.current + 1) % self.slots
+            self.total -= self.tables[self.current]
+            self.tables[self.current] = 0
+            self.slot_start += self.slot_seconds
+            rotated += 1
+        if timestamp - self.slot_start >= self.slot_seconds:
+            # Idle for longer than the whole window
+            self.slot_start = timestamp
+        return rotated
+
+    def add(self, hashes, values):
+        """Add ``values`` (metrics x n) for keys with the given uint64 hashes"""
+        idx = self._indexes(hashes)
+        for metric in range(values.shape[0]):
+            for row in range(self.depth):
+                counts = np.bincount(idx[row], weights=values[metric], minlength=self.width).astype(np.int64)
+                self.tables[self.current, metric, row] += counts
+                self.total[metric, row] += counts
+
+    def estimate(self, hashes):
+        """Window estimates, metrics x n (never under-estimates)"""
+        idx = self._indexes(hashes)
+        return self.total[:, self.rows, idx].min(axis=1)
+
+    @property
+    def nbytes(self):
+        return int(self.tables.nbytes + self.total.nbytes)
+
+
+class _AdaptiveThreshold:
+    """EWMA baseline of the heaviest normal key's rate.
+
+    The threshold is the larger of ``margin`` x mean and mean + z * std, and
+    never below a floor.
+    """
+
+    def __init__(self, floor, z=4.0, margin=2.0, alpha=0.1):
+        self.floor = float(floor)
+        self.z = float(z)
+        self.margin = float(margin)
+        self.alpha = float(alpha)
+        self.mean = None
+        self.var = 0.0
+
+    def learn(self, rate):
+        if self.mean is None:
+            self.mean = rate
+            return
+        delta = rate - self.mean
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+    @property
+    def value(self):
+        if self.mean is None:
+            return self.floor
+        return max(self.floor, self.margin * self.mean, self.mean + self.z * math.sqrt(self.var))
+
+
+class HeavyHitterDetector:
+    """Streaming volumetric-DoS detector: who sends / receives / is targeted most.
+
+    Packets are buffered and folded into one sliding Count-Min Sketch per
+    dimension (source IP, destination IP, protocol/destination port) counting
+    packets and bytes. A top-k candidate set per dimension and metric keeps
+    the heaviest keys. A key raises an alert (``on_alert``) when its window
+    rate exceeds an adaptive threshold learnt from earlier non-alerting heavy
+    keys and it carries at least ``min_share`` of the window's traffic.
+    Alerts start once one full window has been observed. Time is packet
+    time, so pcap replay behaves like live capture.
+
+    Rate floors are a number or a ``{dimension: floor}`` mapping. A detector
+    that sees one of ``shards`` client-sharded slices of the traffic checks
+    a source's share against the window total extrapolated to all shards,
+    since the source's own traffic is all in its shard.
+    """
+
+    def __init__(self, on_alert=None, width=2048, depth=4, slots=5, slot_seconds=2.0,
+                 top_k=20, min_share=0.1, z=4.0, margin=2.0, packet_rate_floor=2000,
+                 byte_rate_floor=2000000, batch_size=256, flush_interval=0.1, enabled=True,
+                 shards=1):
+        self.on_alert = on_alert
+        self.enabled = enabled
+        self.top_k = int(top_k)
+        self.min_share = float(min_share)
+        self.shards = max(1, int(shards))
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.sketches = {dimension: SlidingCountMinSketch(width, depth, slots, slot_seconds,
+                                                           metrics=len(METRICS), seed=i)
+                         for i, dimension in enumerate(DIMENSIONS)}
+        self.window_totals = np.zeros((slots, len(METRICS)), dtype=np.int64)
+        self.candidates = {(d, m): {} for d in DIMENSIONS for m in METRICS}
+        floors = {'packets': packet_rate_floor, 'bytes': byte_rate_floor}
+        self.thresholds = {(d, m): _AdaptiveThreshold(_floor_for(floors[m], d), z, margin)
+                           for d in DIMENSIONS for m in METRICS}
+        self.rotations = 0
+        self.alerting = {}  # (dimension, key) -> time the alert was raised
+        self.buffer = []
+        self.last_flush = None
+        self.lock = threading.Lock()
+        self.stats = {'packets': 0, 'batches': 0, 'alerts': 0}
+
+    def add(self, packet_info):
+        """Count one packet; cheap enough to call for every packet in the capture thread"""
+        if not self.enabled:
+            return
+        timestamp = packet_info.get('timestamp') or time.time()
+        with self.lock:
+            self.buffer.append(packet_info)
+            if self.last_flush is None:
+                self.last_flush = timestamp
+            if len(self.buffer) >= self.batch_size or timestamp - self.last_flush >= self.flush_interval:
+                self._flush(timestamp)
+
+    def add_many(self, packets):
+        """Count a batch of packets"""
+        if not self.enabled or not packets:
+            return
+        timestamp = packets[-1].get('timestamp') or time.time()
+        with self.lock:
+            self.buffer.extend(packets)
+            self._flush(timestamp)
+
+    def flush(self, now=None):
+        """Fold buffered packets in (e.g. from a housekeeping timer when traffic is sparse)"""
+        with self.lock:
+            if self.buffer:
+                self._flush(now or self.buffer[-1].get('timestamp') or time.time())
+
+    def _flush(self, timestamp):
+        packets, self.buffer = self.buffer, []
+        self.last_flush = timestamp
+        self.stats['packets'] += len(packets)
+        self.stats['batches'] += 1
+
+        values = np.array([[1, p.get('packet_size') or 0] for p in packets], dtype=np.int64).T
+
+        first = next(iter(self.sketches.values()))
+        rotated = first.advance(timestamp)
+        for sketch in list(self.sketches.values())[1:]:
+            sketch.advance(timestamp)
+        if rotated:
+            self._rotate_totals(first, rotated)
+        self.window_totals[first.current] += values.sum(axis=1)
+
+        window = first.window_seconds
+        totals = self.window_totals.sum(axis=0)
+        alerts = []
+        for dimension, sketch in self.sketches.items():
+            keys = [_dimension_key(dimension, p) for p in packets]
+            hashes = np.array([hash(k) for k in keys], dtype=np.int64).view(np.uint64)
+            sketch.add(hashes, values)
+
+            unique = {}
+            for key, h in zip(keys, hashes.tolist()):
+                unique[key] = h
+            estimates = sketch.estimate(np.array(list(unique.values()), dtype=np.uint64))
+            for m, metric in enumerate(METRICS):
+                candidates = self.candidates[(dimension, metric)]
+                threshold = self.thresholds[(dimension, metric)].value
+                # No alerts until one full window has taught the baseline
+                warmed_up = self.rotations >= sketch.slots
+                for key, estimate in zip(unique, estimates[m].tolist()):
+                    candidates[key] = (unique[key], estimate)
+                    rate = estimate / window
+                    total = totals[m]
+                    if dimension == 'src' and self.shards > 1:
+                        total = estimate + max(total - estimate, 0) * self.shards
+                    if (warmed_up and rate >= threshold and estimate >= self.min_share * total
+                            and (dimension, key) not in self.alerting):
+                        self.alerting[(dimension, key)] = timestamp
+                        alerts.append(self._build_alert(dimension, key, metric, rate, threshold,
+                                                        estimate / max(total, 1), timestamp))
+                if len(candidates) > 2 * self.top_k:
+                    self._trim(candidates)
+
+        # Keys stay quiet for a window after alerting
+        for alerted_key, raised_at in list(self.alerting.items()):
+            if timestamp - raised_at >= window:
+                del self.alerting[alerted_key]
+
+        if alerts:
+            self.stats['alerts'] += len(alerts)
+            if self.on_alert is not None:
+                for alert in alerts:
+                    try:
+                        self.on_alert(alert)
+                    except Exception as e:
+                        print(f"Heavy hitter alert error: {e}")
+
+    def _rotate_totals(self, sketch, rotated):
+        for step in range(min(rotated, sketch.slots)):
+            self.window_totals[(sketch.current - step) % sketch.slots] = 0
+        self.rotations += rotated
+        if self.rotations < sketch.slots:
+            return
+        # Learn how heavy the heaviest normal key is, from the last full window
+        window = sketch.window_seconds
+        for (dimension, metric), candidates in self.candidates.items():
+            self._refresh(dimension, metric)
+            normal = [estimate for key, (_, estimate) in candidates.items()
+                      if (dimension, key) not in self.alerting]
+            if normal:
+                self.thresholds[(dimension, metric)].learn(max(normal) / window)
+
+    def _refresh(self, dimension, metric):
+        """Re-estimate candidates against the current window and drop the ones that went quiet"""
+        candidates = self.candidates[(dimension, metric)]
+        if not candidates:
+            return
+        m = METRICS.index(metric)
+        hashes = np.array([h for h, _ in candidates.values()], dtype=np.uint64)
+        estimates = self.sketches[dimension].estimate(hashes)[m].tolist()
+        for key, estimate in zip(list(candidates), estimates):
+            if estimate:
+                candidates[key] = (candidates[key][0], estimate)
+            else:
+                del candidates[key]
+        self._trim(candidates)
+
+    def _trim(self, candidates):
+        if len(candidates) <= self.top_k:
+            return
+        keep = sorted(candidates.items(), key=lambda item: item[1][1], reverse=True)[:self.top_k]
+        candidates.clear()
+        candidates.update(keep)
+
+    def _build_alert(self, dimension, key, metric, rate, threshold, share, timestamp):
+        label = {'src': 'source', 'dst': 'destination', 'dst_port': 'destination port'}[dimension]
+        unit = 'packets/s' if metric == 'packets' else 'bytes/s'
+        data = {'dimension': dimension, 'key': key, 'metric': metric, 'rate': rate,
+                'threshold': threshold, 'share': share}
+        if dimension == 'src':
+            data['src_ip'] = key
+        elif dimension == 'dst':
+            data['dst_ip'] = key
+        else:
+            data['transport_protocol'], _, port = key.partition('/')
+            data['dst_port'] = int(port)
+        return {
+            'type': 'heavy_hitter',
+            'timestamp': timestamp,
+            'threat_level': 'HIGH',
+            'probability': min(1.0, 0.7 + 0.3 * (1 - threshold / rate)) if rate else 0.7,
+            'source': 'heavy_hitter',
+            'data': data,
+            'message': (f"Volumetric anomaly: {label} {key} at {rate:,.0f} {unit} "
+                        f"({share:.0%} of traffic, threshold {threshold:,.0f})")
+        }
+
+    def top(self, dimension, metric='packets', k=None):
+        """Current heaviest keys of a dimension, with window rates"""
+        with self.lock:
+            self._refresh(dimension, metric)
+            window = self.sketches[dimension].window_seconds
+            ranked = sorted(self.candidates[(dimension, metric)].items(),
+                            key=lambda item: item[1][1], reverse=True)[:k or self.top_k]
+        return [{'key': key, metric: estimate, 'rate': estimate / window}
+                for key, (_, estimate) in ranked]
+
+    def get_stats(self):
+        """Get counters, thresholds and memory footprint"""
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            shards=self.shards,
+            window_seconds=next(iter(self.sketches.values())).window_seconds,
+            thresholds={f"{d}.{m}": t.value for (d, m), t in self.thresholds.items()},
+            active_alerts=len(self.alerting),
+            memory_bytes=sum(s.nbytes for s in self.sketches.values())
+        )
@@ -0,0 +1,93 @@
+import hashlib
+import ipaddress
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+
+class PrefixPreservingAnonymizer:
+    """Keyed, prefix-preserving IP anonymization (Crypto-PAn construction).
+
+    Bit ``i`` of the output is bit ``i`` of the input XOR a pseudorandom bit
+    derived from the key and the first ``i`` input bits, so two addresses that
+    share a k-bit prefix map to addresses sharing exactly a k-bit prefix:
+    subnets and host identity survive, the real addresses don't. Keyed
+    BLAKE2b stands in for the AES PRF of the original scheme. IPv4 and IPv6
+    are supported; the same key gives the same mapping in every process.
+
+    Results are memoized in a bounded LRU cache, and the anonymized form of
+    each /24 (IPv4) or /64 (IPv6) network is cached too, so a new host in a
+    known network only costs the PRF calls for its host bits.
+    """
+
+    def __init__(self, key=None, cache_size=65536):
+        if key is None:
+            key = os.urandom(32)
+        elif isinstance(key, str):
+            key = key.encode()
+        self.secret = key  # Hand this to other processes that must produce the same mapping
+        self.key = hashlib.sha256(key).digest()
+        self.cache_size = int(cache_size)
+        self.anonymize = lru_cache(maxsize=self.cache_size)(self._anonymize)
+        self.network_cache = OrderedDict()
+        self.network_lock = threading.Lock()
+
+    def _prf_bit(self, bits, length, prefix):
+        data = bytes((bits, length)) + prefix.to_bytes(16, 'big')
+        return hashlib.blake2b(data, key=self.key, digest_size=1).digest()[0] >> 7
+
+    def _anonymize_bits(self, value, bits, start, prefix_out):
+        """Anonymize bits [start, bits) of ``value`` given the anonymized first ``start`` bits"""
+        result = prefix_out
+        for i in range(start, bits):
+            original = (value >> (bits - 1 - i)) & 1
+            result = (result << 1) | (original ^ self._prf_bit(bits, i, value >> (bits - i)))
+        return result
+
+    def _anonymize_network(self, value, bits, network_bits):
+        """Anonymized network part, memoized per network"""
+        network = value >> (bits - network_bits)
+        cache_key = (bits, network)
+        with self.network_lock:
+            cached = self.network_cache.get(cache_key)
+            if cached is not None:
+                self.network_cache.move_to_end(cache_key)
+                return cached
+        anonymized = self._anonymize_bits(network, network_bits, 0, 0)
+        with self.network_lock:
+            self.network_cache[cache_key] = anonymized
+            if len(self.network_cache) > self.cache_size:
+                self.network_cache.popitem(last=False)
+        return anonymized
+
+    def _anonymize(self, ip):
+        if not ip:
+            return ip
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            # Not an address (e.g. a hostname from a log): keep it distinguishable but opaque
+            digest = hashlib.blake2b(str(ip).encode(), key=self.key, digest_size=6).hexdigest()
+            return f"anon-{digest}"
+
+        bits = address.max_prefixlen
+        network_bits = 24 if bits == 32 else 64
+        value = int(address)
+        network = self._anonymize_network(value, bits, network_bits)
+        anonymized = self._anonymize_bits(value, bits, network_bits, network)
+        return str(ipaddress.IPv4Address(anonymized) if bits == 32 else ipaddress.IPv6Address(anonymized))
+
+    def get_stats(self):
+        """Get cache occupancy and hit rate"""
+        info = self.anonymize.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'cache_size': self.cache_size,
+            'cached_addresses': info.currsize,
+            'cached_networks': len(self.network_cache),
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_rate': info.hits / lookups if lookups else 0.0
+        }
+
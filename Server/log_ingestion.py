@@ -0,0 +1,435 @@
+import io
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Columns every parser produces (missing values are NaN)
+RECORD_COLUMNS = [
+    'timestamp', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'transport_protocol',
+    'packet_size', 'tcp_flags', 'duration', 'src_bytes', 'dst_bytes',
+    'src_packets', 'dst_packets', 'conn_state'
+]
+
+PROTOCOL_NUMBERS = {'1': 'ICMP', '6': 'TCP', '17': 'UDP', '58': 'ICMP'}
+
+
+def _normalize_protocol(series):
+    protocol = series.astype(str).str.upper()
+    return protocol.replace(PROTOCOL_NUMBERS).replace({'ICMPV6': 'ICMP', 'ICMP6': 'ICMP'})
+
+
+def _to_epoch(parsed):
+    """Seconds since the epoch for a Series of naive local datetimes (NaN where missing)"""
+    local_tz = datetime.now().astimezone().tzinfo
+    epoch = pd.Timestamp(0, tz='UTC')
+    return (parsed.dt.tz_localize(local_tz) - epoch).dt.total_seconds()
+
+
+def _finish(df):
+    """Reindex a parsed chunk to RECORD_COLUMNS with the expected dtypes"""
+    df = df.reindex(columns=RECORD_COLUMNS)
+    for col in ('src_port', 'dst_port', 'packet_size', 'src_bytes', 'dst_bytes',
+                'src_packets', 'dst_packets', 'tcp_flags'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in ('timestamp', 'duration'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.dropna(subset=['src_ip', 'dst_ip'])
+    return df
+
+
+class LogParser:
+    """Base class: turns a list of complete lines into a DataFrame of records"""
+
+    name = None
+    # 'packet' records go through the flow table, 'connection' records are flows already
+    record_type = 'packet'
+
+    def read_header(self, f):
+        """Consume format headers at the start of a binary file positioned at offset 0"""
+
+    def parse_chunk(self, lines):
+        raise NotImplementedError
+
+    @classmethod
+    def detect(cls, sample_lines):
+        return False
+
+
+class SimpleLogParser(LogParser):
+    """Whitespace separated: src_ip dst_ip protocol src_port dst_port size"""
+
+    name = 'simple'
+
+    def parse_chunk(self, lines):
+        parts = pd.Series(lines).str.split(expand=True)
+        if parts.shape[1] < 6:
+            return _finish(pd.DataFrame())
+        df = pd.DataFrame({
+            'src_ip': parts[0],
+            'dst_ip': parts[1],
+            'transport_protocol': _normalize_protocol(parts[2]),
+            'src_port': parts[3],
+            'dst_port': parts[4],
+            'packet_size': parts[5],
+            'timestamp': time.time()
+        })
+        df = _finish(df)
+        return df.dropna(subset=['src_port', 'dst_port', 'packet_size'])
+
+    @classmethod
+    def detect(cls, sample_lines):
+        return all(len(line.split()) >= 6 for line in sample_lines if line.strip())
+
+
+class ZeekConnParser(LogParser):
+    """Zeek/Bro conn.log (TSV with #fields header)"""
+
+    name = 'zeek'
+    record_type = 'connection'
+
+    def __init__(self):
+        self.fields = None
+
+    def read_header(self, f):
+        while True:
+            position = f.tell()
+            line = f.readline().decode('utf-8', errors='replace')
+            if not line.startswith('#'):
+                f.seek(position)
+                break
+            if line.startswith('#fields'):
+                self.fields = line.rstrip('\r\n').split('\t')[1:]
+
+    def parse_chunk(self, lines):
+        lines = [line for line in lines if not line.startswith('#')]
+        if not lines or not self.fields:
+            return _finish(pd.DataFrame())
+        raw = pd.read_csv(io.StringIO('\n'.join(lines)), sep='\t', header=None,
+                          names=self.fields, na_values=['-', '(empty)'],
+                          dtype=str, quoting=3, on_bad_lines='skip')
+        orig_bytes = pd.to_numeric(raw.get('orig_ip_bytes', raw.get('orig_bytes')), errors='coerce')
+        resp_bytes = pd.to_numeric(raw.get('resp_ip_bytes', raw.get('resp_bytes')), errors='coerce')
+        df = pd.DataFrame({
+            'timestamp': raw['ts'],
+            'src_ip': raw['id.orig_h'],
+            'dst_ip': raw['id.resp_h'],
+            'src_port': raw['id.orig_p'],
+            'dst_port': raw['id.resp_p'],
+            'transport_protocol': _normalize_protocol(raw['proto']),
+            'duration': pd.to_numeric(raw.get('duration'), errors='coerce').fillna(0.0),
+            'src_bytes': orig_bytes.fillna(0),
+            'dst_bytes': resp_bytes.fillna(0),
+            'src_packets': raw.get('orig_pkts'),
+            'dst_packets': raw.get('resp_pkts'),
+            'conn_state': raw.get('conn_state')
+        })
+        df['packet_size'] = df['src_bytes'] + df['dst_bytes']
+        return _finish(df)
+
+    @classmethod
+    def detect(cls, sample_lines):
+        return any(line.startswith('#fields') and 'id.orig_h' in line for line in sample_lines)
+
+
+class IptablesLogParser(LogParser):
+    """iptables/nftables LOG target lines in syslog (SRC= DST= PROTO= SPT= DPT= LEN=)"""
+
+    name = 'iptables'
+
+    PATTERN = re.compile(
+        r'^(?P<syslog_time>[A-Z][a-z]{2}\s+\d+\s+\d\d:\d\d:\d\d)?'
+        r'.*?\bSRC=(?P<src_ip>\S+)\s+DST=(?P<dst_ip>\S+)'
+        r'.*?\bLEN=(?P<packet_size>\d+)'
+        r'.*?\bPROTO=(?P<transport_protocol>\S+)'
+        r'(?:.*?\bSPT=(?P<src_port>\d+))?'
+        r'(?:.*?\bDPT=(?P<dst_port>\d+))?'
+    )
+    FLAG_BITS = {'FIN': 0x01, 'SYN': 0x02, 'RST': 0x04, 'PSH': 0x08,
+                 'ACK': 0x10, 'URG': 0x20, 'ECE': 0x40, 'CWR': 0x80}
+
+    def parse_chunk(self, lines):
+        lines = pd.Series(lines)
+        raw = lines.str.extract(self.PATTERN)
+        raw = raw.dropna(subset=['src_ip'])
+        lines = lines[raw.index]
+        if raw.empty:
+            return _finish(pd.DataFrame())
+
+        # Syslog timestamps carry no year; assume the current one
+        year = datetime.now().year
+        parsed = pd.to_datetime(str(year) + ' ' + raw['syslog_time'].fillna(''),
+                                format='%Y %b %d %H:%M:%S', errors='coerce')
+        timestamps = _to_epoch(parsed).fillna(time.time())
+
+        # TCP flags are bare words (SYN, ACK, ...) after the header fields
+        tcp_flags = np.zeros(len(raw), dtype=np.int64)
+        for name, bit in self.FLAG_BITS.items():
+            tcp_flags |= np.where(lines.str.contains(r'\b' + name + r'\b', regex=True), bit, 0)
+
+        df = pd.DataFrame({
+            'timestamp': timestamps,
+            'src_ip': raw['src_ip'],
+            'dst_ip': raw['dst_ip'],
+            'src_port': raw['src_port'],
+            'dst_port': raw['dst_port'],
+            'transport_protocol': _normalize_protocol(raw['transport_protocol']),
+            'packet_size': raw['packet_size'],
+            'tcp_flags': tcp_flags
+        })
+        return _finish(df)
+
+    @classmethod
+    def detect(cls, sample_lines):
+        return any('SRC=' in line and 'DST=' in line and 'PROTO=' in line for line in sample_lines)
+
+
+class CsvFlowParser(LogParser):
+    """CSV flow exports (CICFlowMeter, nfdump/argus CSV, generic src/dst columns)"""
+
+    name = 'csv'
+    record_type = 'connection'
+
+    ALIASES = {
+        'timestamp': ['timestamp', 'ts', 'time', 'start_time', 'stime', 'first_seen', 'flow start'],
+        'src_ip': ['src_ip', 'srcip', 'source ip', 'src ip', 'srcaddr', 'sa', 'ipv4_src_addr'],
+        'dst_ip': ['dst_ip', 'dstip', 'destination ip', 'dst ip', 'dstaddr', 'da', 'ipv4_dst_addr'],
+        'src_port': ['src_port', 'sport', 'source port', 'src port', 'sp', 'l4_src_port'],
+        'dst_port': ['dst_port', 'dsport', 'dport', 'destination port', 'dst port', 'dp', 'l4_dst_port'],
+        'transport_protocol': ['protocol', 'proto', 'pr', 'transport_protocol'],
+        'duration': ['duration', 'dur', 'flow duration', 'td'],
+        'src_bytes': ['src_bytes', 'sbytes', 'orig_bytes', 'total length of fwd packets', 'in_bytes', 'ibyt'],
+        'dst_bytes': ['dst_bytes', 'dbytes', 'resp_bytes', 'total length of bwd packets', 'out_bytes', 'obyt'],
+        'src_packets': ['src_packets', 'spkts', 'total fwd packets', 'in_pkts', 'ipkt'],
+        'dst_packets': ['dst_packets', 'dpkts', 'total backward packets', 'out_pkts', 'opkt'],
+        'packet_size': ['bytes', 'packet_size', 'byt']
+    }
+
+    def __init__(self):
+        self.header = None
+        self.mapping = {}
+
+    def read_header(self, f):
+        line = f.readline().decode('utf-8', errors='replace')
+        self.header = next(iter(pd.read_csv(io.StringIO(line), header=None).values.tolist()), [])
+        self.header = [str(h).strip() for h in self.header]
+        lowered = {h.lower(): h for h in self.header}
+        self.mapping = {}
+        for target, aliases in self.ALIASES.items():
+            for alias in aliases:
+                if alias in lowered:
+                    self.mapping[target] = lowered[alias]
+                    break
+
+    def parse_chunk(self, lines):
+        if not lines or not self.header:
+            return _finish(pd.DataFrame())
+        raw = pd.read_csv(io.StringIO('\n'.join(lines)), header=None, names=self.header,
+                          dtype=str, on_bad_lines='skip', skipinitialspace=True)
+        df = pd.DataFrame({target: raw[source] for target, source in self.mapping.items()})
+        if 'transport_protocol' in df:
+            df['transport_protocol'] = _normalize_protocol(df['transport_protocol'])
+        if 'timestamp' in df and not pd.to_numeric(df['timestamp'], errors='coerce').notna().any():
+            parsed = pd.to_datetime(df['timestamp'], errors='coerce')
+            if parsed.dt.tz is not None:
+                parsed = parsed.dt.tz_convert(None)
+            df['timestamp'] = _to_epoch(parsed)
+        df = _finish(df)
+        if df['packet_size'].isna().all():
+            df['packet_size'] = df['src_bytes'].fillna(0) + df['dst_bytes'].fillna(0)
+        df['timestamp'] = df['timestamp'].fillna(time.time())
+        df['duration'] = df['duration'].fillna(0.0)
+        return df
+
+    @classmethod
+    def detect(cls, sample_lines):
+        if not sample_lines:
+            return False
+        header = sample_lines[0].lower()
+        return ',' in header and any(
+            alias in header for alias in ('src_ip', 'srcip', 'source ip', 'src ip', 'srcaddr'))
+
+
+PARSERS = {
+    'zeek': ZeekConnParser,
+    'iptables': IptablesLogParser,
+    'csv': CsvFlowParser,
+    'simple': SimpleLogParser
+}
+
+
+def detect_format(path, sample_size=20):
+    """Guess the log format from the first lines of a file"""
+    with open(path, 'r', errors='replace') as f:
+        sample = [f.readline() for _ in range(sample_size)]
+    sample = [line for line in sample if line]
+    for name in ('zeek', 'iptables', 'csv', 'simple'):
+        if PARSERS[name].detect(sample):
+            return name
+    return 'simple'
+
+
+class CheckpointStore:
+    """Persists per-file read offsets (keyed by path, validated by inode) as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.checkpoints = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.checkpoints = json.load(f)
+            except Exception as e:
+                print(f"Could not read log checkpoints: {e}")
+
+    def get(self, log_path):
+        return self.checkpoints.get(os.path.abspath(log_path))
+
+    def save(self, log_path, inode, offset, skip=0):
+        if not self.path:
+            return
+        with self.lock:
+            self.checkpoints[os.path.abspath(log_path)] = {
+                'inode': inode,
+                'offset': offset,
+                'skip': skip,
+                'updated_at': datetime.now().isoformat()
+            }
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.checkpoints, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class LogIngestor:
+    """Chunked, resumable log reader.
+
+    Reads ``chunk_size`` bytes at a time, parses every complete line in the
+    chunk with one vectorized parser call and yields DataFrames of records.
+    In ``follow`` mode it keeps polling the file after EOF and reopens it
+    from the start when it is rotated (inode change) or truncated. The
+    consumer calls ``commit()`` once it has processed a chunk, or
+    ``commit(n)`` after only its first ``n`` records, and the position is
+    checkpointed so a restart resumes after the last processed record.
+    """
+
+    def __init__(self, path, log_format='auto', follow=False, checkpoint_file=None,
+                 chunk_size=4 * 1024 * 1024, poll_interval=0.5):
+        self.path = path
+        self.log_format = detect_format(path) if log_format in (None, 'auto') else log_format
+        if self.log_format not in PARSERS:
+            raise ValueError(f"Unknown log format: {self.log_format}")
+        self.parser = PARSERS[self.log_format]()
+        self.follow = follow
+        self.checkpoints = CheckpointStore(checkpoint_file)
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.stats = {'lines': 0, 'records': 0, 'bytes': 0, 'chunks': 0, 'rotations': 0}
+        self._inode = None
+        self._skip = 0  # Records at the resume offset that a previous run already processed
+        self._chunk = None  # (start offset, end offset, records skipped at start) of the last yield
+
+    @property
+    def record_type(self):
+        return self.parser.record_type
+
+    def _open(self, resume=True):
+        f = open(self.path, 'rb')
+        inode = os.fstat(f.fileno()).st_ino
+        self.parser.read_header(f)
+        checkpoint = self.checkpoints.get(self.path) if resume else None
+        size = os.fstat(f.fileno()).st_size
+        self._skip = 0
+        if checkpoint and checkpoint.get('inode') == inode and checkpoint.get('offset', 0) <= size:
+            if checkpoint['offset'] >= f.tell():
+                f.seek(checkpoint['offset'])
+                self._skip = checkpoint.get('skip', 0)
+        self._inode = inode
+        return f, inode
+
+    def _rotated(self, inode, offset):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # Mid-rotation; wait for the new file
+        return st.st_ino != inode or st.st_size < offset
+
+    def _parse(self, data):
+        lines = data.decode('utf-8', errors='replace').split('\n')
+        self.stats['lines'] += len(lines)
+        self.stats['chunks'] += 1
+        records = self.parser.parse_chunk([line.rstrip('\r') for line in lines if line.strip()])
+        self.stats['records'] += len(records)
+        return records
+
+    def _records_after_skip(self, records, start, end):
+        """Drop the records a previous run already processed; remember the chunk for commit()"""
+        skipped = min(self._skip, len(records))
+        self._skip -= skipped
+        self.stats['bytes'] += end - start
+        self._chunk = (start, end, skipped)
+        return records.iloc[skipped:] if skipped else records
+
+    def read_chunks(self, should_stop=lambda: False):
+        """Yield DataFrames of parsed records until EOF (or forever when following).
+
+        Nothing is checkpointed until the consumer calls ``commit``.
+        """
+        f, inode = self._open()
+        pending = b''
+        try:
+            while not should_stop():
+                data = f.read(self.chunk_size)
+                if data:
+                    start = f.tell() - len(data) - len(pending)
+                    data = pending + data
+                    cut = data.rfind(b'\n')
+                    if cut < 0:
+                        pending = data
+                        continue
+                    pending = data[cut + 1:]
+                    records = self._records_after_skip(self._parse(data[:cut]), start, start + cut + 1)
+                    if len(records):
+                        yield records
+                    continue
+
+                if not self.follow:
+                    if pending.strip():
+                        # Last line without a trailing newline
+                        start = f.tell() - len(pending)
+                        records = self._records_after_skip(self._parse(pending), start, f.tell())
+                        if len(records):
+                            yield records
+                    break
+
+                if self._rotated(inode, f.tell()):
+                    f.close()
+                    pending = b''
+                    self.stats['rotations'] += 1
+                    f, inode = self._open(resume=False)
+                    continue
+
+                time.sleep(self.poll_interval)
+        finally:
+            f.close()
+
+    def commit(self, processed=None):
+        """Checkpoint the last yielded chunk: all of it, or only its first ``processed`` records"""
+        if self._chunk is None:
+            return
+        start, end, skipped = self._chunk
+        if processed is None:
+            self.checkpoints.save(self.path, self._inode, end)
+        else:
+            # Resume by re-reading the chunk and skipping what was already processed
+            self.checkpoints.save(self.path, self._inode, start, skip=skipped + processed)
+
+    def get_stats(self):
+        """Get ingestion counters"""
+        return dict(self.stats, format=self.log_format, follow=self.follow, path=self.path)
@@ -10,22 +10,60 @@ from sklearn.metrics import classification_report, confusion_matrix, accuracy_sc
 import xgboost as xgb
 import lightgbm as lgb
 from sklearn.neural_network import MLPClassifier
+from sklearn.model_selection import train_test_split
 import joblib
+from prefit_ensemble import PrefitVotingClassifier, PrefitStackingClassifier
+from tree_compiler import compile_model
+from cascade import ConfidenceCascade
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import warnings
 warnings.filterwarnings('ignore')
 
+_training_data = None
+
+
+def _init_training_worker(X_train, X_test, y_train, y_test, events):
+    """Pool initializer: receive the training data once per worker, not once per model"""
+    global _training_data
+    _training_data = (X_train, X_test, y_train, y_test, events)
+
+
+def _fit_model(name, model, data=None):
+    """Fit and evaluate one model (in a training worker, unless ``data`` is passed in)"""
+    X_train, X_test, y_train, y_test, events = data or _training_data
+    started = time.time()
+    if events is not None:
+        events.put(('model_started', {'model': name, 'worker': os.getpid()}))
+    try:
+        print(f"Training {name}...")
+        model.fit(X_train, y_train)
+        
+        return {
+            'model': model,
+            'seconds': time.time() - started,
+            'result': MLModels._evaluate(model, X_test, y_test)
+        }
+    except Exception as e:
+        return {'error': str(e), 'seconds': time.time() - started}
+
+
 class MLModels:
     def __init__(self):
         self.models = {}
         self.model_performance = {}
         self.ensemble_model = None
+        self.compiled_models = {}
+        self.compiled_max_rows = 128  # Larger batches are faster through the libraries' own loops
+        self.cascade = None
+        self.cascade_stats = {'scored': 0, 'escalated': 0, 'batches': 0}
         
-    def train_all_models(self, X_train, X_test, y_train, y_test):
-        """Train multiple ML models and return performance metrics"""
-        results = {}
-        
-        # Define models to train
-        models_config = {
+    def _model_configs(self):
+        """Untrained models to fit"""
+        return {
             'random_forest': RandomForestClassifier(n_estimators=100, random_state=42),
             'xgboost': xgb.XGBClassifier(random_state=42, eval_metric='logloss'),
             'lightgbm': lgb.LGBMClassifier(random_state=42, verbose=-1),
@@ -36,57 +74,169 @@ class MLModels:
             'knn': KNeighborsClassifier(),
             'neural_network': MLPClassifier(random_state=42, max_iter=1000, hidden_layer_sizes=(100, 50))
         }
-        
-        # Train each model
-        for name, model in models_config.items():
+    
+    def train_all_models(self, X_train, X_test, y_train, y_test, n_workers=None, n_jobs=None,
+                         on_progress=None, ensemble=None, cascade=None):
+        """Train multiple ML models in parallel and return performance metrics.
+
+        Models are fitted in a pool of ``n_workers`` processes (default: one
+        per CPU, at most one per model), so the suite takes about as long
+        as its slowest model. Random forest, XGBoost and LightGBM each get
+        ``n_jobs`` threads (default: the CPUs left per worker).
+        ``on_progress(event, data)`` is called with 'training_started',
+        'model_started', 'model_finished', 'model_failed' and
+        'training_complete' events.
+
+        ``ensemble`` configures the ensemble built from the fitted models:
+        ``method`` 'voting' (default) or 'stacking', ``tune_weights`` and
+        ``validation_size``. Tuning and stacking hold ``validation_size`` of
+        the training data out of the base models to fit on.
+
+        ``cascade`` configures the confidence cascade calibrated on the test
+        split afterwards (``first_stage`` model and ``max_accuracy_loss``,
+        see ``calibrate_cascade``); progress reports it as
+        'cascade_calibrated'.
+        """
+        results = {}
+        ensemble = dict({'method': 'voting', 'tune_weights': False, 'validation_size': 0.2},
+                        **(ensemble or {}))
+        X_val = y_val = None
+        if ensemble['tune_weights'] or ensemble['method'] == 'stacking':
             try:
-                print(f"Training {name}...")
-                model.fit(X_train, y_train)
-                
-                # Make predictions
-                y_pred = model.predict(X_test)
-                y_proba = model.predict_proba(X_test)[:, 1] if hasattr(model, 'predict_proba') else None
-                
-                # Calculate metrics
-                metrics = self._calculate_metrics(y_test, y_pred, y_proba)
-                
-                # Store model and performance
-                self.models[name] = model
-                self.model_performance[name] = metrics
-                
-                results[name] = {
-                    'metrics': metrics,
-                    'classification_report': classification_report(y_test, y_pred, output_dict=True),
-                    'confusion_matrix': confusion_matrix(y_test, y_pred).tolist()
-                }
-                
-            except Exception as e:
-                print(f"Error training {name}: {str(e)}")
-                results[name] = {'error': str(e)}
+                X_train, X_val, y_train, y_val = train_test_split(
+                    X_train, y_train, test_size=ensemble['validation_size'], random_state=42,
+                    stratify=y_train)
+            except ValueError:
+                # A class too rare to stratify on
+                X_train, X_val, y_train, y_val = train_test_split(
+                    X_train, y_train, test_size=ensemble['validation_size'], random_state=42)
+        started = time.time()
+        cpus = os.cpu_count() or 1
+        models_config = self._model_configs()
+        n_workers = max(1, min(int(n_workers or cpus), len(models_config)))
+        n_jobs = int(n_jobs or max(1, cpus // n_workers))
+        for name in ('random_forest', 'xgboost', 'lightgbm'):
+            models_config[name].set_params(n_jobs=n_jobs)
+        
+        progress = self._progress_callback(on_progress)
+        progress('training_started', {'models': list(models_config), 'workers': n_workers, 'n_jobs': n_jobs})
+        
+        def collect(name, outcome):
+            if 'error' in outcome:
+                print(f"Error training {name}: {outcome['error']}")
+                results[name] = {'error': outcome['error']}
+                progress('model_failed', {'model': name, 'error': outcome['error'],
+                                          'seconds': outcome['seconds']})
+                return
+            # Store model and performance
+            self.models[name] = outcome['model']
+            self.model_performance[name] = outcome['result']['metrics']
+            results[name] = outcome['result']
+            progress('model_finished', {'model': name, 'metrics': outcome['result']['metrics'],
+                                        'seconds': outcome['seconds']})
+        
+        if n_workers == 1:
+            data = (X_train, X_test, y_train, y_test, None)
+            for name, model in models_config.items():
+                progress('model_started', {'model': name, 'worker': os.getpid()})
+                collect(name, _fit_model(name, model, data))
+        else:
+            # Spawned, not forked: forking after OpenMP (LightGBM, XGBoost) was used can deadlock
+            ctx = multiprocessing.get_context('spawn')
+            events = ctx.Queue()
+            with ProcessPoolExecutor(n_workers, mp_context=ctx, initializer=_init_training_worker,
+                                     initargs=(X_train, X_test, y_train, y_test, events)) as pool:
+                # Longest-running models first so they don't end up last in line
+                order = sorted(models_config, key=lambda n: n not in ('svm', 'knn', 'neural_network'))
+                futures = {pool.submit(_fit_model, name, models_config[name]): name for name in order}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    self._drain_events(events, progress)
+                    for future in done:
+                        name = futures[future]
+                        try:
+                            outcome = future.result()
+                        except Exception as e:
+                            outcome = {'error': str(e), 'seconds': None}
+                        collect(name, outcome)
+                self._drain_events(events, progress)
         
+        self._finish_training(results, X_val, y_val, X_test, y_test, ensemble, cascade, progress)
+        progress('training_complete', {'seconds': time.time() - started,
+                                       'failed': [n for n, r in results.items() if 'error' in r]})
+        return results
+    
+    @staticmethod
+    def _progress_callback(on_progress):
+        """``on_progress`` wrapped so a failing listener can't break training"""
+        def progress(event, data):
+            if on_progress is not None:
+                try:
+                    on_progress(event, data)
+                except Exception as e:
+                    print(f"Training progress error: {e}")
+        return progress
+    
+    @staticmethod
+    def _evaluate(model, X_test, y_test):
+        """Metrics, classification report and confusion matrix of a fitted model on the test split"""
+        y_pred = model.predict(X_test)
+        y_proba = model.predict_proba(X_test)[:, 1] if hasattr(model, 'predict_proba') else None
+        return {
+            'metrics': MLModels._calculate_metrics(y_test, y_pred, y_proba),
+            'classification_report': classification_report(y_test, y_pred, output_dict=True),
+            'confusion_matrix': confusion_matrix(y_test, y_pred).tolist()
+        }
+    
+    def _finish_training(self, results, X_val, y_val, X_test, y_test, ensemble, cascade, progress):
+        """Build the ensemble from the fitted models, compile them and calibrate the cascade"""
         # Train ensemble model
         try:
-            self.ensemble_model = self._create_ensemble(X_train, y_train)
-            ensemble_pred = self.ensemble_model.predict(X_test)
-            ensemble_proba = self.ensemble_model.predict_proba(X_test)[:, 1]
+            ensemble_started = time.time()
+            self.ensemble_model = self._create_ensemble(X_val, y_val, ensemble['method'],
+                                                        ensemble['tune_weights'])
+            build_seconds = time.time() - ensemble_started
+            scored = self.score(X_test, 'ensemble')
+            ensemble_pred = scored['labels']
+            ensemble_proba = scored['probabilities'][:, 1]
             
             ensemble_metrics = self._calculate_metrics(y_test, ensemble_pred, ensemble_proba)
+            weights = getattr(self.ensemble_model, 'weights', None)
             results['ensemble'] = {
                 'metrics': ensemble_metrics,
                 'classification_report': classification_report(y_test, ensemble_pred, output_dict=True),
-                'confusion_matrix': confusion_matrix(y_test, ensemble_pred).tolist()
+                'confusion_matrix': confusion_matrix(y_test, ensemble_pred).tolist(),
+                'method': ensemble['method'],
+                'weights': None if weights is None else weights.tolist(),
+                'build_seconds': build_seconds
             }
             
         except Exception as e:
             print(f"Error training ensemble: {str(e)}")
             results['ensemble'] = {'error': str(e)}
         
-        return results
-    
-    def _create_ensemble(self, X_train, y_train):
-        """Create an ensemble model using voting"""
-        from sklearn.ensemble import VotingClassifier
+        progress('models_compiled', self.compile_models(X_test))
         
+        try:
+            cascade_report = self.calibrate_cascade(X_test, y_test, **(cascade or {}))
+            if 'ensemble' in results and 'error' not in results['ensemble']:
+                results['ensemble']['cascade'] = cascade_report
+            progress('cascade_calibrated', cascade_report)
+        except Exception as e:
+            print(f"Error calibrating cascade: {str(e)}")
+    
+    @staticmethod
+    def _drain_events(events, progress):
+        while True:
+            try:
+                event, data = events.get_nowait()
+            except queue.Empty:
+                return
+            progress(event, data)
+    
+    def _create_ensemble(self, X_val=None, y_val=None, method='voting', tune_weights=False):
+        """Combine the already-fitted top models; nothing is refitted"""
         # Select top performing models for ensemble
         base_models = []
         for name, model in self.models.items():
@@ -94,8 +244,11 @@ class MLModels:
                 base_models.append((name, model))
         
         if len(base_models) >= 2:
-            ensemble = VotingClassifier(estimators=base_models, voting='soft')
-            ensemble.fit(X_train, y_train)
+            if method == 'stacking':
+                return PrefitStackingClassifier(base_models).fit(X_val, y_val)
+            ensemble = PrefitVotingClassifier(base_models)
+            if tune_weights:
+                ensemble.tune_weights(X_val, y_val)
             return ensemble
         else:
             # Fallback to best single model
@@ -103,7 +256,8 @@ class MLModels:
                                 key=lambda x: self.model_performance[x]['f1_score'])
             return self.models[best_model_name]
     
-    def _calculate_metrics(self, y_true, y_pred, y_proba=None):
+    @staticmethod
+    def _calculate_metrics(y_true, y_pred, y_proba=None):
         """Calculate performance metrics"""
         metrics = {
             'accuracy': float(accuracy_score(y_true, y_pred)),
@@ -160,6 +314,189 @@ class MLModels:
         except Exception as e:
             raise Exception(f"Error getting probabilities: {str(e)}")
     
+    def score(self, X, model_type='ensemble'):
+        """Labels, class probabilities and per-model timing from one pass over the model(s).
+
+        An ensemble is scored by running each base model once and combining
+        their probabilities (weighted average, or the stacking meta-learner),
+        so labels and probabilities come from the same pass. Labels are the class with
+        the highest probability.
+        """
+        try:
+            if model_type == 'cascade':
+                return self._score_cascade(X)
+            model = self._scoring_model(model_type)
+            
+            started = time.perf_counter()
+            timings = {}
+            probabilities, labels = self._score_with(model, X, model_type, timings)
+            
+            return {
+                'labels': labels,
+                'probabilities': probabilities,
+                'timings_ms': timings,
+                'total_ms': (time.perf_counter() - started) * 1000.0
+            }
+            
+        except Exception as e:
+            raise Exception(f"Error scoring: {str(e)}")
+    
+    def _scoring_model(self, model_type):
+        if model_type == 'ensemble':
+            if self.ensemble_model is None:
+                raise Exception("Ensemble model not trained")
+            return self.ensemble_model
+        if model_type in self.models:
+            return self.models[model_type]
+        raise Exception(f"Model {model_type} not available")
+    
+    def _score_with(self, model, X, name, timings, cached=None):
+        """(probabilities, labels) from one pass; ``cached`` holds base-model probabilities already computed"""
+        cached = cached or {}
+        if isinstance(model, PrefitVotingClassifier):
+            probas = [cached[base] if base in cached else self._timed_proba(estimator, X, base, timings)
+                      for base, estimator in model.estimators]
+            probabilities = model.combine(probas)
+            return probabilities, model.classes_[np.argmax(probabilities, axis=1)]
+        if hasattr(model, 'estimators_') and getattr(model, 'voting', None) == 'soft':
+            # VotingClassifier saved by earlier versions
+            probas = []
+            for base, estimator in zip(model.named_estimators_.keys(), model.estimators_):
+                probas.append(cached[base] if base in cached else
+                              self._timed_proba(estimator, X, base, timings))
+            probabilities = np.average(probas, axis=0, weights=model._weights_not_none)
+            return probabilities, model.le_.inverse_transform(np.argmax(probabilities, axis=1))
+        probabilities = self._timed_proba(model, X, name, timings)
+        return probabilities, np.asarray(model.classes_)[np.argmax(probabilities, axis=1)]
+    
+    def _score_cascade(self, X):
+        """Score with the first stage, escalating only uncertain rows to the ensemble.
+
+        Falls back to the ensemble for everything while no cascade is calibrated.
+        """
+        cascade = self.cascade
+        if cascade is None or cascade.first_stage not in self.models:
+            scored = self.score(X, 'ensemble')
+            escalated = len(scored['labels'])
+        else:
+            started = time.perf_counter()
+            timings = {}
+            first = self.models[cascade.first_stage]
+            first_proba = self._timed_proba(first, X, cascade.first_stage, timings)
+            escalate = cascade.escalate(first_proba)
+            probabilities = first_proba
+            escalated = int(escalate.sum())
+            if escalated:
+                probabilities = first_proba.copy()
+                # The first stage may also be one of the ensemble's base models: reuse its output
+                probabilities[escalate] = self._score_with(
+                    self._scoring_model('ensemble'), X[escalate], 'ensemble', timings,
+                    cached={cascade.first_stage: first_proba[escalate]})[0]
+            scored = {
+                'labels': np.asarray(first.classes_)[np.argmax(probabilities, axis=1)],
+                'probabilities': probabilities,
+                'timings_ms': timings,
+                'total_ms': (time.perf_counter() - started) * 1000.0
+            }
+        rows = len(scored['labels'])
+        self.cascade_stats['scored'] += rows
+        self.cascade_stats['escalated'] += escalated
+        self.cascade_stats['batches'] += 1
+        scored['escalated'] = escalated
+        scored['escalated_fraction'] = escalated / rows if rows else 0.0
+        return scored
+    
+    def calibrate_cascade(self, X_val, y_val, first_stage=None, max_accuracy_loss=0.001,
+                          max_recall_loss=None):
+        """Fit the cascade's uncertainty band on a labelled split.
+
+        The band is the narrowest one whose cascade loses at most
+        ``max_accuracy_loss`` accuracy, and ``max_recall_loss`` (default: the
+        same) attack recall, against the ensemble on this split. The report
+        includes the fraction of rows escalated and the measured speed-up.
+        """
+        first_stage = first_stage or (self.cascade.first_stage if self.cascade else 'logistic_regression')
+        if first_stage not in self.models:
+            raise Exception(f"Model {first_stage} not available")
+        model = self.models[first_stage]
+        
+        started = time.perf_counter()
+        first_proba = self._timed_proba(model, X_val, first_stage, {})
+        final = self.score(X_val, 'ensemble')
+        cascade = ConfidenceCascade(first_stage)
+        report = cascade.calibrate(first_proba, final['probabilities'], y_val, model.classes_,
+                                   max_accuracy_loss, max_recall_loss)
+        
+        self.cascade = cascade
+        timed = self._score_cascade(X_val)
+        self.cascade_stats = {'scored': 0, 'escalated': 0, 'batches': 0}
+        report['ensemble_ms'] = final['total_ms']
+        report['cascade_ms'] = timed['total_ms']
+        report['speedup'] = final['total_ms'] / timed['total_ms'] if timed['total_ms'] else None
+        report['seconds'] = time.perf_counter() - started
+        return report
+    
+    def get_cascade_stats(self):
+        """Get the cascade band, its calibration and the share of traffic escalated so far"""
+        scored = self.cascade_stats['scored']
+        return dict(
+            self.cascade_stats,
+            calibrated=self.cascade is not None,
+            first_stage=self.cascade.first_stage if self.cascade else None,
+            band=[self.cascade.low, self.cascade.high] if self.cascade else None,
+            calibration=self.cascade.calibration if self.cascade else None,
+            escalated_fraction=self.cascade_stats['escalated'] / scored if scored else 0.0
+        )
+    
+    def _timed_proba(self, model, X, name, timings):
+        """Class probabilities from one model call, recording how long it took"""
+        started = time.perf_counter()
+        compiled = self.compiled_models.get(name)
+        if compiled is not None and compiled.source is model and len(X) <= self.compiled_max_rows:
+            proba = compiled.predict_proba(X)
+        elif hasattr(model, 'predict_proba'):
+            proba = model.predict_proba(X)
+        else:
+            # One-hot of the predicted class for models without probabilities
+            predictions = model.predict(X)
+            proba = (np.asarray(predictions)[:, None] == np.asarray(model.classes_)[None, :]).astype(float)
+        timings[name] = (time.perf_counter() - started) * 1000.0
+        return proba
+    
+    def compile_models(self, X_check=None, tolerance=1e-6):
+        """Flatten the tree ensembles into NumPy node arrays (and logistic regression into its
+        coefficients) for low-latency small-batch scoring.
+
+        A single decision tree is left alone: sklearn already walks one tree
+        about as fast as the compiled fixed-depth traversal does.
+
+        With ``X_check``, a compiled model is only kept if its probabilities
+        match the original's on (up to 256 of) those rows.
+        """
+        self.compiled_models = {}
+        report = {}
+        for name in ('random_forest', 'xgboost', 'lightgbm', 'logistic_regression'):
+            model = self.models.get(name)
+            if model is None:
+                continue
+            compiled = compile_model(model)
+            if compiled is None:
+                report[name] = {'compiled': False}
+                continue
+            entry = {'compiled': True, 'nodes': compiled.n_nodes, 'max_depth': compiled.max_depth}
+            if X_check is not None:
+                sample = np.asarray(X_check)[:256]
+                error = float(np.abs(compiled.predict_proba(sample) - model.predict_proba(sample)).max())
+                entry['max_abs_error'] = error
+                if error > tolerance:
+                    print(f"Compiled {name} differs from the original by {error}; not using it")
+                    entry['compiled'] = False
+                    report[name] = entry
+                    continue
+            self.compiled_models[name] = compiled
+            report[name] = entry
+        return report
+    
     def get_feature_importance(self, model_type='random_forest'):
         """Get feature importance from tree-based models"""
         try:
@@ -195,6 +532,10 @@ class MLModels:
         import json
         with open(performance_path, 'w') as f:
             json.dump(self.model_performance, f, indent=2)
+        
+        if self.cascade is not None:
+            with open(os.path.join(model_folder, "cascade.json"), 'w') as f:
+                json.dump(self.cascade.to_dict(), f, indent=2)
     
     def load_models(self, model_folder):
         """Load saved models"""
@@ -207,12 +548,37 @@ class MLModels:
             model_name = model_file.replace('.joblib', '')
             model_path = os.path.join(model_folder, model_file)
             self.models[model_name] = joblib.load(model_path)
+        self.compile_models()
         
         # Load performance metrics
         performance_path = os.path.join(model_folder, "performance.json")
         if os.path.exists(performance_path):
             with open(performance_path, 'r') as f:
                 self.model_performance = json.load(f)
+        
+        cascade_path = os.path.join(model_folder, "cascade.json")
+        if os.path.exists(cascade_path):
+            with open(cascade_path, 'r') as f:
+                self.cascade = ConfidenceCascade.from_dict(json.load(f))
+    
+    def get_state(self):
+        """Trained models, ensemble, compiled models, cascade and metrics as one dict"""
+        return {
+            'models': self.models,
+            'ensemble_model': self.ensemble_model,
+            'compiled_models': self.compiled_models,  # Pickled with the models, so .source stays the same object
+            'cascade': self.cascade.to_dict() if self.cascade is not None else None,
+            'model_performance': self.model_performance
+        }
+    
+    def set_state(self, state):
+        """Restore everything from ``get_state``"""
+        self.models = state['models']
+        self.ensemble_model = state['ensemble_model']
+        self.compiled_models = state.get('compiled_models') or {}
+        self.cascade = ConfidenceCascade.from_dict(state['cascade']) if state.get('cascade') else None
+        self.cascade_stats = {'scored': 0, 'escalated': 0, 'batches': 0}
+        self.model_performance = state.get('model_performance', {})
     
     def get_available_models(self, model_folder):
         """Get list of available trained models"""
@@ -0,0 +1,132 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import joblib
+
+BUNDLE_DIR = 'bundles'
+BUNDLE_FILE = 'bundle.joblib'
+MANIFEST_FILE = 'manifest.json'
+
+
+def save_bundle(model_folder, ml_models, preprocessor, metadata=None):
+    """Save the trained models and the fitted preprocessor as one new, immutable bundle version.
+
+    The bundle is written to a temporary directory and renamed into
+    ``<model_folder>/bundles/<version>`` once complete, so a reader never
+    sees a partial bundle. Arrays are stored uncompressed so they can be
+    memory-mapped on load. Returns the manifest.
+    """
+    root = os.path.join(model_folder, BUNDLE_DIR)
+    os.makedirs(root, exist_ok=True)
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(root, version)):
+        suffix += 1
+        version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+    state = {'ml_models': ml_models.get_state(), 'preprocessor': preprocessor.get_state()}
+    joblib.dump(state, os.path.join(staging, BUNDLE_FILE))
+    manifest = dict(metadata or {},
+                    version=version,
+                    created_at=datetime.now().isoformat(),
+                    models=sorted(state['ml_models']['models']),
+                    performance=state['ml_models']['model_performance'],
+                    feature_columns=list(state['preprocessor']['feature_columns']),
+                    size_bytes=os.path.getsize(os.path.join(staging, BUNDLE_FILE)))
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.rename(staging, os.path.join(root, version))
+    return manifest
+
+
+def list_bundles(model_folder):
+    """Manifests of the complete bundles, oldest first"""
+    root = os.path.join(model_folder, BUNDLE_DIR)
+    if not os.path.isdir(root):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name, MANIFEST_FILE)
+        if name.startswith('.') or not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                manifests.append(json.load(f))
+        except Exception as e:
+            print(f"Bundle manifest error for {name}: {e}")
+    return sorted(manifests, key=lambda m: (m.get('created_at', ''), m['version']))
+
+
+def bundle_path(model_folder, version):
+    return os.path.join(model_folder, BUNDLE_DIR, version)
+
+
+def load_bundle(path, ml_models, preprocessor, mmap_mode='c'):
+    """Load a bundle into ``ml_models`` and ``preprocessor``; returns a load report.
+
+    Arrays are memory-mapped (copy-on-write by default: pages of the bundle
+    file stay shared between every worker that loads it until one of them
+    writes to them; libsvm needs writable buffers, so 'r' doesn't work for
+    SVMs). The report includes the load time, the time since the process
+    started and the process memory afterwards.
+    """
+    started = time.perf_counter()
+    state = joblib.load(os.path.join(path, BUNDLE_FILE), mmap_mode=mmap_mode)
+    ml_models.set_state(state['ml_models'])
+    preprocessor.set_state(state['preprocessor'])
+    with open(os.path.join(path, MANIFEST_FILE), 'r') as f:
+        manifest = json.load(f)
+    return {
+        'loaded': True,
+        'version': manifest['version'],
+        'path': path,
+        'mmap_mode': mmap_mode,
+        'models': manifest.get('models', []),
+        'load_seconds': time.perf_counter() - started,
+        'ready_seconds': process_uptime(),
+        'memory': memory_usage()
+    }
+
+
+def process_uptime():
+    """Seconds since this process started, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
+
+
+def memory_usage():
+    """Resident memory of this process in MB, split into shared and private pages where possible"""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024.0
+        usage = {
+            'rss_mb': fields.get('Rss', 0.0),
+            'pss_mb': fields.get('Pss', 0.0),  # Shared pages split between the processes using them
+            'shared_mb': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+            'private_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+        }
+    except Exception:
+        try:
+            import resource
+            # Peak rather than current RSS: kB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            usage = {'max_rss_mb': peak / (1024.0 * 1024.0 if os.uname().sysname == 'Darwin' else 1024.0)}
+        except Exception:
+            pass
+    return usage
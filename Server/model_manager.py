@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from data_preprocessor import DataPreprocessor
+from ml_models import MLModels
+from model_bundle import save_bundle, load_bundle, list_bundles, bundle_path
+from chunked_training import train_out_of_core
+
+
+class ModelVersion:
+    """One immutable model set: trained models and the preprocessor they were trained with"""
+
+    __slots__ = ('version', 'ml_models', 'preprocessor', 'manifest', 'activated_at')
+
+    def __init__(self, version, ml_models, preprocessor, manifest=None):
+        self.version = version
+        self.ml_models = ml_models
+        self.preprocessor = preprocessor
+        self.manifest = manifest or {}
+        self.activated_at = None
+
+
+class ModelManager:
+    """Registry-backed model versions with atomic activation and rollback.
+
+    Training builds a fresh ``MLModels`` and ``DataPreprocessor`` and saves
+    them as a new immutable bundle, registered in ``model_registry``; the
+    live objects are never modified. Activating a version loads it (if it
+    isn't in memory) and then replaces one reference, so scorers that read
+    ``current()`` / ``snapshot()`` once per batch finish in-flight batches on
+    the old version and never see a half-updated model set. The previously
+    active version stays loaded, so rolling back to it is instant.
+    """
+
+    def __init__(self, db, model_folder, mmap_mode='c', out_of_core_bytes=512 * 1024 * 1024):
+        self.db = db
+        self.model_folder = model_folder
+        self.mmap_mode = mmap_mode
+        # CSVs this large are trained chunk by chunk: in memory they'd take several times their size
+        self.out_of_core_bytes = out_of_core_bytes
+        self._active = ModelVersion(None, MLModels(), DataPreprocessor())
+        self._previous = None
+        self.history = []  # Versions activated in this process, oldest first
+        self.lock = threading.Lock()  # Serializes training, activation and rollback; scoring never takes it
+        self.load_report = {'loaded': False}
+
+    def current(self):
+        """The active ModelVersion"""
+        return self._active
+
+    def snapshot(self):
+        """(ml_models, preprocessor) of the active version, read in one step"""
+        active = self._active
+        return active.ml_models, active.preprocessor
+
+    def warm_start(self):
+        """Activate the registry's active version, or else the newest saved bundle"""
+        try:
+            versions = [m['version'] for m in list_bundles(self.model_folder)]  # Oldest first
+            active = [row['model_name'] for row in self.db.get_model_registry()
+                      if row['is_active'] and row['model_name'] in versions]
+            if active:
+                target = active[0]
+            elif versions:
+                target = versions[-1]
+            else:
+                return self.load_report
+            self.activate(target)
+            print(f"Loaded model version {target} in {self.load_report['load_seconds']:.2f}s, "
+                  f"memory: {self.load_report['memory']}")
+        except Exception as e:
+            print(f"Model version load error: {e}")
+            self.load_report = {'loaded': False, 'error': str(e)}
+        return self.load_report
+
+    def train(self, filepath, metadata=None, activate=True, out_of_core=None, chunk_size=100000,
+              **train_kwargs):
+        """Train a new version from a dataset; returns (results, manifest).
+
+        The dataset is preprocessed and the models trained on new objects,
+        saved and registered as a new version, which is then activated
+        unless ``activate`` is False. ``train_kwargs`` go to
+        ``MLModels.train_all_models``, or with ``out_of_core`` (default: for
+        files of at least ``out_of_core_bytes``) to ``train_out_of_core``,
+        which reads ``chunk_size`` rows at a time.
+        """
+        preprocessor = DataPreprocessor()
+        ml_models = MLModels()
+        if out_of_core is None:
+            out_of_core = os.path.getsize(filepath) >= self.out_of_core_bytes
+        if out_of_core:
+            train_kwargs.pop('n_workers', None)  # Learners train in this process, chunk by chunk
+            results = train_out_of_core(filepath, preprocessor, ml_models, chunk_size=int(chunk_size),
+                                        **train_kwargs)
+        else:
+            X_train, X_test, y_train, y_test = preprocessor.preprocess_data(filepath)
+            results = ml_models.train_all_models(X_train, X_test, y_train, y_test, **train_kwargs)
+        # Legacy per-model files, still listed by /models
+        ml_models.save_models(self.model_folder)
+        manifest = self.publish(ml_models, preprocessor, metadata, activate)
+        return results, manifest
+
+    def publish(self, ml_models, preprocessor, metadata=None, activate=True):
+        """Save trained objects as a new immutable version and register it (and activate it)"""
+        with self.lock:
+            manifest = save_bundle(self.model_folder, ml_models, preprocessor, metadata)
+            self.db.register_model(manifest['version'], bundle_path(self.model_folder, manifest['version']),
+                                   manifest['performance'], is_active=False)
+            if activate:
+                self._swap(ModelVersion(manifest['version'], ml_models, preprocessor, manifest),
+                           {'loaded': True, 'version': manifest['version'], 'load_seconds': 0.0,
+                            'trained_in_process': True})
+        return manifest
+
+    def activate(self, version):
+        """Make a saved version live; returns the activation report"""
+        with self.lock:
+            if self._active.version == version:
+                return self.load_report
+            if self._previous is not None and self._previous.version == version:
+                target, report = self._previous, {'loaded': True, 'version': version, 'load_seconds': 0.0,
+                                                  'from_memory': True}
+            else:
+                manifest = self._manifest(version)
+                if manifest is None:
+                    raise ValueError(f"Model version {version} not found")
+                ml_models, preprocessor = MLModels(), DataPreprocessor()
+                # Loaded before the swap: scoring keeps using the active version meanwhile
+                report = load_bundle(bundle_path(self.model_folder, version), ml_models, preprocessor,
+                                     self.mmap_mode)
+                target = ModelVersion(version, ml_models, preprocessor, manifest)
+            self._swap(target, report)
+            return report
+
+    def rollback(self, version=None):
+        """Re-activate ``version``, or by default the version that was active before this one"""
+        if version is None:
+            with self.lock:
+                earlier = [v for v in self.history[:-1] if v != self._active.version]
+                if not earlier:
+                    # Nothing activated earlier in this process: the newest older registered version
+                    registry = self.db.get_model_registry()
+                    ids = {row['model_name']: row['id'] for row in registry}
+                    current_id = ids.get(self._active.version, float('inf'))
+                    earlier = [row['model_name'] for row in registry
+                               if row['id'] < current_id and self._manifest(row['model_name'])]
+                if not earlier:
+                    raise ValueError("No earlier model version to roll back to")
+                version = earlier[-1]
+        return self.activate(version)
+
+    def _swap(self, target, report):
+        target.activated_at = time.time()
+        # A single reference assignment: readers see either the old or the new version
+        self._previous, self._active = self._active, target
+        self.history.append(target.version)
+        if not self.db.activate_model(target.version):
+            # A bundle saved before it was registered
+            self.db.register_model(target.version, bundle_path(self.model_folder, target.version),
+                                   target.manifest.get('performance', {}), is_active=False)
+            self.db.activate_model(target.version)
+        self.load_report = dict(report, activated_at=datetime.fromtimestamp(target.activated_at).isoformat())
+
+    def _manifest(self, version):
+        for manifest in list_bundles(self.model_folder):
+            if manifest['version'] == version:
+                return manifest
+        return None
+
+    def list_versions(self):
+        """Registered versions with their metrics, path and whether they are active"""
+        saved = {m['version']: m for m in list_bundles(self.model_folder)}
+        versions = []
+        for row in self.db.get_model_registry():
+            manifest = saved.get(row['model_name'], {})
+            versions.append(dict(row, version=row['model_name'], available=bool(manifest),
+                                 models=manifest.get('models', []), dataset=manifest.get('dataset'),
+                                 loaded=row['model_name'] in (self._active.version,
+                                                              self._previous.version if self._previous else None)))
+        return versions
+
+    def get_status(self):
+        """Get the active and previous versions and the last activation report"""
+        return {
+            'active': self._active.version,
+            'previous': self._previous.version if self._previous else None,
+            'history': self.history[-20:],
+            'activation': self.load_report
+        }
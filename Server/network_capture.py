@@ -2,34 +2,191 @@ import threading
 import time
 import socket
 import psutil
-from scapy.all import sniff, IP, TCP, UDP, ICMP, ARP, get_if_list
-from scapy.arch.windows import get_windows_if_list
+from scapy.all import sniff, IP, TCP, UDP, ICMP, ARP, get_if_list, RawPcapReader, conf
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
 import os
 from pathlib import Path
+from flow_table import Flow, FlowTable, map_port_to_service
+from traffic_window import TrafficWindow
+from batch_inference import BatchScorer
+from stage_queue import StageQueue, Empty
+from traffic_generator import TrafficGenerator
+from ip_anonymizer import PrefixPreservingAnonymizer
+from heavy_hitters import HeavyHitterDetector
+from fanout_detector import FanoutDetector
+from packet_parser import parse_frame, pcap_record_time, pcap_record_linktype
+from capture_sharding import ShardedCapture
+from event_buffer import EventRingBuffer
+from log_ingestion import LogIngestor
+from emitter import EventEmitter
+
+if os.name == 'nt':
+    from scapy.arch.windows import get_windows_if_list
+
+
+def extract_packet_info(packet, anonymize_ip=None):
+    """Extract relevant information from a Scapy packet; ``anonymize_ip`` maps addresses if given"""
+    try:
+        info = {}
+        
+        if IP in packet:
+            info['src_ip'] = anonymize_ip(packet[IP].src) if anonymize_ip else packet[IP].src
+            info['dst_ip'] = anonymize_ip(packet[IP].dst) if anonymize_ip else packet[IP].dst
+            info['protocol'] = packet[IP].proto
+            info['ip_version'] = packet[IP].version
+            info['ttl'] = packet[IP].ttl
+            info['ip_len'] = packet[IP].len
+        
+        if TCP in packet:
+            info['transport_protocol'] = 'TCP'
+            info['src_port'] = packet[TCP].sport
+            info['dst_port'] = packet[TCP].dport
+            info['tcp_flags'] = packet[TCP].flags
+            info['tcp_seq'] = packet[TCP].seq
+            info['tcp_ack'] = packet[TCP].ack
+            info['tcp_window'] = packet[TCP].window
+            
+        elif UDP in packet:
+            info['transport_protocol'] = 'UDP'
+            info['src_port'] = packet[UDP].sport
+            info['dst_port'] = packet[UDP].dport
+            
+        elif ICMP in packet:
+            info['transport_protocol'] = 'ICMP'
+            info['icmp_type'] = packet[ICMP].type
+            info['icmp_code'] = packet[ICMP].code
+        
+        # Packet size and timing
+        info['packet_size'] = len(packet)
+        info['timestamp'] = float(packet.time) if hasattr(packet, 'time') else time.time()
+        
+        return info
+        
+    except Exception as e:
+        print(f"Packet extraction error: {e}")
+        return None
+
+
+def build_filter_expression(filter_rules):
+    """Build BPF filter expression for packet capture"""
+    filters = []
+    
+    # Protocol filters
+    protocols = filter_rules.get('protocols', [])
+    if protocols:
+        protocol_map = {'TCP': 'tcp', 'UDP': 'udp', 'ICMP': 'icmp'}
+        protocol_filters = [protocol_map[p] for p in protocols if p in protocol_map]
+        if protocol_filters:
+            filters.append(f"({' or '.join(protocol_filters)})")
+    
+    # Port filters
+    ports = filter_rules.get('ports', [])
+    if ports:
+        port_filters = [f"port {port}" for port in ports]
+        filters.append(f"({' or '.join(port_filters)})")
+    
+    return ' and '.join(filters) if filters else ''
+
 
 class NetworkCapture:
-    def __init__(self, socketio, ml_models, preprocessor):
+    def __init__(self, socketio, ml_models, preprocessor, emitter=None, model_manager=None):
         self.socketio = socketio
+        self.emitter = emitter or EventEmitter(socketio)
         self.ml_models = ml_models
         self.preprocessor = preprocessor
+        self.model_manager = model_manager  # If set, its active version replaces ml_models/preprocessor
         self.is_capturing = False
         self.capture_thread = None
         self.interface = None
-        self.capture_mode = 'simulated'  # 'simulated', 'real', 'hybrid', 'logs'
+        self.capture_mode = 'simulated'  # 'simulated', 'real', 'hybrid', 'logs', 'pcap', 'sharded'
         self.privacy_mode = True  # Anonymize IPs by default
+        # Prefix-preserving, so hosts stay distinguishable; set 'anonymization_key'
+        # in the capture config to keep the mapping stable across restarts
+        self.anonymizer = PrefixPreservingAnonymizer()
         self.filter_rules = {
             'protocols': ['TCP', 'UDP', 'ICMP'],
             'ports': [],  # Empty means all ports
             'ip_filters': [],  # Empty means all IPs
             'min_packet_size': 0
         }
-        self.captured_packets = []
+        self.buffer_capacity = 100000  # Recent scored events kept in memory
+        self.event_buffer = EventRingBuffer(self.buffer_capacity)
         self.alert_threshold = 0.7
         self.log_file_path = None
+        self.log_format = 'auto'  # 'auto', 'zeek', 'iptables', 'csv', 'simple'
+        self.log_follow = False  # Keep tailing the log (across rotations) after EOF
+        self.log_checkpoint_file = 'log_checkpoints.json'
+        self.log_ingestor = None
+        self.pcap_files = []
+        self.pcap_report = None
+        self.fast_path = True  # Decode headers from raw bytes instead of scapy dissection
+        self.shard_config = {'shards': os.cpu_count() or 1, 'source': 'real'}
+        self.sharded_capture = None
+        self.parser_stats = {'fast_path': 0, 'scapy_fallback': 0}
+        self.flow_config = {
+            'idle_timeout': 15.0,  # Seconds without packets before a flow completes
+            'active_timeout': 120.0,  # Long-lived flows are reported at least this often
+            'max_flows': 100000  # LRU eviction beyond this many concurrent flows
+        }
+        self.flow_table = FlowTable(**self.flow_config)
+        self.flow_lock = threading.Lock()
+        self.window_config = {
+            'time_window': 2.0,  # KDD 'same host/service in the last 2 seconds'
+            'connection_window': 100  # KDD 'dst_host_*' over the last 100 connections
+        }
+        self.traffic_window = TrafficWindow(**self.window_config)
+        self._last_flow_sweep = 0.0
+        self.housekeeping_thread = None
+        self.inference_config = {
+            'batch_size': 512,  # Flush a batch once this many flows are waiting
+            'max_latency_ms': 20,  # ...or once the oldest has waited this long
+            'queue_size': 10000,
+            'overload_policy': 'cheap_rules'  # Score flows with rules only when the models fall behind
+        }
+        self.batch_scorer = BatchScorer(self._score_batch, self._publish_result,
+                                        shed_fn=self._score_with_rules, **self.inference_config)
+        self.packet_stage_config = {
+            'queue_size': 50000,  # Packets waiting between the capture thread and flow assembly
+            'overload_policy': 'flow_sampled'  # 'drop_oldest', 'drop_newest' or 'flow_sampled'
+        }
+        self.packet_queue = StageQueue('packets', self.packet_stage_config['queue_size'],
+                                       self.packet_stage_config['overload_policy'])
+        self.packet_thread = None
+        self.simulation_config = {
+            'rate': 1,  # Synthetic events per second
+            'unit': 'packets',  # 'packets' feed the flow table, 'flows' skip straight to scoring
+            'attack_mix': None,  # e.g. {'normal': 0.9, 'syn_flood': 0.1}; None uses the default mix
+            'hosts': 254,
+            'servers': 20,
+            'attackers': 16,
+            'seed': None
+        }
+        self.traffic_generator = None
+        self.heavy_hitter_config = {
+            'enabled': True,
+            'slots': 5,  # Sliding window of slots x slot_seconds
+            'slot_seconds': 2.0,
+            'width': 2048,  # Count-Min Sketch counters per row
+            'depth': 4,
+            'min_share': 0.1,  # A heavy hitter carries at least this share of the window's traffic
+            'packet_rate_floor': 2000,  # Thresholds adapt upwards from these
+            'byte_rate_floor': 2000000
+        }
+        self.heavy_hitters = HeavyHitterDetector(self._send_detector_alert, **self.heavy_hitter_config)
+        self.fanout_config = {
+            'enabled': True,
+            'window_seconds': 60.0,
+            'port_threshold': 100,  # Distinct destination ports per source in the window: port scan
+            'host_threshold': 50,  # Distinct destination hosts per source in the window: host sweep
+            'precision': 7,  # 2**precision HyperLogLog registers per sketch (~9% error)
+            'max_sources': 20000  # Tracked sources; the least recently seen is evicted beyond this
+        }
+        self.fanout = FanoutDetector(self._send_detector_alert, **self.fanout_config)
+        self.model_timings = {}  # Per-model milliseconds for the last scored batch
+        self.model_type = 'cascade'  # 'cascade' escalates only uncertain flows to the ensemble
         
     def get_network_interfaces(self):
         """Get available network interfaces"""
@@ -77,11 +234,8 @@ class NetworkCapture:
         if self.is_capturing:
             return {"message": "Capture already active"}
         
-        self.capture_mode = config.get('mode', 'simulated')
-        self.interface = config.get('interface')
-        self.privacy_mode = config.get('privacy_mode', True)
-        self.filter_rules = config.get('filters', self.filter_rules)
-        self.alert_threshold = config.get('alert_threshold', 0.7)
+        self._apply_config(config)
+        self.batch_scorer.start()
         
         print(f"Starting {self.capture_mode} capture on interface: {self.interface}")
         
@@ -90,13 +244,83 @@ class NetworkCapture:
         self.capture_thread.daemon = True
         self.capture_thread.start()
         
+        # Live sources hand packets to flow assembly through a bounded queue so
+        # a slow pipeline sheds load by policy instead of stalling the sniffer
+        if self._uses_packet_queue():
+            self.packet_thread = threading.Thread(target=self._packet_worker_loop)
+            self.packet_thread.daemon = True
+            self.packet_thread.start()
+        
+        # Expire idle flows even when no packets arrive. Offline pcap and log
+        # replay run on record time instead, so the wall clock must not expire
+        # flows, and sharded capture keeps its flows in the worker processes.
+        if not self._is_replay() and self.capture_mode != 'sharded':
+            self.housekeeping_thread = threading.Thread(target=self._flow_housekeeping_loop)
+            self.housekeeping_thread.daemon = True
+            self.housekeeping_thread.start()
+        
         return {"message": f"{self.capture_mode.capitalize()} capture started"}
     
+    def _apply_config(self, config):
+        """Apply a capture config and build fresh flow, window and scoring state"""
+        self.capture_mode = config.get('mode', 'simulated')
+        self.interface = config.get('interface')
+        self.privacy_mode = config.get('privacy_mode', True)
+        if config.get('anonymization_key'):
+            self.anonymizer = PrefixPreservingAnonymizer(config['anonymization_key'])
+        self.filter_rules = config.get('filters', self.filter_rules)
+        self.alert_threshold = config.get('alert_threshold', 0.7)
+        self.model_type = config.get('model_type', self.model_type)
+        buffer_capacity = config.get('buffer_capacity', self.buffer_capacity)
+        if buffer_capacity != self.buffer_capacity:
+            self.buffer_capacity = buffer_capacity
+            self.event_buffer = EventRingBuffer(buffer_capacity)
+        pcap_files = config.get('pcap_files', self.pcap_files)
+        self.pcap_files = [pcap_files] if isinstance(pcap_files, str) else list(pcap_files)
+        self.fast_path = config.get('fast_path', True)
+        self.log_format = config.get('log_format', self.log_format)
+        self.log_follow = config.get('log_follow', self.log_follow)
+        self.parser_stats = {'fast_path': 0, 'scapy_fallback': 0}
+        self.flow_config.update(config.get('flow', {}))
+        self.flow_table = FlowTable(**self.flow_config)
+        self.window_config.update(config.get('window', {}))
+        self.traffic_window = TrafficWindow(**self.window_config)
+        self._last_flow_sweep = 0.0
+        self.inference_config.update(config.get('inference', {}))
+        self.batch_scorer = BatchScorer(self._score_batch, self._publish_result,
+                                        shed_fn=self._score_with_rules, **self.inference_config)
+        self.packet_stage_config.update(config.get('packet_stage', {}))
+        self.simulation_config.update(config.get('simulation', {}))
+        self.traffic_generator = None
+        self.heavy_hitter_config.update(config.get('heavy_hitters', {}))
+        self.heavy_hitters = HeavyHitterDetector(self._send_detector_alert, **self.heavy_hitter_config)
+        self.fanout_config.update(config.get('fanout', {}))
+        self.fanout = FanoutDetector(self._send_detector_alert, **self.fanout_config)
+        self.packet_queue = StageQueue('packets', self.packet_stage_config['queue_size'],
+                                       self.packet_stage_config['overload_policy'])
+        self.shard_config = {
+            'shards': config.get('shards', os.cpu_count() or 1),
+            'source': config.get('shard_source', 'real')  # 'real' or 'pcap'
+        }
+    
     def stop_capture(self):
         """Stop network packet capture"""
         self.is_capturing = False
         if self.capture_thread:
             self.capture_thread.join(timeout=5)
+        if self.packet_thread:
+            self.packet_thread.join(timeout=5)
+            self.packet_thread = None
+        if self.housekeeping_thread:
+            self.housekeeping_thread.join(timeout=5)
+        
+        # Score whatever was still in flight
+        with self.flow_lock:
+            remaining = self.flow_table.flush()
+        for flow in remaining:
+            self._process_flow(flow)
+        self.batch_scorer.stop()
+        
         return {"message": "Capture stopped"}
     
     def _capture_loop(self):
@@ -110,12 +334,23 @@ class NetworkCapture:
                 self._capture_hybrid_packets()
             elif self.capture_mode == 'logs':
                 self._capture_from_logs()
+            elif self.capture_mode == 'pcap':
+                self._capture_from_pcap()
+            elif self.capture_mode == 'sharded':
+                self._capture_sharded()
         except Exception as e:
             print(f"Capture loop error: {e}")
             self.is_capturing = False
     
     def _capture_real_packets(self):
         """Capture real network packets using Scapy"""
+        if self.fast_path:
+            try:
+                self._capture_real_packets_raw()
+                return
+            except Exception as e:
+                print(f"Raw socket capture unavailable, using sniff: {e}")
+        
         def packet_handler(packet):
             if not self.is_capturing:
                 return
@@ -125,30 +360,8 @@ class NetworkCapture:
                 packet_info = self._extract_packet_info(packet)
                 
                 if packet_info and self._should_process_packet(packet_info):
-                    # Process through ML models
-                    processed_data = self._preprocess_packet(packet_info)
-                    prediction, probability = self._analyze_packet(processed_data)
-                    
-                    # Create result
-                    result = {
-                        'timestamp': datetime.now().isoformat(),
-                        'source': 'real_capture',
-                        'data': packet_info,
-                        'prediction': int(prediction),
-                        'probability': float(probability),
-                        'threat_level': self._get_threat_level(probability)
-                    }
-                    
-                    # Emit to clients
-                    self.socketio.emit('network_data', result)
-                    
-                    # Check for alerts
-                    if probability >= self.alert_threshold:
-                        self._send_alert(result)
-                    
-                    self.captured_packets.append(result)
-                    if len(self.captured_packets) > 1000:
-                        self.captured_packets = self.captured_packets[-1000:]
+                    # Aggregate into flows; completed flows are scored
+                    self._admit_packet(packet_info)
                         
             except Exception as e:
                 print(f"Packet processing error: {e}")
@@ -160,39 +373,100 @@ class NetworkCapture:
         sniff(iface=self.interface, prn=packet_handler, filter=filter_expr, 
               stop_filter=lambda x: not self.is_capturing, store=0)
     
+    def _capture_real_packets_raw(self):
+        """Capture real packets as raw frames and decode them with the fast-path parser"""
+        filter_expr = self._build_filter_expression()
+        print(f"Starting raw packet capture with filter: {filter_expr}")
+        
+        sock = conf.L2listen(iface=self.interface, filter=filter_expr or None)
+        try:
+            while self.is_capturing:
+                if not sock.select([sock], 0.5):
+                    continue
+                layer, data, timestamp = sock.recv_raw()
+                if data is None:
+                    continue
+                
+                try:
+                    linktype = conf.l2types.layer2num.get(layer)
+                    packet_info = self._parse_raw_frame(data, linktype, timestamp or time.time(), layer)
+                    
+                    if packet_info and self._should_process_packet(packet_info):
+                        self._admit_packet(packet_info)
+                        
+                except Exception as e:
+                    print(f"Packet processing error: {e}")
+        finally:
+            sock.close()
+    
+    def _capture_sharded(self):
+        """Spread capture across worker processes, each owning the flows of its hash shard"""
+        config = {
+            'mode': self.shard_config['source'],
+            'interface': self.interface,
+            'privacy_mode': self.privacy_mode,
+            'anonymization_key': self.anonymizer.secret,  # Same mapping in every shard
+            'filters': self.filter_rules,
+            'alert_threshold': self.alert_threshold,
+            'pcap_files': self.pcap_files,
+            'fast_path': self.fast_path,
+            'flow': self.flow_config,
+            'window': self.window_config,
+            'inference': self.inference_config,
+            'heavy_hitters': self.heavy_hitter_config,
+            'fanout': self.fanout_config
+        }
+        ml_models, preprocessor = self._model_snapshot()
+        self.sharded_capture = ShardedCapture(
+            config, ml_models, preprocessor, self._emit_result,
+            num_shards=self.shard_config['shards'], on_alert=self._send_detector_alert
+        )
+        self.sharded_capture.start()
+        
+        try:
+            while self.is_capturing and not self.sharded_capture.is_finished():
+                time.sleep(0.5)
+        finally:
+            self.sharded_capture.stop()
+            self.is_capturing = False
+    
     def _capture_simulated_packets(self):
-        """Generate simulated network packets"""
+        """Generate synthetic traffic in batches at the configured rate and attack mix"""
+        config = self.simulation_config
+        generator = TrafficGenerator(
+            rate=config['rate'], attack_mix=config['attack_mix'], hosts=config['hosts'],
+            servers=config['servers'], attackers=config['attackers'], seed=config['seed']
+        )
+        if self.privacy_mode:
+            generator.map_addresses(self._anonymize_ip)
+        self.traffic_generator = generator
+        flows = config['unit'] == 'flows'
+        
+        # Up to 100 batches per second; at low rates one event per tick
+        tick = 1.0 / min(max(generator.rate, 1.0), 100.0)
+        last = time.time()
+        generator.take(last)
+        
         while self.is_capturing:
             try:
-                # Generate realistic packet data
-                packet_info = self._generate_simulated_packet()
-                
-                # Process through ML models
-                processed_data = self._preprocess_packet(packet_info)
-                prediction, probability = self._analyze_packet(processed_data)
-                
-                # Create result
-                result = {
-                    'timestamp': datetime.now().isoformat(),
-                    'source': 'simulated',
-                    'data': packet_info,
-                    'prediction': int(prediction),
-                    'probability': float(probability),
-                    'threat_level': self._get_threat_level(probability)
-                }
-                
-                # Emit to clients
-                self.socketio.emit('network_data', result)
-                
-                # Check for alerts
-                if probability >= self.alert_threshold:
-                    self._send_alert(result)
-                
-                self.captured_packets.append(result)
-                if len(self.captured_packets) > 1000:
-                    self.captured_packets = self.captured_packets[-1000:]
-                
-                time.sleep(1)  # Generate 1 packet per second
+                time.sleep(max(0.0, tick - (time.time() - last)))
+                now = time.time()
+                count = generator.take(now)
+                if count:
+                    if flows:
+                        # Completed connections go straight to feature extraction and scoring
+                        batch = generator.generate_flows(count, last, now)
+                        for record in TrafficGenerator.to_records(batch):
+                            self.fanout.add(record, initiation=True)
+                            self._process_flow(Flow.from_record(record))
+                    else:
+                        # Aggregate into flows; completed flows are scored
+                        batch = generator.generate_packets(count, last, now)
+                        packets = TrafficGenerator.to_records(batch)
+                        self.heavy_hitters.add_many(packets)
+                        self.fanout.add_many(packets)
+                        self.packet_queue.put_many(packets, key=FlowTable.flow_key)
+                last = now
                 
             except Exception as e:
                 print(f"Simulated packet error: {e}")
@@ -213,185 +487,358 @@ class NetworkCapture:
         simulated_thread.join()
     
     def _capture_from_logs(self):
-        """Read packets from log files (Wireshark, firewall logs)"""
+        """Ingest Zeek conn.log, iptables/nftables syslog, CSV flow or simple log files"""
         if not self.log_file_path or not os.path.exists(self.log_file_path):
             print("No log file specified or file not found")
             return
         
         try:
-            # Read log file and process entries
-            with open(self.log_file_path, 'r') as f:
-                for line in f:
+            self.log_ingestor = LogIngestor(
+                self.log_file_path,
+                log_format=self.log_format,
+                follow=self.log_follow,
+                checkpoint_file=self.log_checkpoint_file
+            )
+            connection_records = self.log_ingestor.record_type == 'connection'
+            print(f"Ingesting {self.log_ingestor.log_format} log: {self.log_file_path}")
+            
+            for records in self.log_ingestor.read_chunks(lambda: not self.is_capturing):
+                processed = 0
+                for record in records.to_dict('records'):
                     if not self.is_capturing:
                         break
+                    processed += 1
+                    record = {k: v for k, v in record.items() if v == v}  # Drop NaN fields
+                    if self.privacy_mode:
+                        record['src_ip'] = self._anonymize_ip(record['src_ip'])
+                        record['dst_ip'] = self._anonymize_ip(record['dst_ip'])
+                    if not self._should_process_packet(record):
+                        continue
                     
-                    # Parse log entry (simplified - would need specific parsers for different log formats)
-                    packet_info = self._parse_log_entry(line.strip())
-                    
-                    if packet_info:
-                        processed_data = self._preprocess_packet(packet_info)
-                        prediction, probability = self._analyze_packet(processed_data)
-                        
-                        result = {
-                            'timestamp': datetime.now().isoformat(),
-                            'source': 'log_file',
-                            'data': packet_info,
-                            'prediction': int(prediction),
-                            'probability': float(probability),
-                            'threat_level': self._get_threat_level(probability)
-                        }
-                        
-                        self.socketio.emit('network_data', result)
-                        
-                        if probability >= self.alert_threshold:
-                            self._send_alert(result)
-                    
-                    time.sleep(0.1)  # Small delay between log entries
+                    if connection_records:
+                        # Already a whole connection; skip the flow table
+                        self.fanout.add(record, initiation=True)
+                        self._process_flow(Flow.from_record(record))
+                    else:
+                        self._admit_packet(record)
+                # Checkpoint only what was processed: a stop mid-chunk resumes at the next record
+                self.log_ingestor.commit(None if processed == len(records) else processed)
+            
+            if not self.log_follow:
+                # End of a one-shot replay: complete whatever is still open
+                with self.flow_lock:
+                    remaining = self.flow_table.flush()
+                for flow in remaining:
+                    self._process_flow(flow)
                     
         except Exception as e:
             print(f"Log file reading error: {e}")
     
+    def _capture_from_pcap(self):
+        """Replay pcap/pcapng files through the flow, scoring and alert path as fast as possible"""
+        if not self.pcap_files:
+            print("No pcap files specified")
+            self.is_capturing = False
+            return
+        
+        started = time.time()
+        packets = 0
+        files_done = []
+        
+        for pcap_file in self.pcap_files:
+            if not self.is_capturing:
+                break
+            if not os.path.exists(pcap_file):
+                print(f"Pcap file not found: {pcap_file}")
+                continue
+            
+            try:
+                # RawPcapReader streams records (pcap and pcapng) without dissecting them
+                with RawPcapReader(pcap_file) as reader:
+                    for data, metadata in reader:
+                        if not self.is_capturing:
+                            break
+                        packets += 1
+                        packet_info = self._parse_raw_frame(
+                            data,
+                            pcap_record_linktype(metadata, reader),
+                            pcap_record_time(metadata, reader)
+                        )
+                        if packet_info and self._should_process_packet(packet_info):
+                            self._admit_packet(packet_info)
+                files_done.append(pcap_file)
+            except Exception as e:
+                print(f"Pcap reading error in {pcap_file}: {e}")
+        
+        # Complete the remaining flows and wait for the scorer to catch up
+        self.heavy_hitters.flush()
+        self.fanout.flush()
+        with self.flow_lock:
+            remaining = self.flow_table.flush()
+        for flow in remaining:
+            self._process_flow(flow)
+        self.batch_scorer.wait_idle()
+        
+        elapsed = max(time.time() - started, 1e-9)
+        flows = self.flow_table.stats['flows_completed']
+        self.pcap_report = {
+            'files': files_done,
+            'packets': packets,
+            'flows': flows,
+            'elapsed_seconds': elapsed,
+            'packets_per_second': packets / elapsed,
+            'flows_per_second': flows / elapsed,
+            'scored': self.batch_scorer.stats['scored'],
+            'dropped': self.batch_scorer.get_stats()['dropped']
+        }
+        print(f"Pcap replay finished: {packets} packets, {flows} flows in {elapsed:.2f}s "
+              f"({packets / elapsed:.0f} packets/s, {flows / elapsed:.0f} flows/s)")
+        self.socketio.emit('pcap_complete', self.pcap_report)
+        
+        self.is_capturing = False
+        self.batch_scorer.stop()
+    
+    def _parse_raw_frame(self, data, linktype, timestamp, layer=None):
+        """Extract packet information from raw frame bytes, falling back to Scapy"""
+        if self.fast_path and linktype is not None:
+            info = parse_frame(data, linktype, timestamp)
+            if info is not None:
+                self.parser_stats['fast_path'] += 1
+                if self.privacy_mode:
+                    info['src_ip'] = self._anonymize_ip(info['src_ip'])
+                    info['dst_ip'] = self._anonymize_ip(info['dst_ip'])
+                return info
+        
+        if layer is None:
+            layer = conf.l2types.get(linktype, conf.raw_layer)
+        packet = layer(data)
+        packet.time = timestamp
+        return self._extract_packet_info(packet)
+    
     def _extract_packet_info(self, packet):
         """Extract relevant information from Scapy packet"""
+        self.parser_stats['scapy_fallback'] += 1
+        return extract_packet_info(packet, self._anonymize_ip if self.privacy_mode else None)
+    
+    def _is_replay(self):
+        """Finite sources that can be read as slowly as the pipeline needs"""
+        return self.capture_mode == 'pcap' or (self.capture_mode == 'logs' and not self.log_follow)
+    
+    def _uses_packet_queue(self):
+        """Live sources can't be slowed down, so they go through the packet queue"""
+        return self.capture_mode in ('real', 'simulated', 'hybrid')
+    
+    def _admit_packet(self, packet_info):
+        """Entry point for every captured packet: pre-ML detectors, then flow assembly"""
+        self.heavy_hitters.add(packet_info)
+        self.fanout.add(packet_info)
+        if self._uses_packet_queue():
+            return self._enqueue_packet(packet_info)
+        self._handle_packet(packet_info)
+        return True
+    
+    def _enqueue_packet(self, packet_info):
+        """Hand a live packet to flow assembly; the overload policy decides if it is kept"""
+        return self.packet_queue.put(packet_info, key=FlowTable.flow_key)
+    
+    def _packet_worker_loop(self):
+        """Drain the packet queue into the flow table until capture stops"""
+        while self.is_capturing or not self.packet_queue.empty():
+            try:
+                entries = self.packet_queue.get_many(1024, timeout=0.1)
+            except Empty:
+                continue
+            try:
+                for _, packet_info in entries:
+                    self._handle_packet(packet_info)
+            except Exception as e:
+                print(f"Packet processing error: {e}")
+            finally:
+                self.packet_queue.task_done(len(entries))
+    
+    def _handle_packet(self, packet_info):
+        """Feed a packet into the flow table and score any flows it completes"""
+        timestamp = packet_info.get('timestamp') or time.time()
+        with self.flow_lock:
+            completed = self.flow_table.update(packet_info, timestamp)
+            if timestamp - self._last_flow_sweep >= 1.0:
+                completed.extend(self.flow_table.expire(timestamp))
+                self._last_flow_sweep = timestamp
+        
+        for flow in completed:
+            self._process_flow(flow)
+    
+    def _flow_housekeeping_loop(self):
+        """Periodically complete idle flows during live capture"""
+        while self.is_capturing:
+            time.sleep(1)
+            try:
+                with self.flow_lock:
+                    completed = self.flow_table.expire(time.time())
+                for flow in completed:
+                    self._process_flow(flow)
+                # Don't let sparse traffic sit in the detector's buffer
+                self.heavy_hitters.flush(time.time())
+                self.fanout.flush(time.time())
+            except Exception as e:
+                print(f"Flow housekeeping error: {e}")
+    
+    def _process_flow(self, flow):
+        """Compute features for a completed flow and queue it for batched scoring"""
         try:
-            info = {}
-            
-            if IP in packet:
-                info['src_ip'] = self._anonymize_ip(packet[IP].src) if self.privacy_mode else packet[IP].src
-                info['dst_ip'] = self._anonymize_ip(packet[IP].dst) if self.privacy_mode else packet[IP].dst
-                info['protocol'] = packet[IP].proto
-                info['ip_version'] = packet[IP].version
-                info['ttl'] = packet[IP].ttl
-                info['ip_len'] = packet[IP].len
-            
-            if TCP in packet:
-                info['transport_protocol'] = 'TCP'
-                info['src_port'] = packet[TCP].sport
-                info['dst_port'] = packet[TCP].dport
-                info['tcp_flags'] = packet[TCP].flags
-                info['tcp_seq'] = packet[TCP].seq
-                info['tcp_ack'] = packet[TCP].ack
-                info['tcp_window'] = packet[TCP].window
-                
-            elif UDP in packet:
-                info['transport_protocol'] = 'UDP'
-                info['src_port'] = packet[UDP].sport
-                info['dst_port'] = packet[UDP].dport
+            window_features = self.traffic_window.add_connection(
+                flow.start_time, flow.dst_ip, flow.service, flow.src_port,
+                flow.is_serror, flow.is_rerror
+            )
+            features = flow.to_features()
+            features.update(window_features)
+            # Finite replays (pcap, one-shot logs) wait for the scorer instead of shedding flows
+            self.batch_scorer.submit((flow, features), block=self._is_replay(), key=flow.key)
                 
-            elif ICMP in packet:
-                info['transport_protocol'] = 'ICMP'
-                info['icmp_type'] = packet[ICMP].type
-                info['icmp_code'] = packet[ICMP].code
-            
-            # Packet size and timing
-            info['packet_size'] = len(packet)
-            info['timestamp'] = float(packet.time) if hasattr(packet, 'time') else time.time()
-            
-            return info
-            
         except Exception as e:
-            print(f"Packet extraction error: {e}")
-            return None
-    
-    def _generate_simulated_packet(self):
-        """Generate realistic simulated packet data"""
-        protocols = ['TCP', 'UDP', 'ICMP']
-        common_ports = [80, 443, 22, 21, 25, 53, 110, 143, 993, 995]
-        
-        # Generate packet with potential attack patterns
-        is_suspicious = np.random.random() < 0.15  # 15% chance of suspicious packet
-        
-        packet_info = {
-            'src_ip': self._anonymize_ip(f"192.168.1.{np.random.randint(1, 254)}"),
-            'dst_ip': self._anonymize_ip(f"10.0.0.{np.random.randint(1, 254)}"),
-            'protocol': np.random.choice([6, 17, 1]),  # TCP, UDP, ICMP
-            'transport_protocol': np.random.choice(protocols),
-            'src_port': np.random.choice(common_ports) if not is_suspicious else np.random.randint(1, 65535),
-            'dst_port': np.random.choice(common_ports),
-            'packet_size': np.random.randint(40, 1500) if not is_suspicious else np.random.randint(1000, 8000),
-            'timestamp': time.time(),
-            'ip_version': 4,
-            'ttl': np.random.randint(32, 128)
+            print(f"Flow processing error: {e}")
+    
+    def _model_snapshot(self):
+        """(ml_models, preprocessor) to score one batch with; a model swap never splits a batch"""
+        if self.model_manager is not None:
+            return self.model_manager.snapshot()
+        return self.ml_models, self.preprocessor
+    
+    def _score_batch(self, items):
+        """Score a batch of (flow, features) items with one model call"""
+        ml_models, preprocessor = self._model_snapshot()
+        processed_data = self._preprocess_packet(items, preprocessor)
+        predictions, probabilities = self._analyze_packet(processed_data, ml_models)
+        return list(zip(predictions, probabilities))
+    
+    def _score_with_rules(self, item):
+        """Overload fallback: score a shed flow with cheap rules so it can still alert"""
+        flow, features = item
+        features = dict(features)
+        features.update({name: values[0] for name, values in self.fanout.scores([flow.src_ip]).items()})
+        prediction, probability = self._cheap_rule_score(features)
+        self.batch_scorer.result_fn(item, (prediction, probability, 'rules'))
+    
+    def _cheap_rule_score(self, features):
+        """Deterministic rules over flow and window features; no preprocessing or models"""
+        score = 0.0
+        if features.get('land'):
+            score += 0.6
+        if features.get('wrong_fragment', 0) > 0:
+            score += 0.4
+        # Many half-open connections to one host: SYN flood
+        if features.get('count', 0) >= 20 and features.get('serror_rate', 0) >= 0.8:
+            score += 0.7
+        # Many rejected connections: scan against closed ports
+        if features.get('count', 0) >= 20 and features.get('rerror_rate', 0) >= 0.8:
+            score += 0.5
+        # One host probed on many services
+        if features.get('dst_host_count', 0) >= 50 and features.get('dst_host_diff_srv_rate', 0) >= 0.5:
+            score += 0.4
+        # Source fanning out over many ports or hosts: scan or sweep
+        if max(features.get('port_scan_score', 0), features.get('host_sweep_score', 0)) >= 1.0:
+            score += 0.6
+        if features.get('src_bytes', 0) > 1000000:
+            score += 0.2
+        probability = min(1.0, score)
+        return int(probability > 0.5), probability
+    
+    def _publish_result(self, item, scored):
+        """Emit, alert on and record a scored flow"""
+        self._emit_result(self._build_result(item, scored))
+    
+    def _build_result(self, item, scored):
+        """Build the result record for a scored flow"""
+        flow, _ = item
+        prediction, probability = scored[:2]
+        
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'source': self._get_result_source(),
+            'data': flow.to_dict(),
+            'prediction': int(prediction),
+            'probability': float(probability),
+            'threat_level': self._get_threat_level(probability),
+            'scored_by': scored[2] if len(scored) > 2 else 'model'
         }
+    
+    def _emit_result(self, result):
+        """Send a result to clients, raise an alert if needed and keep it"""
+        event_id = self.event_buffer.append(result)
         
-        if is_suspicious:
-            # Add suspicious characteristics
-            packet_info.update({
-                'tcp_flags': np.random.choice([2, 18, 24]),  # SYN, FIN, RST flags
-                'packet_size': np.random.randint(1000, 8000),  # Large packets
-                'src_port': np.random.randint(1, 1024),  # Privileged ports
-                'dst_port': np.random.randint(1, 1024),
-            })
+        # Coalesced into the next frame sent to subscribed clients
+        self.emitter.publish(result)
         
-        return packet_info
+        # Check for alerts
+        if result['probability'] >= self.alert_threshold:
+            self._send_alert(result, event_id)
     
-    def _preprocess_packet(self, packet_info):
-        """Preprocess packet data for ML model input"""
+    def _get_result_source(self):
+        """Source label for results produced by the current capture mode"""
+        return {
+            'real': 'real_capture',
+            'simulated': 'simulated',
+            'hybrid': 'hybrid',
+            'logs': 'log_file',
+            'pcap': 'pcap_file'
+        }.get(self.capture_mode, self.capture_mode)
+    
+    def _preprocess_packet(self, items, preprocessor=None):
+        """Preprocess a batch of completed flows for ML model input"""
+        preprocessor = preprocessor or self.preprocessor
         try:
-            # Convert packet info to ML model format
-            features = {
-                'duration': 0.001,  # Default duration for single packet
-                'protocol': packet_info.get('transport_protocol', 'TCP'),
-                'service': self._map_port_to_service(packet_info.get('dst_port', 80)),
-                'src_bytes': packet_info.get('packet_size', 0),
-                'dst_bytes': 0,  # Would need bidirectional capture
-                'count': 1,
-                'srv_count': 1,
-                'serror_rate': 0.0,
-                'srv_serror_rate': 0.0,
-                'rerror_rate': 0.0,
-                'srv_rerror_rate': 0.0,
-                'same_srv_rate': 1.0,
-                'diff_srv_rate': 0.0,
-                'dst_host_count': 1,
-                'dst_host_srv_count': 1,
-                'dst_host_same_srv_rate': 1.0,
-                'dst_host_diff_srv_rate': 0.0,
-                'dst_host_serror_rate': 0.0,
-                'dst_host_srv_serror_rate': 0.0
-            }
-            
-            # Create DataFrame for preprocessing
-            df = pd.DataFrame([features])
+            # Create one DataFrame for the batch, restricted to the trained columns
+            df = pd.DataFrame([features for _, features in items])
+            # Fan-out of each flow's source right now; used by models trained with these columns
+            for name, values in self.fanout.scores([flow.src_ip for flow, _ in items]).items():
+                df[name] = values
+            feature_columns = preprocessor.get_feature_names()
+            if feature_columns:
+                df = df.reindex(columns=feature_columns)
             
             # Use the existing preprocessor
             try:
-                processed = self.preprocessor.transform_data(df)
+                processed = preprocessor.transform_data(df)
                 return processed
             except:
                 # Fallback: create simple numeric array
                 numeric_features = [
-                    packet_info.get('packet_size', 0),
-                    packet_info.get('src_port', 0),
-                    packet_info.get('dst_port', 0),
-                    1 if packet_info.get('transport_protocol') == 'TCP' else 0,
-                    1 if packet_info.get('transport_protocol') == 'UDP' else 0,
-                    1 if packet_info.get('transport_protocol') == 'ICMP' else 0
+                    [
+                        flow.src_bytes + flow.dst_bytes,
+                        flow.src_port or 0,
+                        flow.dst_port or 0,
+                        1 if flow.transport_protocol == 'TCP' else 0,
+                        1 if flow.transport_protocol == 'UDP' else 0,
+                        1 if flow.transport_protocol == 'ICMP' else 0
+                    ]
+                    for flow, _ in items
                 ]
-                return pd.DataFrame([numeric_features])
+                return pd.DataFrame(numeric_features)
                 
         except Exception as e:
-            print(f"Packet preprocessing error: {e}")
+            print(f"Flow preprocessing error: {e}")
             # Return basic features as fallback
-            return pd.DataFrame([[packet_info.get('packet_size', 0), 80, 443, 1, 0, 0]])
+            return pd.DataFrame([[flow.src_bytes + flow.dst_bytes, 80, 443, 1, 0, 0]
+                                 for flow, _ in items])
     
-    def _analyze_packet(self, processed_data):
-        """Analyze packet using ML models or fallback methods"""
+    def _analyze_packet(self, processed_data, ml_models=None):
+        """Analyze a batch using ML models or fallback methods"""
+        ml_models = ml_models or self.ml_models
         try:
-            # Try to use trained ML models
-            if hasattr(self.ml_models, 'models') and self.ml_models.models:
-                prediction = self.ml_models.predict(processed_data, 'ensemble')[0]
-                probability = self.ml_models.predict_proba(processed_data, 'ensemble')[0][1]
-            else:
-                # Use rule-based detection
-                prediction, probability = self._rule_based_detection(processed_data)
-            
-            return prediction, probability
+            # Try to use trained ML models; one vectorized call per batch
+            if hasattr(ml_models, 'models') and ml_models.models:
+                scored = ml_models.score(processed_data, self.model_type)
+                self.model_timings = scored['timings_ms']
+                proba = scored['probabilities']
+                return np.argmax(proba, axis=1), proba[:, 1]
             
         except Exception as e:
             print(f"Packet analysis error: {e}")
-            # Fallback to simple rule-based detection
-            return self._rule_based_detection(processed_data)
+        
+        # Fallback to simple rule-based detection, row by row
+        rows = [self._rule_based_detection(processed_data.iloc[[i]])
+                for i in range(len(processed_data))]
+        return [r[0] for r in rows], [r[1] for r in rows]
     
     def _rule_based_detection(self, processed_data):
         """Rule-based threat detection as fallback"""
@@ -456,47 +903,17 @@ class NetworkCapture:
     
     def _build_filter_expression(self):
         """Build BPF filter expression for packet capture"""
-        filters = []
-        
-        # Protocol filters
-        protocols = self.filter_rules.get('protocols', [])
-        if protocols:
-            protocol_map = {'TCP': 'tcp', 'UDP': 'udp', 'ICMP': 'icmp'}
-            protocol_filters = [protocol_map[p] for p in protocols if p in protocol_map]
-            if protocol_filters:
-                filters.append(f"({' or '.join(protocol_filters)})")
-        
-        # Port filters
-        ports = self.filter_rules.get('ports', [])
-        if ports:
-            port_filters = [f"port {port}" for port in ports]
-            filters.append(f"({' or '.join(port_filters)})")
-        
-        return ' and '.join(filters) if filters else ''
+        return build_filter_expression(self.filter_rules)
     
     def _anonymize_ip(self, ip):
-        """Anonymize IP address for privacy"""
+        """Anonymize IP address for privacy (prefix-preserving, memoized)"""
         if not self.privacy_mode:
             return ip
-        
-        try:
-            parts = ip.split('.')
-            if len(parts) == 4:
-                # Keep first two octets, anonymize last two
-                return f"{parts[0]}.{parts[1]}.xxx.xxx"
-        except:
-            pass
-        
-        return "xxx.xxx.xxx.xxx"
+        return self.anonymizer.anonymize(ip)
     
     def _map_port_to_service(self, port):
         """Map port number to service name"""
-        port_service_map = {
-            80: 'http', 443: 'https', 22: 'ssh', 21: 'ftp',
-            25: 'smtp', 53: 'dns', 110: 'pop3', 143: 'imap',
-            993: 'imaps', 995: 'pop3s', 23: 'telnet', 3306: 'mysql'
-        }
-        return port_service_map.get(port, 'other')
+        return map_port_to_service(port)
     
     def _get_threat_level(self, probability):
         """Get threat level based on probability"""
@@ -507,10 +924,10 @@ class NetworkCapture:
         else:
             return 'LOW'
     
-    def _send_alert(self, result):
+    def _send_alert(self, result, event_id=None):
         """Send security alert"""
         alert = {
-            'id': len(self.captured_packets) + 1,
+            'id': event_id if event_id is not None else self.event_buffer.total,
             'timestamp': result['timestamp'],
             'threat_level': result['threat_level'],
             'probability': result['probability'],
@@ -519,27 +936,13 @@ class NetworkCapture:
             'message': f"Threat detected in {result['source']} data! Probability: {result['probability']:.2%}"
         }
         
-        self.socketio.emit('security_alert', alert)
+        self.emitter.emit_alert(alert)
     
-    def _parse_log_entry(self, log_line):
-        """Parse log entry (simplified - would need specific parsers)"""
-        # This is a placeholder - would need specific parsers for different log formats
-        try:
-            # Example for simple log format
-            parts = log_line.split()
-            if len(parts) >= 6:
-                return {
-                    'src_ip': self._anonymize_ip(parts[0]),
-                    'dst_ip': self._anonymize_ip(parts[1]),
-                    'protocol': parts[2],
-                    'src_port': int(parts[3]),
-                    'dst_port': int(parts[4]),
-                    'packet_size': int(parts[5]),
-                    'timestamp': time.time()
-                }
-        except:
-            pass
-        return None
+    def _send_detector_alert(self, alert):
+        """Raise an alert from a pre-ML detector (no flow or model score behind it)"""
+        alert = dict(alert)
+        alert['timestamp'] = datetime.fromtimestamp(alert['timestamp']).isoformat()
+        self.emitter.emit_alert(alert)
     
     def get_capture_status(self):
         """Get current capture status"""
@@ -548,11 +951,69 @@ class NetworkCapture:
             'capture_mode': self.capture_mode,
             'interface': self.interface,
             'privacy_mode': self.privacy_mode,
-            'total_packets': len(self.captured_packets),
-            'alert_threshold': self.alert_threshold
+            'anonymizer': self.anonymizer.get_stats() if self.privacy_mode else None,
+            'total_packets': self.event_buffer.total,
+            'alert_threshold': self.alert_threshold,
+            'flow_table': self.flow_table.get_stats(),
+            'traffic_window': self.traffic_window.get_stats(),
+            'inference': self.get_inference_status(),
+            'pcap_report': self.pcap_report,
+            'parser': dict(self.parser_stats, enabled=self.fast_path),
+            'shards': self.sharded_capture.get_stats() if self.sharded_capture else None,
+            'event_buffer': self.event_buffer.get_stats(),
+            'log_ingestion': self.log_ingestor.get_stats() if self.log_ingestor else None,
+            'backpressure': self.get_backpressure_status(),
+            'heavy_hitters': self.heavy_hitters.get_stats(),
+            'fanout': self.fanout.get_stats(),
+            'simulation': self.traffic_generator.get_stats() if self.traffic_generator else None,
+            'recent_events': EventRingBuffer.to_dicts(self.event_buffer.last(20))
+        }
+    
+    def get_events(self, last=None, start=None, end=None, min_probability=None, host=None):
+        """Query the recent event buffer"""
+        if host is not None:
+            records = self.event_buffer.by_host(host, last)
+        elif min_probability is not None:
+            records = self.event_buffer.above_probability(min_probability, last)
+        elif start is not None or end is not None:
+            records = self.event_buffer.time_range(start, end)
+        else:
+            records = self.event_buffer.last(last or 100)
+        return EventRingBuffer.to_dicts(records)
+    
+    def get_inference_status(self):
+        """Get micro-batching statistics for the scoring stage"""
+        stats = dict(self.batch_scorer.get_stats(), model_type=self.model_type,
+                     model_timings_ms=self.model_timings)
+        ml_models, _ = self._model_snapshot()
+        if self.model_type == 'cascade' and hasattr(ml_models, 'get_cascade_stats'):
+            stats['cascade'] = ml_models.get_cascade_stats()
+        return stats
+    
+    def get_heavy_hitters(self, k=10):
+        """Heaviest sources, destinations and destination ports in the current window"""
+        return {
+            dimension: {metric: self.heavy_hitters.top(dimension, metric, k)
+                        for metric in ('packets', 'bytes')}
+            for dimension in ('src', 'dst', 'dst_port')
+        }
+    
+    def get_backpressure_status(self):
+        """Get depth, lag and drop counters for each bounded pipeline stage"""
+        scoring = self.batch_scorer.queue.get_stats()
+        stages = {'packets': self.packet_queue.get_stats(), 'scoring': scoring}
+        return {
+            'stages': stages,
+            'total_dropped': sum(stage['dropped'] for stage in stages.values()),
+            'total_shed_to_rules': scoring['shed'],
+            'overloaded': any(stage['depth'] >= stage['queue_size'] for stage in stages.values())
         }
     
-    def set_log_file(self, file_path):
-        """Set log file path for log-based capture"""
+    def set_log_file(self, file_path, log_format=None, follow=None):
+        """Set log file path (and optionally format / follow mode) for log-based capture"""
         self.log_file_path = file_path
+        if log_format is not None:
+            self.log_format = log_format
+        if follow is not None:
+            self.log_follow = bool(follow)
         return {"message": f"Log file set to {file_path}"}
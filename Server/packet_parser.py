@@ -0,0 +1,275 @@
+"""
+Fast-path packet header parser.
+
+Decodes Ethernet/IPv4/IPv6/TCP/UDP/ICMP headers straight from the captured
+bytes with ``struct.unpack_from`` over a memoryview, producing the same
+``packet_info`` fields as ``NetworkCapture._extract_packet_info`` without a
+full scapy dissection. Frames it cannot decode return None so the caller can
+fall back to scapy.
+
+Run as a script to compare both parsers on a capture:
+
+    python packet_parser.py capture.pcap [max_packets]
+"""
+
+import socket
+import struct
+import sys
+import time
+
+# libpcap link types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# IPv6 extension headers we can skip over to reach the transport header
+IPV6_EXT_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT = 44
+
+_unpack_ethertype = struct.Struct('!H').unpack_from
+_unpack_ipv4 = struct.Struct('!BBHHHBBH4s4s').unpack_from
+_unpack_ipv6 = struct.Struct('!IHBB16s16s').unpack_from
+_unpack_ports = struct.Struct('!HH').unpack_from
+_unpack_tcp = struct.Struct('!HHIIBBH').unpack_from
+_unpack_icmp = struct.Struct('!BB').unpack_from
+_unpack_null = struct.Struct('=I').unpack_from
+
+_inet_ntoa = socket.inet_ntoa
+
+
+def _inet6_ntoa(packed):
+    return socket.inet_ntop(socket.AF_INET6, packed)
+
+
+def _network_offset(view, linktype):
+    """Return (ethertype, offset of the network header) for a link type"""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(view) < 14:
+            return None, 0
+        ethertype = _unpack_ethertype(view, 12)[0]
+        offset = 14
+        while ethertype in ETHERTYPE_VLAN:
+            if len(view) < offset + 4:
+                return None, 0
+            ethertype = _unpack_ethertype(view, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+
+    if linktype in (LINKTYPE_RAW, LINKTYPE_RAW_ALT, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not len(view):
+            return None, 0
+        version = view[0] >> 4
+        return (ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6 if version == 6 else None), 0
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(view) < 16:
+            return None, 0
+        return _unpack_ethertype(view, 14)[0], 16
+
+    if linktype == LINKTYPE_NULL:
+        if len(view) < 4:
+            return None, 0
+        family = _unpack_null(view, 0)[0]
+        if family == socket.AF_INET:
+            return ETHERTYPE_IPV4, 4
+        if family in (10, 24, 28, 30):  # AF_INET6 on Linux/BSDs/macOS
+            return ETHERTYPE_IPV6, 4
+        return None, 0
+
+    return None, 0
+
+
+def parse_frame(data, linktype=LINKTYPE_ETHERNET, timestamp=None):
+    """Decode a captured frame into a packet_info dict, or None if unsupported"""
+    view = memoryview(data)
+    size = len(view)
+    ethertype, offset = _network_offset(view, linktype)
+
+    if ethertype == ETHERTYPE_IPV4:
+        if size < offset + 20:
+            return None
+        (ver_ihl, _, total_len, _, frag, ttl, proto, _,
+         src, dst) = _unpack_ipv4(view, offset)
+        if ver_ihl >> 4 != 4:
+            return None
+        info = {
+            'src_ip': _inet_ntoa(src),
+            'dst_ip': _inet_ntoa(dst),
+            'protocol': proto,
+            'ip_version': 4,
+            'ttl': ttl,
+            'ip_len': total_len
+        }
+        transport_offset = offset + (ver_ihl & 0x0F) * 4
+        # Only the first fragment carries the transport header
+        if frag & 0x1FFF:
+            proto = None
+
+    elif ethertype == ETHERTYPE_IPV6:
+        if size < offset + 40:
+            return None
+        (vtc, payload_len, next_header, hop_limit,
+         src, dst) = _unpack_ipv6(view, offset)
+        if vtc >> 28 != 6:
+            return None
+        transport_offset = offset + 40
+        proto = next_header
+        while proto in IPV6_EXT_HEADERS or proto == IPV6_FRAGMENT:
+            if size < transport_offset + 8:
+                return None
+            if proto == IPV6_FRAGMENT:
+                frag_offset = _unpack_ethertype(view, transport_offset + 2)[0] >> 3
+                proto = view[transport_offset]
+                transport_offset += 8
+                if frag_offset:
+                    proto = None
+                    break
+            else:
+                proto, ext_len = view[transport_offset], view[transport_offset + 1]
+                transport_offset += (ext_len + 1) * 8
+        info = {
+            'src_ip': _inet6_ntoa(src),
+            'dst_ip': _inet6_ntoa(dst),
+            'protocol': next_header,
+            'ip_version': 6,
+            'ttl': hop_limit,
+            'ip_len': payload_len + 40
+        }
+
+    else:
+        return None
+
+    if proto == 6:
+        if size < transport_offset + 16:
+            return None
+        sport, dport, seq, ack, _, flags, window = _unpack_tcp(view, transport_offset)
+        info['transport_protocol'] = 'TCP'
+        info['src_port'] = sport
+        info['dst_port'] = dport
+        info['tcp_flags'] = flags
+        info['tcp_seq'] = seq
+        info['tcp_ack'] = ack
+        info['tcp_window'] = window
+    elif proto == 17:
+        if size < transport_offset + 4:
+            return None
+        sport, dport = _unpack_ports(view, transport_offset)
+        info['transport_protocol'] = 'UDP'
+        info['src_port'] = sport
+        info['dst_port'] = dport
+    elif proto in (1, 58):
+        if size < transport_offset + 2:
+            return None
+        icmp_type, icmp_code = _unpack_icmp(view, transport_offset)
+        info['transport_protocol'] = 'ICMP'
+        info['icmp_type'] = icmp_type
+        info['icmp_code'] = icmp_code
+
+    info['packet_size'] = size
+    info['timestamp'] = timestamp if timestamp is not None else time.time()
+    return info
+
+
+def pcap_record_time(metadata, reader):
+    """Timestamp of a RawPcapReader/RawPcapNgReader record"""
+    if hasattr(metadata, 'tshigh'):
+        return ((metadata.tshigh << 32) | metadata.tslow) / float(metadata.tsresol)
+    divisor = 1e9 if getattr(reader, 'nano', False) else 1e6
+    return metadata.sec + metadata.usec / divisor
+
+
+def pcap_record_linktype(metadata, reader):
+    """Link type of a RawPcapReader/RawPcapNgReader record"""
+    linktype = getattr(metadata, 'linktype', None)
+    if linktype is None:
+        linktype = getattr(reader, 'linktype', LINKTYPE_ETHERNET)
+    return linktype
+
+
+def benchmark(pcap_file, max_packets=None):
+    """Compare the fast-path parser with full scapy dissection on one capture"""
+    from scapy.all import RawPcapReader, IP, TCP, UDP, ICMP, conf
+
+    def scapy_extract(packet):
+        info = {}
+        if IP in packet:
+            info['src_ip'] = packet[IP].src
+            info['dst_ip'] = packet[IP].dst
+            info['protocol'] = packet[IP].proto
+            info['ip_version'] = packet[IP].version
+            info['ttl'] = packet[IP].ttl
+            info['ip_len'] = packet[IP].len
+        if TCP in packet:
+            info['transport_protocol'] = 'TCP'
+            info['src_port'] = packet[TCP].sport
+            info['dst_port'] = packet[TCP].dport
+            info['tcp_flags'] = int(packet[TCP].flags)
+        elif UDP in packet:
+            info['transport_protocol'] = 'UDP'
+            info['src_port'] = packet[UDP].sport
+            info['dst_port'] = packet[UDP].dport
+        elif ICMP in packet:
+            info['transport_protocol'] = 'ICMP'
+        info['packet_size'] = len(packet)
+        return info
+
+    # Load the records once so both parsers are timed on the same bytes
+    records = []
+    with RawPcapReader(pcap_file) as reader:
+        for data, metadata in reader:
+            records.append((data, pcap_record_linktype(metadata, reader),
+                            pcap_record_time(metadata, reader)))
+            if max_packets and len(records) >= max_packets:
+                break
+
+    if not records:
+        return {'packets': 0}
+
+    started = time.perf_counter()
+    fast = [parse_frame(data, linktype, ts) for data, linktype, ts in records]
+    fast_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    slow = []
+    for data, linktype, _ in records:
+        layer = conf.l2types.get(linktype, conf.raw_layer)
+        slow.append(scapy_extract(layer(data)))
+    scapy_elapsed = time.perf_counter() - started
+
+    compared_fields = ('src_ip', 'dst_ip', 'protocol', 'transport_protocol',
+                       'src_port', 'dst_port', 'tcp_flags', 'packet_size')
+    mismatches = 0
+    for a, b in zip(fast, slow):
+        if a is None or 'src_ip' not in b:
+            continue
+        if any(a.get(f) != b.get(f) for f in compared_fields):
+            mismatches += 1
+
+    n = len(records)
+    return {
+        'packets': n,
+        'fast_path_decoded': sum(1 for info in fast if info is not None),
+        'fast_path_seconds': fast_elapsed,
+        'scapy_seconds': scapy_elapsed,
+        'fast_path_packets_per_second': n / fast_elapsed if fast_elapsed else 0.0,
+        'scapy_packets_per_second': n / scapy_elapsed if scapy_elapsed else 0.0,
+        'speedup': scapy_elapsed / fast_elapsed if fast_elapsed else 0.0,
+        'mismatches': mismatches
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python packet_parser.py capture.pcap [max_packets]")
+        sys.exit(1)
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for key, value in benchmark(sys.argv[1], limit).items():
+        print(f"{key}: {value}")
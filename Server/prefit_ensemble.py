@@ -0,0 +1,78 @@
+import itertools
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import log_loss
+
+
+class PrefitVotingClassifier:
+    """Soft-voting ensemble over estimators that are already fitted.
+
+    Unlike ``VotingClassifier`` nothing is refitted: probabilities of the
+    given models are averaged (weighted by ``weights``), which gives the same
+    predictions as a soft ``VotingClassifier`` over the same models at no
+    training cost. ``tune_weights`` picks weights on a validation split.
+    """
+
+    def __init__(self, estimators, weights=None):
+        self.estimators = list(estimators)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.classes_ = np.asarray(self.estimators[0][1].classes_)
+        for name, estimator in self.estimators[1:]:
+            if not np.array_equal(np.asarray(estimator.classes_), self.classes_):
+                raise ValueError(f"{name} was fitted on different classes")
+
+    @property
+    def named_estimators(self):
+        return dict(self.estimators)
+
+    def combine(self, probas):
+        """Ensemble probabilities from the base models' probabilities (same order as estimators)"""
+        return np.average(np.asarray(probas), axis=0, weights=self.weights)
+
+    def _base_probas(self, X):
+        return [estimator.predict_proba(X) for _, estimator in self.estimators]
+
+    def predict_proba(self, X):
+        return self.combine(self._base_probas(X))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def tune_weights(self, X_val, y_val, grid=(0, 1, 2, 3)):
+        """Choose the weights (from ``grid`` per model) with the lowest validation log loss.
+
+        Each base model is run once on the validation split; candidate weight
+        vectors are then scored on the cached probabilities.
+        """
+        probas = np.asarray(self._base_probas(X_val))
+        best_loss, best_weights = None, None
+        for weights in itertools.product(grid, repeat=len(self.estimators)):
+            if not any(weights):
+                continue
+            combined = np.average(probas, axis=0, weights=weights)
+            loss = log_loss(y_val, combined, labels=self.classes_)
+            if best_loss is None or loss < best_loss - 1e-12:
+                best_loss, best_weights = loss, weights
+        self.weights = np.asarray(best_weights, dtype=float)
+        self.validation_log_loss = float(best_loss)
+        return self
+
+
+class PrefitStackingClassifier(PrefitVotingClassifier):
+    """Stacking over already-fitted estimators: a logistic regression on their probabilities.
+
+    Only the meta-learner is trained, on a validation split the base models
+    did not see.
+    """
+
+    def __init__(self, estimators, final_estimator=None):
+        super().__init__(estimators)
+        self.final_estimator = final_estimator or LogisticRegression(max_iter=1000)
+
+    def fit(self, X_val, y_val):
+        self.final_estimator.fit(np.hstack(self._base_probas(X_val)), y_val)
+        return self
+
+    def combine(self, probas):
+        return self.final_estimator.predict_proba(np.hstack(probas))
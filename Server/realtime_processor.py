@@ -7,16 +7,24 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
+import math
+import os
+from emitter import EventEmitter
+
+# Label values counted as benign when replaying a labelled dataset
+BENIGN_LABELS = {'benign', 'normal', 'normal.', '0', '0.0', 'false'}
 
 class RealTimeProcessor:
-    def __init__(self, ml_models, preprocessor, socketio):
+    def __init__(self, ml_models, preprocessor, socketio, emitter=None, model_manager=None):
         self.ml_models = ml_models
         self.preprocessor = preprocessor
+        self.model_manager = model_manager  # If set, its active version replaces ml_models/preprocessor
         self.socketio = socketio
+        self.emitter = emitter or EventEmitter(socketio)
         self.is_streaming = False
         self.stream_thread = None
         self.alert_threshold = 0.7
-        self.alert_history = []
+        self.replay_stats = None
         
     def start_streaming(self, stream_config):
         """Start real-time network data streaming"""
@@ -45,6 +53,10 @@ class RealTimeProcessor:
     
     def _stream_data(self):
         """Generate and stream simulated network data"""
+        if self.stream_config.get('mode') == 'replay':
+            self._replay_dataset()
+            return
+        
         packet_count = 0
         while self.is_streaming:
             try:
@@ -58,9 +70,11 @@ class RealTimeProcessor:
                 # Create result with simulated predictions if models aren't trained
                 try:
                     # Try to process through ML models
-                    processed_data = self.preprocessor.transform_data(pd.DataFrame([network_data]))
-                    prediction = self.ml_models.predict(processed_data, 'ensemble')[0]
-                    probability = self.ml_models.predict_proba(processed_data, 'ensemble')[0][1]
+                    ml_models, preprocessor = self._model_snapshot()
+                    processed_data = preprocessor.transform_data(pd.DataFrame([network_data]))
+                    scored = ml_models.score(processed_data, self.stream_config.get('model_type', 'cascade'))
+                    prediction = scored['labels'][0]
+                    probability = scored['probabilities'][0][1]
                 except Exception as model_error:
                     print(f"Model prediction failed, using simulated data: {model_error}")
                     # Generate simulated predictions based on network data patterns
@@ -76,9 +90,8 @@ class RealTimeProcessor:
                     'threat_level': 'HIGH' if probability > 0.7 else 'MEDIUM' if probability > 0.3 else 'LOW'
                 }
                 
-                print(f"Emitting result: {result}")
-                # Emit to all connected clients
-                self.socketio.emit('network_data', result)
+                # Coalesced into the next frame sent to subscribed clients
+                self.emitter.publish(result)
                 
                 # Check for alerts
                 if probability >= self.alert_threshold:
@@ -92,6 +105,240 @@ class RealTimeProcessor:
                 print(f"Streaming error: {e}")
                 time.sleep(1)
     
+    def _replay_dataset(self):
+        """Stream a labelled CSV/Parquet dataset through the pipeline, scoring it against its labels"""
+        config = self.stream_config
+        path = config['path']
+        speed = config.get('speed', 1)
+        speed = 0.0 if speed in (None, 'max') else float(speed)  # 0 / 'max' replays as fast as possible
+        chunk_size = int(config.get('chunk_size', 10000))
+        batch_size = int(config.get('batch_size', 256))
+        # Rows per second at 1x when the dataset has no timestamps
+        base_rate = float(config.get('rate') or 1.0 / max(config.get('interval', 1), 1e-6))
+        
+        stats = {
+            'file': os.path.basename(path),
+            'speed': speed,
+            'rows': 0,
+            'chunks': 0,
+            'label_column': None,
+            'timestamp_column': None,
+            'true_positives': 0,
+            'false_positives': 0,
+            'true_negatives': 0,
+            'false_negatives': 0,
+            'simulated_rows': 0,  # Rows the models couldn't score, left out of the metrics
+            'scoring_error': None,
+            'started_at': time.time(),
+            'finished_at': None,
+            'completed': False
+        }
+        self.replay_stats = stats
+        
+        wall_start = time.time()
+        data_start = None
+        row_offset = 0
+        last_metrics = 0.0
+        
+        try:
+            for chunk in self._iter_dataset_chunks(path, chunk_size):
+                if not self.is_streaming:
+                    break
+                
+                label_column = self._find_column(chunk.columns, config.get('label_column'),
+                                                 ['label', 'class', 'attack_type', 'attack', 'target', 'category'])
+                timestamp_column = self._find_column(chunk.columns, config.get('timestamp_column'),
+                                                     ['timestamp', 'ts', 'stime', 'time'])
+                stats['label_column'] = label_column
+                stats['timestamp_column'] = timestamp_column
+                
+                # Due time of each row, in seconds of dataset time since the start
+                timestamps = self._dataset_timestamps(chunk[timestamp_column]) if timestamp_column else None
+                if timestamps is not None and np.isfinite(timestamps).any():
+                    if data_start is None:
+                        data_start = np.nanmin(timestamps)
+                    offsets = np.nan_to_num(timestamps - data_start, nan=0.0)
+                else:
+                    offsets = (row_offset + np.arange(len(chunk))) / base_rate
+                row_offset += len(chunk)
+                
+                labels = chunk[label_column] if label_column else None
+                features = chunk.drop(columns=[c for c in (label_column, timestamp_column) if c])
+                
+                for start in range(0, len(chunk), batch_size):
+                    if not self.is_streaming:
+                        break
+                    end = min(start + batch_size, len(chunk))
+                    if speed > 0:
+                        self._wait_until(wall_start + offsets[start] / speed)
+                    
+                    batch = features.iloc[start:end]
+                    predictions, probabilities, error = self._score_rows(batch)
+                    actual = self._binary_labels(labels.iloc[start:end]) if labels is not None else None
+                    if error is not None:
+                        # Simulated output: shown, but never counted as model precision/recall
+                        if error != stats['scoring_error']:
+                            print(f"Replay scoring error, using simulated predictions: {error}")
+                        stats['scoring_error'] = error
+                        stats['simulated_rows'] += end - start
+                    elif actual is not None:
+                        self._update_replay_metrics(stats, actual, predictions)
+                    
+                    records = batch.to_dict('records')
+                    for i, record in enumerate(records):
+                        if speed > 0:
+                            self._wait_until(wall_start + offsets[start + i] / speed)
+                        # NaN / Infinity (common in CIC flow rates) aren't valid JSON for clients
+                        record = {k: None if isinstance(v, float) and not math.isfinite(v) else v
+                                  for k, v in record.items()}
+                        probability = float(probabilities[i])
+                        result = {
+                            'timestamp': datetime.now().isoformat(),
+                            'source': 'replay',
+                            'data': record,
+                            'prediction': int(predictions[i]),
+                            'probability': probability,
+                            'threat_level': 'HIGH' if probability > 0.7 else 'MEDIUM' if probability > 0.3 else 'LOW',
+                            'simulated': error is not None
+                        }
+                        if actual is not None:
+                            result['label'] = str(labels.iloc[start + i])
+                            result['actual'] = int(actual[i])
+                        
+                        self.emitter.publish(result)
+                        if probability >= self.alert_threshold:
+                            self._send_alert(result)
+                    
+                    stats['rows'] += end - start
+                    if time.time() - last_metrics >= 1.0:
+                        self.socketio.emit('replay_metrics', self.get_replay_metrics())
+                        last_metrics = time.time()
+                
+                stats['chunks'] += 1
+            
+            stats['completed'] = self.is_streaming
+            
+        except Exception as e:
+            print(f"Replay error: {e}")
+            stats['error'] = str(e)
+        finally:
+            stats['finished_at'] = time.time()
+            self.is_streaming = False
+            metrics = self.get_replay_metrics()
+            print(f"Replay finished: {metrics['rows']} rows at {metrics['rows_per_second']:.0f} rows/s, "
+                  f"precision {metrics['precision']:.3f}, recall {metrics['recall']:.3f}")
+            self.socketio.emit('replay_complete', metrics)
+    
+    def _iter_dataset_chunks(self, path, chunk_size):
+        """Yield DataFrames of at most ``chunk_size`` rows without loading the whole file"""
+        if path.lower().endswith(('.parquet', '.pq')):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise Exception("Parquet replay requires pyarrow (pip install pyarrow)")
+            parquet_file = pq.ParquetFile(path)
+            for record_batch in parquet_file.iter_batches(batch_size=chunk_size):
+                yield record_batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(path, chunksize=chunk_size, low_memory=False):
+                yield chunk
+    
+    def _find_column(self, columns, requested, candidates):
+        """Pick a column by explicit name or by common names (ignoring case and padding, e.g. ' Label')"""
+        if requested:
+            return requested if requested in columns else None
+        normalized = {str(c).strip().lower(): c for c in columns}
+        for name in candidates:
+            if name in normalized:
+                return normalized[name]
+        return None
+    
+    def _dataset_timestamps(self, column):
+        """Epoch seconds of a timestamp column (numeric epochs or date strings), NaN where unparseable"""
+        if pd.api.types.is_numeric_dtype(column):
+            values = column.astype(float).to_numpy()
+            # Millisecond epochs
+            return np.where(values > 1e11, values / 1000.0, values)
+        parsed = pd.to_datetime(column, errors='coerce')
+        seconds = (parsed - pd.Timestamp('1970-01-01')).dt.total_seconds()
+        return seconds.to_numpy(dtype=float)
+    
+    def _binary_labels(self, labels):
+        """1 for attack rows, 0 for benign ones"""
+        if pd.api.types.is_numeric_dtype(labels):
+            return (labels.fillna(0).to_numpy() != 0).astype(int)
+        normalized = labels.astype(str).str.strip().str.lower()
+        return (~normalized.isin(BENIGN_LABELS)).to_numpy().astype(int)
+    
+    def _model_snapshot(self):
+        """(ml_models, preprocessor) to score one batch with; a model swap never splits a batch"""
+        if self.model_manager is not None:
+            return self.model_manager.snapshot()
+        return self.ml_models, self.preprocessor
+    
+    def _score_rows(self, rows):
+        """Score a batch of dataset rows with one model call; returns (predictions, probabilities, error).
+
+        Predictions are 1 for attack and 0 for benign, whichever index the
+        benign class has; the probability is 1 - P(benign classes). When the
+        models can't score the batch it gets the simulated rules' output and
+        the error, so the caller can keep it out of the replay metrics.
+        """
+        try:
+            ml_models, preprocessor = self._model_snapshot()
+            feature_columns = preprocessor.get_feature_names()
+            if feature_columns:
+                rows = rows.reindex(columns=feature_columns)
+            processed_data = preprocessor.transform_data(rows)
+            proba = np.asarray(ml_models.score(processed_data, self.stream_config.get('model_type', 'cascade'))['probabilities'])
+            classes = preprocessor.get_target_classes()
+            if classes is None:
+                classes = list(range(proba.shape[1]))
+            attack = self._binary_labels(pd.Series(classes)).astype(bool)
+            return attack[np.argmax(proba, axis=1)].astype(int), 1.0 - proba[:, ~attack].sum(axis=1), None
+        except Exception as e:
+            # Models not trained (or not trained on this dataset's columns)
+            records = rows.to_dict('records')
+            return ([self._simulate_prediction(r) for r in records],
+                    [self._simulate_probability(r) for r in records], str(e))
+    
+    def _wait_until(self, due):
+        delay = due - time.time()
+        if delay > 0.001:
+            time.sleep(min(delay, 1.0))
+            # Stay responsive to stop_streaming during long gaps
+            while self.is_streaming and due - time.time() > 0.001:
+                time.sleep(min(due - time.time(), 1.0))
+    
+    def _update_replay_metrics(self, stats, actual, predictions):
+        predicted = np.asarray(predictions, dtype=int) != 0
+        actual = np.asarray(actual) != 0
+        stats['true_positives'] += int(np.sum(predicted & actual))
+        stats['false_positives'] += int(np.sum(predicted & ~actual))
+        stats['true_negatives'] += int(np.sum(~predicted & ~actual))
+        stats['false_negatives'] += int(np.sum(~predicted & actual))
+    
+    def get_replay_metrics(self):
+        """Live throughput and detection quality of the current (or last) dataset replay"""
+        if self.replay_stats is None:
+            return None
+        stats = dict(self.replay_stats)
+        tp, fp = stats['true_positives'], stats['false_positives']
+        tn, fn = stats['true_negatives'], stats['false_negatives']
+        elapsed = (stats['finished_at'] or time.time()) - stats['started_at']
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        labelled = tp + fp + tn + fn
+        stats.update({
+            'elapsed_seconds': elapsed,
+            'rows_per_second': stats['rows'] / elapsed if elapsed > 0 else 0.0,
+            'precision': precision,
+            'recall': recall,
+            'f1_score': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            'accuracy': (tp + tn) / labelled if labelled else 0.0
+        })
+        return stats
+    
     def _generate_network_packet(self):
         """Generate realistic network packet data"""
         protocols = ['TCP', 'UDP', 'ICMP']
@@ -174,9 +421,8 @@ class RealTimeProcessor:
             }
     
     def _send_alert(self, result):
-        """Send alert for high-threat detection"""
+        """Send alert for high-threat detection; the alert store gives it its id"""
         alert = {
-            'id': len(self.alert_history) + 1,
             'timestamp': result['timestamp'],
             'threat_level': result['threat_level'],
             'probability': result['probability'],
@@ -184,18 +430,8 @@ class RealTimeProcessor:
             'message': f"High threat detected! Probability: {result['probability']:.2%}"
         }
         
-        self.alert_history.append(alert)
-        
         # Emit alert to all clients
-        self.socketio.emit('security_alert', alert)
-        
-        # Keep only last 100 alerts
-        if len(self.alert_history) > 100:
-            self.alert_history = self.alert_history[-100:]
-    
-    def get_alert_history(self):
-        """Get recent alert history"""
-        return self.alert_history[-50:]  # Return last 50 alerts
+        self.emitter.emit_alert(alert)
     
     def set_alert_threshold(self, threshold):
         """Set alert threshold (0.0 - 1.0)"""
@@ -206,13 +442,14 @@ class RealTimeProcessor:
             return {"error": "Threshold must be between 0 and 1"}
     
     def get_streaming_status(self):
-        """Get current streaming status"""
+        """Get current streaming status; alert counts come from the alert store"""
+        alert_store = self.emitter.alert_store
         return {
             'is_streaming': self.is_streaming,
             'alert_threshold': self.alert_threshold,
-            'total_alerts': len(self.alert_history),
-            'recent_alerts': len([a for a in self.alert_history 
-                                 if (datetime.now() - datetime.fromisoformat(a['timestamp'])).seconds < 3600])
+            'total_alerts': alert_store.count() if alert_store else 0,
+            'replay': self.get_replay_metrics(),
+            'recent_alerts': alert_store.count(time.time() - 3600) if alert_store else 0
         }
     
     def _simulate_prediction(self, network_data):
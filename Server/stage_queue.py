@@ -0,0 +1,225 @@
+import threading
+import time
+import zlib
+from collections import deque
+
+OVERLOAD_POLICIES = ('block', 'drop_oldest', 'drop_newest', 'flow_sampled', 'cheap_rules')
+
+
+class Empty(Exception):
+    """Raised by ``get`` when no item arrived before the timeout"""
+
+
+class StageQueue:
+    """Bounded queue between two pipeline stages with an explicit overload policy.
+
+    When the queue is full (or, for ``flow_sampled``, filling up) ``put``
+    applies the policy instead of silently stalling the producer:
+
+    - ``block``: wait for room (offline sources that must not lose data)
+    - ``drop_oldest``: evict the oldest queued item to make room
+    - ``drop_newest``: reject the incoming item
+    - ``flow_sampled``: above ``sample_watermark`` admit only a shrinking,
+      hash-selected subset of flow keys, so admitted flows stay complete
+    - ``cheap_rules``: hand the rejected item to ``on_shed`` (e.g. a
+      rule-only scorer) so it is still looked at, just more cheaply
+
+    Items are stored with their enqueue time so consumers can measure lag.
+    """
+
+    def __init__(self, name, maxsize=10000, policy='drop_newest', on_shed=None,
+                 sample_watermark=0.5):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.on_shed = on_shed
+        self.sample_watermark = min(max(float(sample_watermark), 0.0), 1.0)
+        self.items = deque()
+        self.unfinished = 0
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.not_full = threading.Condition(self.mutex)
+        self.all_done = threading.Condition(self.mutex)
+        self.stats = {
+            'enqueued': 0,
+            'dequeued': 0,
+            'dropped_oldest': 0,
+            'dropped_newest': 0,
+            'sampled_out': 0,
+            'shed': 0,
+            'blocked': 0,
+            'max_depth': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0
+        }
+
+    def __len__(self):
+        return len(self.items)
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+    def _admit_sampled(self, key):
+        """flow_sampled: admit a key-consistent fraction that shrinks as the queue fills"""
+        start = self.maxsize * self.sample_watermark
+        depth = len(self.items)
+        admit = max(0.0, (self.maxsize - depth) / max(self.maxsize - start, 1.0))
+        bucket = zlib.crc32(repr(key).encode()) & 0xFFFF
+        return bucket < admit * 0x10000
+
+    def _offer(self, item, key, block):
+        """Apply the policy to one item with the lock held; returns True if queued, None if shed"""
+        if block or self.policy == 'block':
+            if len(self.items) >= self.maxsize:
+                self.stats['blocked'] += 1
+            while len(self.items) >= self.maxsize:
+                self.not_full.wait()
+        elif self.policy == 'flow_sampled' and len(self.items) >= self.maxsize * self.sample_watermark:
+            if not self._admit_sampled(key(item) if callable(key) else key):
+                self.stats['sampled_out'] += 1
+                return False
+        elif len(self.items) >= self.maxsize:
+            if self.policy == 'drop_oldest':
+                self.items.popleft()
+                self.unfinished -= 1
+                self.stats['dropped_oldest'] += 1
+            elif self.policy == 'cheap_rules':
+                self.stats['shed'] += 1
+                return None
+            else:
+                self.stats['dropped_newest'] += 1
+                return False
+
+        self.items.append((time.time(), item))
+        self.unfinished += 1
+        self.stats['enqueued'] += 1
+        if len(self.items) > self.stats['max_depth']:
+            self.stats['max_depth'] = len(self.items)
+        return True
+
+    def _shed(self, items):
+        # Outside the lock: the fallback may be slow-ish and must not stall consumers
+        if self.on_shed is None:
+            return
+        for item in items:
+            try:
+                self.on_shed(item)
+            except Exception as e:
+                print(f"{self.name} shed handling error: {e}")
+
+    def put(self, item, key=None, block=False):
+        """Queue an item; returns False if the overload policy rejected it.
+
+        ``block=True`` waits for room whatever the policy. ``key`` identifies
+        the item's flow for ``flow_sampled``; it may be a function of the item,
+        which is then only called while the queue is above the watermark.
+        """
+        with self.mutex:
+            queued = self._offer(item, key, block)
+            if queued:
+                self.not_empty.notify()
+        if queued is None:
+            self._shed([item])
+        return bool(queued)
+
+    def put_many(self, items, key=None, block=False):
+        """Queue several items under one lock acquisition; returns how many were queued"""
+        accepted = 0
+        shed = []
+        with self.mutex:
+            for item in items:
+                if len(self.items) >= self.maxsize:
+                    # May wait for room below: let consumers in first
+                    self.not_empty.notify_all()
+                queued = self._offer(item, key, block)
+                if queued:
+                    accepted += 1
+                elif queued is None:
+                    shed.append(item)
+            if accepted:
+                self.not_empty.notify_all()
+        self._shed(shed)
+        return accepted
+
+    def get(self, timeout=None):
+        """Return (enqueued_at, item); raises Empty after ``timeout`` seconds"""
+        with self.mutex:
+            if timeout is not None and timeout <= 0:
+                if not self.items:
+                    raise Empty()
+            else:
+                deadline = None if timeout is None else time.time() + timeout
+                while not self.items:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty()
+                    self.not_empty.wait(remaining)
+
+            enqueued_at, item = self.items.popleft()
+            wait = time.time() - enqueued_at
+            self.stats['dequeued'] += 1
+            self.stats['total_wait'] += wait
+            self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+            self.not_full.notify()
+            return enqueued_at, item
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def get_many(self, max_items, timeout=None):
+        """Wait for at least one item, then return up to ``max_items`` (enqueued_at, item) pairs"""
+        first = self.get(timeout)
+        entries = [first]
+        with self.mutex:
+            now = time.time()
+            while self.items and len(entries) < max_items:
+                entry = self.items.popleft()
+                wait = now - entry[0]
+                self.stats['total_wait'] += wait
+                if wait > self.stats['max_wait']:
+                    self.stats['max_wait'] = wait
+                entries.append(entry)
+            self.stats['dequeued'] += len(entries) - 1
+            self.not_full.notify_all()
+        return entries
+
+    def task_done(self, count=1):
+        """Mark dequeued items as fully processed"""
+        with self.mutex:
+            self.unfinished = max(0, self.unfinished - count)
+            if self.unfinished == 0:
+                self.all_done.notify_all()
+
+    def join(self):
+        """Block until every queued item has been processed"""
+        with self.mutex:
+            while self.unfinished:
+                self.all_done.wait()
+
+    def lag(self):
+        """Seconds the oldest queued item has been waiting"""
+        with self.mutex:
+            return time.time() - self.items[0][0] if self.items else 0.0
+
+    def get_stats(self):
+        """Get depth, drop counters and lag for this stage"""
+        stats = dict(self.stats)
+        dequeued = stats.pop('dequeued')
+        total_wait = stats.pop('total_wait')
+        stats['dropped'] = stats['dropped_oldest'] + stats['dropped_newest'] + stats['sampled_out']
+        stats.update({
+            'name': self.name,
+            'policy': self.policy,
+            'queue_size': self.maxsize,
+            'depth': len(self.items),
+            'dequeued': dequeued,
+            'lag_ms': self.lag() * 1000.0,
+            'avg_wait_ms': total_wait / dequeued * 1000.0 if dequeued else 0.0,
+            'max_wait_ms': stats.pop('max_wait') * 1000.0
+        })
+        return stats
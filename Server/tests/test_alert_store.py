@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from alert_store import AlertStore
+from database import Database
+
+
+def _alert(level='HIGH', src='192.168.0.1'):
+    return {'type': 'model', 'threat_level': level, 'probability': 0.9,
+            'data': {'src_ip': src, 'dst_ip': '10.0.0.1', 'dst_port': 80}, 'message': 'test'}
+
+
+def test_ids_continue_across_restarts(tmp_path):
+    db = Database(str(tmp_path / 'alerts.db'))
+    store = AlertStore(db)
+    assert [store.record(_alert())['id'] for _ in range(3)] == [1, 2, 3]
+    store.flush()
+    assert AlertStore(db).record(_alert())['id'] == 4
+
+
+def test_count_includes_unwritten_alerts(tmp_path):
+    db = Database(str(tmp_path / 'alerts.db'))
+    store = AlertStore(db, flush_interval=60)
+    for _ in range(5):
+        store.record(_alert())
+    assert store.count() == 5
+    store.flush()
+    assert store.count() == 5
+    assert store.count(time.time() - 3600) == 5
+    assert store.count(time.time() + 1) == 0
+
+
+def test_query_by_host(tmp_path):
+    store = AlertStore(Database(str(tmp_path / 'alerts.db')))
+    store.record(_alert(src='192.168.0.1'))
+    store.record(_alert(src='192.168.0.2'))
+    store.flush()
+    alerts, cursor = store.query(host='192.168.0.2')
+    assert [a['data']['src_ip'] for a in alerts] == ['192.168.0.2']
+    assert cursor is None
+
+
+def test_streaming_status_counts_stored_alerts(tmp_path):
+    realtime_processor = pytest.importorskip('realtime_processor')
+    from emitter import EventEmitter
+
+    class _SocketIO:
+        def emit(self, *args, **kwargs):
+            pass
+
+    store = AlertStore(Database(str(tmp_path / 'alerts.db')))
+    processor = realtime_processor.RealTimeProcessor(
+        None, None, _SocketIO(), EventEmitter(_SocketIO(), alert_store=store))
+    for i in range(150):
+        # Distinct sources, so the aggregator sends each one instead of rolling them up
+        processor._send_alert({'timestamp': '2026-01-01T00:00:00', 'threat_level': 'HIGH',
+                               'probability': 0.9, 'data': {'src_ip': f'192.168.{i // 250}.{i % 250}'}})
+    status = processor.get_streaming_status()
+    assert status['total_alerts'] == status['recent_alerts']
+    assert status['total_alerts'] > 100
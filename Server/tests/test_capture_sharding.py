@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from capture_sharding import ShardedCapture, shard_for
+
+
+def _tcp(src, sport, dst, dport, flags, timestamp):
+    return {'src_ip': src, 'src_port': sport, 'dst_ip': dst, 'dst_port': dport,
+            'transport_protocol': 'TCP', 'tcp_flags': flags, 'timestamp': timestamp}
+
+
+def test_both_directions_of_a_flow_share_a_shard():
+    request = _tcp('192.168.0.5', 51000, '10.0.0.1', 443, 0x02, 0.0)
+    reply = _tcp('10.0.0.1', 443, '192.168.0.5', 51000, 0x12, 0.0)
+    echo = {'src_ip': '192.168.0.5', 'dst_ip': '10.0.0.1', 'transport_protocol': 'ICMP', 'icmp_type': 8}
+    echo_reply = dict(echo, src_ip='10.0.0.1', dst_ip='192.168.0.5', icmp_type=0)
+    for shards in (2, 3, 8):
+        assert shard_for(request, shards) == shard_for(reply, shards)
+        assert shard_for(echo, shards) == shard_for(echo_reply, shards)
+
+
+def test_a_sources_connections_share_a_shard():
+    shards = {shard_for(_tcp('172.16.0.9', 40000 + port, f'10.0.{port % 7}.1', port, 0x02, 0.0), 4)
+              for port in range(1, 1000)}
+    assert len(shards) == 1
+
+
+def _replay(pcap_file, config, num_shards=2):
+    results, alerts = [], []
+    sharded = ShardedCapture(
+        dict({'mode': 'pcap', 'pcap_files': [pcap_file], 'privacy_mode': False,
+              'filters': {'protocols': ['TCP', 'UDP', 'ICMP']}}, **config),
+        None, None, results.append, num_shards=num_shards, on_alert=alerts.append
+    )
+    sharded.start()
+    deadline = time.time() + 60
+    while not sharded.is_finished() and time.time() < deadline:
+        time.sleep(0.2)
+    sharded.stop()
+    return results, alerts, sharded
+
+
+def test_sharded_pcap_replay_counts_fanout_in_the_shards(tmp_path):
+    scapy = pytest.importorskip('scapy.all')
+    pytest.importorskip('network_capture')
+
+    packets = []
+    for i, port in enumerate(range(1, 301)):
+        probe = scapy.Ether() / scapy.IP(src='172.16.0.9', dst='10.0.0.1') / scapy.TCP(
+            sport=61000, dport=port, flags='S')
+        probe.time = 1000.0 + i * 0.001
+        packets.append(probe)
+    pcap_file = str(tmp_path / 'scan.pcap')
+    scapy.wrpcap(pcap_file, packets)
+
+    results, alerts, sharded = _replay(pcap_file, {})
+    assert sharded.is_finished()
+    assert len(results) == 300
+    # The scanner's probes are all counted by the one shard that owns it
+    counted = [stats['fanout']['counted'] for stats in sharded.shard_stats.values()]
+    assert sorted(counted) == [0, 300]
+    assert [a['data']['src_ip'] for a in alerts if a['type'] == 'port_scan'] == ['172.16.0.9']
+
+
+def test_sharded_source_keeps_the_full_rate_floor(tmp_path):
+    scapy = pytest.importorskip('scapy.all')
+    pytest.importorskip('network_capture')
+
+    packets = []
+
+    def add(src, sport, dst, dport, timestamp):
+        packet = scapy.Ether() / scapy.IP(src=src, dst=dst) / scapy.TCP(sport=sport, dport=dport, flags='A')
+        packet.time = timestamp
+        packets.append(packet)
+
+    # Light background, then a busy client just under the single-process floor
+    for i in range(200):
+        add(f'192.168.0.{i % 20 + 1}', 50000 + i % 20, '10.0.0.2', 443, 1000.0 + i * 0.02)
+    for i in range(3800):
+        add('172.16.0.9', 50000, '10.0.0.1', 80, 1004.0 + i / 700)
+        if i % 20 == 0:
+            add(f'192.168.0.{i // 20 % 20 + 1}', 50000, '10.0.0.2', 443, 1004.0 + i / 700)
+    pcap_file = str(tmp_path / 'busy.pcap')
+    scapy.wrpcap(pcap_file, packets)
+
+    # No adaptive headroom: only the floor stands between the client and an alert
+    _, alerts, sharded = _replay(pcap_file, {'heavy_hitters': {
+        'slots': 4, 'slot_seconds': 0.5, 'z': 0, 'margin': 1.0,
+        'packet_rate_floor': 1000, 'byte_rate_floor': 10 ** 9}})
+
+    assert sharded.is_finished()
+    assert sum(stats['heavy_hitters']['packets'] for stats in sharded.shard_stats.values()) == len(packets)
+    assert [a['message'] for a in alerts
+            if a['type'] == 'heavy_hitter' and a['data']['dimension'] == 'src'] == []
+    # The busy client's traffic all went to one shard
+    assert sharded.get_stats()['busiest_shard_share'] > 0.8
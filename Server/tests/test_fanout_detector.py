@@ -0,0 +1,27 @@
+from fanout_detector import FanoutDetector
+
+
+def _syn(src, dst, port, timestamp):
+    return {'src_ip': src, 'dst_ip': dst, 'src_port': 40000, 'dst_port': port,
+            'transport_protocol': 'TCP', 'tcp_flags': 0x02, 'timestamp': timestamp}
+
+
+def test_port_scan_alert():
+    alerts = []
+    detector = FanoutDetector(alerts.append, port_threshold=50)
+    detector.add_many([_syn('172.16.0.9', '10.0.0.1', port, 100.0) for port in range(1, 201)])
+    assert [(a['type'], a['data']['src_ip']) for a in alerts] == [('port_scan', '172.16.0.9')]
+    scores = detector.scores(['172.16.0.9', '192.168.0.1'])
+    assert scores['port_scan_score'].tolist() == [1.0, 0.0]
+
+
+def test_batch_with_more_sources_than_rows():
+    detector = FanoutDetector(max_sources=8)
+    packets = [_syn(f'192.168.0.{i % 20}', '10.0.0.1', 80 + i, 100.0) for i in range(200)]
+    detector.add_many(packets)
+    stats = detector.get_stats()
+    assert stats['counted'] == 200
+    assert stats['tracked_sources'] == 8
+    # The most recent sources own the rows and kept their counts
+    scores = detector.scores(['192.168.0.19'])
+    assert scores['src_distinct_dst_ports'][0] > 0
@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+import pytest
+
+from heavy_hitters import HeavyHitterDetector, SlidingCountMinSketch
+from traffic_generator import TrafficGenerator
+
+
+def _packet(src, timestamp, size=100):
+    return {'src_ip': src, 'dst_ip': '10.0.0.1', 'transport_protocol': 'TCP',
+            'dst_port': 80, 'packet_size': size, 'timestamp': timestamp}
+
+
+def test_sketch_add_and_estimate():
+    sketch = SlidingCountMinSketch(width=64, depth=3, metrics=1)
+    hashes = np.array([hash(k) for k in ('a', 'b', 'a')], dtype=np.int64).view(np.uint64)
+    sketch.add(hashes, np.ones((1, 3), dtype=np.int64))
+    estimates = sketch.estimate(hashes[:2])
+    assert estimates[0, 0] >= 2
+    assert estimates[0, 1] >= 1
+
+
+def test_add_flushes_on_batch_size():
+    detector = HeavyHitterDetector(batch_size=8)
+    for i in range(20):
+        detector.add(_packet(f'192.168.0.{i % 3}', 1000.0 + i * 0.001))
+    assert detector.stats['batches'] == 2
+    assert detector.stats['packets'] == 16
+    detector.flush()
+    assert detector.stats['packets'] == 20
+
+
+def test_add_many_alerts_on_volumetric_source():
+    alerts = []
+    detector = HeavyHitterDetector(alerts.append, slots=2, slot_seconds=1.0, packet_rate_floor=50)
+    start = 1000.0
+    for step in range(40):
+        now = start + step * 0.25
+        packets = [_packet(f'192.168.0.{i}', now) for i in range(5)]
+        if step >= 20:
+            packets += [_packet('172.16.0.9', now) for _ in range(200)]
+        detector.add_many(packets)
+    assert any(a['data'].get('src_ip') == '172.16.0.9' for a in alerts)
+    assert detector.top('src')[0]['key'] == '172.16.0.9'
+
+
+def test_simulated_packets_reach_the_detector():
+    generator = TrafficGenerator(rate=2000, seed=1)
+    detector = HeavyHitterDetector()
+    start = time.time()
+    for step in range(20):
+        batch = generator.generate_packets(200, start + step * 0.1, start + (step + 1) * 0.1)
+        detector.add_many(TrafficGenerator.to_records(batch))
+    assert detector.stats['packets'] == 4000
+    assert detector.top('dst_port')
+
+
+def test_simulated_capture_produces_events():
+    network_capture = pytest.importorskip('network_capture')
+
+    class _SocketIO:
+        def emit(self, *args, **kwargs):
+            pass
+
+    capture = network_capture.NetworkCapture(_SocketIO(), None, None)
+    capture.start_capture({'mode': 'simulated', 'simulation': {'rate': 2000, 'seed': 1},
+                           'flow': {'idle_timeout': 0.5}})
+    try:
+        time.sleep(2.5)
+    finally:
+        capture.stop_capture()
+    assert capture.heavy_hitters.stats['packets'] > 0
+    assert capture.event_buffer.total > 0
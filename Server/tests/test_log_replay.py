@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+import pytest
+
+network_capture = pytest.importorskip('network_capture')
+
+
+class _SocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+class _Preprocessor:
+    def get_feature_names(self):
+        return []
+
+    def transform_data(self, df):
+        return df
+
+
+class _SlowModels:
+    """Stands in for MLModels; slow enough that a non-blocking submit would shed flows"""
+
+    models = {'stub': None}
+
+    def __init__(self):
+        self.rows = 0
+
+    def score(self, data, model_type):
+        time.sleep(0.005)
+        self.rows += len(data)
+        return {'probabilities': np.tile([0.9, 0.1], (len(data), 1)), 'timings_ms': {}}
+
+
+def test_one_shot_log_replay_scores_every_record(tmp_path):
+    records = 5000
+    log_file = tmp_path / 'packets.log'
+    # One packet per connection, so each record completes its own flow
+    log_file.write_text(''.join(f'192.168.{i // 250}.{i % 250 + 1} 10.0.0.1 TCP {20000 + i} 80 100\n'
+                                for i in range(records)))
+
+    models = _SlowModels()
+    capture = network_capture.NetworkCapture(_SocketIO(), models, _Preprocessor())
+    capture.log_checkpoint_file = str(tmp_path / 'checkpoints.json')
+    capture.set_log_file(str(log_file), log_format='simple', follow=False)
+    capture.start_capture({'mode': 'logs', 'privacy_mode': False, 'model_type': 'ensemble',
+                           'inference': {'queue_size': 64, 'batch_size': 32}})
+    capture.capture_thread.join(timeout=120)
+    capture.batch_scorer.wait_idle()
+    stats = capture.batch_scorer.get_stats()
+    capture.stop_capture()
+
+    assert models.rows == records
+    assert stats['shed'] == 0
+    assert stats['dropped'] == 0
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+ml_models = pytest.importorskip('ml_models')
+
+
+def _data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    return X, y
+
+
+def test_compile_models_skips_the_single_decision_tree():
+    X, y = _data()
+    models = ml_models.MLModels()
+    models.models = {
+        'random_forest': RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y),
+        'decision_tree': DecisionTreeClassifier(random_state=0).fit(X, y)
+    }
+    report = models.compile_models(X)
+
+    assert report['random_forest']['compiled']
+    assert 'decision_tree' not in report
+    assert set(models.compiled_models) == {'random_forest'}
+    scored = models.score(X[:4], 'random_forest')
+    assert np.allclose(scored['probabilities'], models.models['random_forest'].predict_proba(X[:4]))
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+realtime_processor = pytest.importorskip('realtime_processor')
+
+
+class _SocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+class _Emitter:
+    def __init__(self):
+        self.results = []
+        self.alerts = []
+        self.alert_store = None
+
+    def publish(self, result):
+        self.results.append(result)
+
+    def emit_alert(self, alert):
+        self.alerts.append(alert)
+
+
+def test_replay_emits_json_safe_records(tmp_path):
+    dataset = tmp_path / 'flows.csv'
+    dataset.write_text('Flow Duration,Flow Bytes/s,Flow Packets/s,Label\n'
+                       '10,inf,NaN,BENIGN\n'
+                       '0,-inf,5.0,DDoS\n'
+                       '20,300.5,,BENIGN\n')
+    emitter = _Emitter()
+    processor = realtime_processor.RealTimeProcessor(None, None, _SocketIO(), emitter)
+    processor.set_alert_threshold(0.0)
+    processor.start_streaming({'mode': 'replay', 'path': str(dataset), 'speed': 'max'})
+    processor.stream_thread.join(timeout=30)
+
+    assert len(emitter.results) == 3
+    assert len(emitter.alerts) == 3
+    for payload in emitter.results + emitter.alerts:
+        json.dumps(payload, allow_nan=False)
+    assert emitter.results[0]['data']['Flow Bytes/s'] is None
+    assert emitter.results[2]['data']['Flow Bytes/s'] == 300.5
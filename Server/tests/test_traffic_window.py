@@ -0,0 +1,29 @@
+from traffic_window import TrafficWindow
+
+
+def test_time_window_counts_same_host_connections():
+    window = TrafficWindow(time_window=2.0)
+    for i in range(5):
+        features = window.add_connection(100.0 + i * 0.1, '10.0.0.1', 'http', serror=i % 2 == 0)
+    assert features['count'] == 5
+    assert features['serror_rate'] == 3 / 5
+
+
+def test_late_connection_expires_by_start_time():
+    window = TrafficWindow(time_window=2.0)
+    window.add_connection(100.0, '10.0.0.1', 'http')
+    # Completes after a newer one, but started 1.5s earlier
+    window.add_connection(101.5, '10.0.0.1', 'http')
+    window.add_connection(100.1, '10.0.0.1', 'http')
+    features = window.add_connection(102.3, '10.0.0.1', 'http')
+    # 100.0 and 100.1 are past the 2s horizon (100.3); only 101.5 and 102.3 remain
+    assert features['count'] == 2
+    assert window.get_stats()['connections_in_time_window'] == 2
+
+
+def test_connection_window_keeps_the_last_connections():
+    window = TrafficWindow(connection_window=3)
+    for i in range(5):
+        features = window.add_connection(100.0 + i, f'10.0.0.{i % 2}', 'http')
+    assert features['dst_host_count'] == 2
+    assert features['dst_host_srv_count'] == 3
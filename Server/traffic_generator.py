@@ -0,0 +1,317 @@
+"""
+Vectorized synthetic traffic generator.
+
+Produces batches of packets or completed connections as NumPy column arrays
+for a configurable rate, attack mix and host population, so the simulated
+capture mode can load the pipeline at hundreds of thousands of events per
+second. Every event carries an ``attack_type`` ground-truth label.
+
+Run as a script to measure raw generation throughput:
+
+    python traffic_generator.py [packets|flows] [batch_size]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+ATTACK_TYPES = ('normal', 'syn_flood', 'port_scan', 'udp_flood', 'icmp_flood')
+
+DEFAULT_ATTACK_MIX = {
+    'normal': 0.85,
+    'syn_flood': 0.05,
+    'port_scan': 0.04,
+    'udp_flood': 0.03,
+    'icmp_flood': 0.03
+}
+
+TCP_SERVICE_PORTS = np.array([80, 443, 22, 25, 143, 993, 3306, 21])
+TCP_SERVICE_WEIGHTS = np.array([0.35, 0.35, 0.08, 0.06, 0.05, 0.05, 0.04, 0.02])
+UDP_SERVICE_PORTS = np.array([53, 123, 161])
+
+# Flags of normal TCP packets: ACK, PSH|ACK, SYN, FIN|ACK
+NORMAL_TCP_FLAGS = np.array([0x10, 0x18, 0x02, 0x11])
+NORMAL_TCP_FLAG_WEIGHTS = np.array([0.5, 0.35, 0.08, 0.07])
+
+
+def _address_pool(prefix, count):
+    """``count`` dotted-quad strings under a /16 prefix, as an object array"""
+    return np.array([f"{prefix}.{(i >> 8) & 0xFF}.{i & 0xFF}" for i in range(1, count + 1)],
+                    dtype=object)
+
+
+class TrafficGenerator:
+    """Batch generator of labelled synthetic packets and connections.
+
+    ``rate`` is the target number of events per second; ``take(now)`` returns
+    how many events are owed since the previous call so a capture loop can
+    pace itself. ``attack_mix`` maps attack types to their share of events.
+    Clients, servers and attackers are drawn from fixed address pools of the
+    given sizes; pools can be rewritten once with ``map_addresses`` (e.g. to
+    anonymize them) instead of per event.
+    """
+
+    def __init__(self, rate=1000, attack_mix=None, hosts=254, servers=20, attackers=16,
+                 active_connections=4096, seed=None, max_batch=None):
+        self.rate = float(rate)
+        mix = dict(DEFAULT_ATTACK_MIX if attack_mix is None else attack_mix)
+        unknown = set(mix) - set(ATTACK_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown attack types: {sorted(unknown)}")
+        weights = np.array([float(mix.get(name, 0.0)) for name in ATTACK_TYPES])
+        if weights.sum() <= 0:
+            raise ValueError("Attack mix must have a positive weight")
+        self.attack_mix = dict(zip(ATTACK_TYPES, (weights / weights.sum()).tolist()))
+        self.mix_weights = weights / weights.sum()
+        self.active_connections = max(1, int(active_connections))
+        self.max_batch = int(max_batch or max(1000, self.rate * 0.25))
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        self.clients = _address_pool('192.168', max(1, int(hosts)))
+        self.servers = _address_pool('10.0', max(1, int(servers)))
+        self.attackers = _address_pool('172.16', max(1, int(attackers)))
+        # Spoofed sources of floods
+        self.spoofed = _address_pool('203.0', 4096)
+        self.victim = 0  # Index into servers
+
+        self.last_take = None
+        self.carry = 0.0
+        self.stats = {'generated': 0, 'batches': 0, 'capped': 0, 'started_at': None}
+
+    def map_addresses(self, fn):
+        """Rewrite every address pool through ``fn`` (once, not per event)"""
+        for name in ('clients', 'servers', 'attackers', 'spoofed'):
+            pool = getattr(self, name)
+            setattr(self, name, np.array([fn(ip) for ip in pool], dtype=object))
+
+    def take(self, now=None):
+        """Number of events owed at the target rate since the previous call"""
+        now = time.time() if now is None else now
+        if self.last_take is None:
+            self.last_take = now
+            self.stats['started_at'] = now
+            return 0
+        owed = self.carry + (now - self.last_take) * self.rate
+        self.last_take = now
+        count = int(owed)
+        self.carry = owed - count
+        if count > self.max_batch:
+            # Falling behind: don't let the backlog snowball
+            self.stats['capped'] += count - self.max_batch
+            count = self.max_batch
+            self.carry = 0.0
+        return count
+
+    def _common(self, n, start, end):
+        rng = self.rng
+        kind = rng.choice(len(ATTACK_TYPES), size=n, p=self.mix_weights)
+        timestamps = np.sort(rng.uniform(start, end, size=n)) if end > start else np.full(n, float(start))
+
+        # Normal traffic: a client talking to a server over one of a set of
+        # active connections, so packets of one connection share a 5-tuple
+        conn = rng.integers(0, self.active_connections, size=n)
+        src = self.clients[conn % len(self.clients)]
+        dst = self.servers[(conn // len(self.clients)) % len(self.servers)]
+        src_port = 49152 + (conn % 16384)
+        transport = rng.choice(3, size=n, p=[0.8, 0.15, 0.05])  # TCP, UDP, ICMP
+        dst_port = np.where(
+            transport == 0,
+            TCP_SERVICE_PORTS[rng.choice(len(TCP_SERVICE_PORTS), size=n, p=TCP_SERVICE_WEIGHTS)],
+            UDP_SERVICE_PORTS[conn % len(UDP_SERVICE_PORTS)]
+        )
+
+        victim = self.servers[self.victim]
+        masks = {name: kind == i for i, name in enumerate(ATTACK_TYPES)}
+
+        m = masks['syn_flood']
+        count = int(m.sum())
+        if count:
+            src[m] = self.spoofed[rng.integers(0, len(self.spoofed), size=count)]
+            dst[m] = victim
+            src_port[m] = rng.integers(1024, 65536, size=count)
+            dst_port[m] = 80
+            transport[m] = 0
+
+        m = masks['port_scan']
+        count = int(m.sum())
+        if count:
+            src[m] = self.attackers[0]
+            dst[m] = victim
+            src_port[m] = 40000 + rng.integers(0, 16, size=count)
+            dst_port[m] = rng.integers(1, 1025, size=count)
+            transport[m] = 0
+
+        m = masks['udp_flood']
+        count = int(m.sum())
+        if count:
+            src[m] = self.attackers[rng.integers(0, len(self.attackers), size=count)]
+            dst[m] = victim
+            src_port[m] = rng.integers(1024, 65536, size=count)
+            dst_port[m] = rng.integers(1, 65536, size=count)
+            transport[m] = 1
+
+        m = masks['icmp_flood']
+        if m.any():
+            src[m] = self.attackers[rng.integers(0, len(self.attackers), size=int(m.sum()))]
+            dst[m] = victim
+            transport[m] = 2
+
+        icmp = transport == 2
+        src_port[icmp] = 0
+        dst_port[icmp] = 0
+        return kind, masks, timestamps, src, dst, src_port, dst_port, transport
+
+    def generate_packets(self, n, start=None, end=None):
+        """Generate ``n`` packets with timestamps spread over [start, end] as column arrays"""
+        rng = self.rng
+        end = time.time() if end is None else end
+        start = end if start is None else start
+        kind, masks, timestamps, src, dst, src_port, dst_port, transport = self._common(n, start, end)
+
+        size = np.clip(rng.lognormal(6.0, 1.0, size=n), 40, 1500).astype(np.int64)
+        flags = NORMAL_TCP_FLAGS[rng.choice(len(NORMAL_TCP_FLAGS), size=n, p=NORMAL_TCP_FLAG_WEIGHTS)]
+
+        # Half of normal TCP/UDP packets are server responses
+        response = masks['normal'] & (transport != 2) & (rng.random(n) < 0.5)
+        src, dst = np.where(response, dst, src), np.where(response, src, dst)
+        src_port, dst_port = np.where(response, dst_port, src_port), np.where(response, src_port, dst_port)
+        flags = np.where(response & (flags == 0x02), 0x12, flags)  # SYN -> SYN|ACK
+
+        syn_only = masks['syn_flood'] | masks['port_scan']
+        flags[syn_only] = 0x02
+        size[syn_only] = 60
+        flood = masks['udp_flood']
+        size[flood] = rng.integers(512, 1473, size=int(flood.sum()))
+        icmp = transport == 2
+        size[icmp] = rng.integers(84, 1500, size=int(icmp.sum()))
+        flags[transport != 0] = 0
+
+        self._account(n)
+        return {
+            'timestamp': timestamps,
+            'src_ip': src,
+            'dst_ip': dst,
+            'src_port': src_port,
+            'dst_port': dst_port,
+            'protocol': np.array([6, 17, 1])[transport],
+            'transport_protocol': np.array(['TCP', 'UDP', 'ICMP'], dtype=object)[transport],
+            'tcp_flags': flags,
+            'packet_size': size,
+            'ttl': rng.integers(32, 129, size=n),
+            'ip_version': np.full(n, 4),
+            'attack_type': np.array(ATTACK_TYPES, dtype=object)[kind]
+        }
+
+    def generate_flows(self, n, start=None, end=None):
+        """Generate ``n`` completed connections (connection-log style records) as column arrays"""
+        rng = self.rng
+        end = time.time() if end is None else end
+        start = end if start is None else start
+        kind, masks, timestamps, src, dst, src_port, dst_port, transport = self._common(n, start, end)
+
+        duration = rng.exponential(2.0, size=n)
+        src_packets = 1 + rng.poisson(6, size=n)
+        dst_packets = 1 + rng.poisson(8, size=n)
+        src_bytes = (src_packets * np.clip(rng.lognormal(5.0, 1.0, size=n), 40, 1500)).astype(np.int64)
+        dst_bytes = (dst_packets * np.clip(rng.lognormal(6.5, 1.0, size=n), 40, 1500)).astype(np.int64)
+        conn_state = np.full(n, 'SF', dtype=object)
+
+        half_open = masks['syn_flood'] | masks['port_scan']
+        duration[half_open] = 0.0
+        src_packets[half_open] = 1
+        src_bytes[half_open] = 60
+        dst_packets[masks['syn_flood']] = 0
+        dst_bytes[masks['syn_flood']] = 0
+        conn_state[masks['syn_flood']] = 'S0'
+        # Most probed ports are closed and answer with a RST
+        dst_packets[masks['port_scan']] = 1
+        dst_bytes[masks['port_scan']] = 54
+        conn_state[masks['port_scan']] = 'REJ'
+
+        one_way = masks['udp_flood'] | masks['icmp_flood']
+        count = int(one_way.sum())
+        duration[one_way] = 0.0
+        src_packets[one_way] = 1
+        src_bytes[one_way] = rng.integers(512, 1500, size=count)
+        dst_packets[one_way] = 0
+        dst_bytes[one_way] = 0
+
+        self._account(n)
+        return {
+            'timestamp': timestamps,
+            'duration': duration,
+            'src_ip': src,
+            'dst_ip': dst,
+            'src_port': src_port,
+            'dst_port': dst_port,
+            'protocol': np.array([6, 17, 1])[transport],
+            'transport_protocol': np.array(['TCP', 'UDP', 'ICMP'], dtype=object)[transport],
+            'src_bytes': src_bytes,
+            'dst_bytes': dst_bytes,
+            'src_packets': src_packets,
+            'dst_packets': dst_packets,
+            'conn_state': conn_state,
+            'attack_type': np.array(ATTACK_TYPES, dtype=object)[kind]
+        }
+
+    def _account(self, n):
+        self.stats['generated'] += n
+        self.stats['batches'] += 1
+
+    @staticmethod
+    def to_records(batch):
+        """Convert a column batch into a list of plain-Python dicts"""
+        columns = list(batch)
+        return [dict(zip(columns, row))
+                for row in zip(*(batch[column].tolist() for column in columns))]
+
+    def get_stats(self):
+        """Get generator settings and the rate achieved so far"""
+        started = self.stats['started_at']
+        elapsed = (self.last_take - started) if started is not None else 0.0
+        return {
+            'target_rate': self.rate,
+            'attack_mix': self.attack_mix,
+            'hosts': len(self.clients),
+            'servers': len(self.servers),
+            'attackers': len(self.attackers),
+            'seed': self.seed,
+            'generated': self.stats['generated'],
+            'batches': self.stats['batches'],
+            'capped': self.stats['capped'],
+            'achieved_rate': self.stats['generated'] / elapsed if elapsed > 0 else 0.0
+        }
+
+
+def benchmark(unit='packets', batch_size=100000, rounds=10):
+    """Measure generation plus conversion to dicts, in events per second"""
+    generator = TrafficGenerator(seed=0)
+    generate = generator.generate_flows if unit == 'flows' else generator.generate_packets
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        batch = generate(batch_size)
+    generate_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        TrafficGenerator.to_records(batch)
+    convert_elapsed = time.perf_counter() - started
+
+    total = batch_size * rounds
+    return {
+        'unit': unit,
+        'events': total,
+        'generate_events_per_second': total / generate_elapsed,
+        'to_records_events_per_second': total / convert_elapsed,
+        'end_to_end_events_per_second': total / (generate_elapsed + convert_elapsed)
+    }
+
+
+if __name__ == '__main__':
+    unit = sys.argv[1] if len(sys.argv) > 1 else 'packets'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    for key, value in benchmark(unit, size).items():
+        print(f"{key}: {value}")
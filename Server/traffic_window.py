@@ -0,0 +1,179 @@
+import heapq
+import threading
+from collections import deque
+
+
+class _WindowCounters:
+    """Running per-host/per-service counters over the records currently in a window.
+
+    Records are (timestamp, dst_host, service, src_port, serror, rerror). Adding
+    or removing a record touches a fixed number of dictionary entries, so the
+    features of a new connection never require rescanning the window.
+    """
+
+    def __init__(self):
+        self.records = deque()
+        self.host = {}          # dst_host -> [count, serror, rerror]
+        self.service = {}       # service -> [count, serror, rerror]
+        self.host_service = {}  # (dst_host, service) -> count
+        self.host_src_port = {} # (dst_host, src_port) -> count
+
+    def add(self, record):
+        self.records.append(record)
+        self._count(record, 1)
+
+    def pop_oldest(self):
+        self._count(self.records.popleft(), -1)
+
+    def oldest_time(self):
+        return self.records[0][0]
+
+    def _count(self, record, delta):
+        _, host, service, src_port, serror, rerror = record
+        self._bump(self.host, host, delta, serror, rerror)
+        self._bump(self.service, service, delta, serror, rerror)
+        self._inc(self.host_service, (host, service), delta)
+        self._inc(self.host_src_port, (host, src_port), delta)
+
+    @staticmethod
+    def _bump(table, key, delta, serror, rerror):
+        counts = table.get(key)
+        if counts is None:
+            counts = table[key] = [0, 0, 0]
+        counts[0] += delta
+        if serror:
+            counts[1] += delta
+        if rerror:
+            counts[2] += delta
+        if counts[0] <= 0:
+            del table[key]
+
+    @staticmethod
+    def _inc(table, key, delta):
+        value = table.get(key, 0) + delta
+        if value <= 0:
+            table.pop(key, None)
+        else:
+            table[key] = value
+
+    def __len__(self):
+        return len(self.records)
+
+
+class _TimeOrderedCounters(_WindowCounters):
+    """Window counters whose oldest record is the one with the earliest timestamp.
+
+    Connections complete out of start order, so records are kept in a heap
+    keyed by timestamp (with an arrival sequence as tie-breaker) rather than
+    in arrival order; a late, older connection then expires on time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.sequence = 0
+
+    def add(self, record):
+        heapq.heappush(self.records, (record[0], self.sequence, record))
+        self.sequence += 1
+        self._count(record, 1)
+
+    def pop_oldest(self):
+        self._count(heapq.heappop(self.records)[2], -1)
+
+
+class TrafficWindow:
+    """Incremental KDD traffic features.
+
+    Keeps two sliding windows over completed connections: a time window
+    (connections in the last ``time_window`` seconds, the KDD 'same host' and
+    'same service' features) and a connection window (the last
+    ``connection_window`` connections, the KDD 'dst_host_*' features).
+    Each new connection updates the connection window in amortized O(1) and
+    the time window in O(log n), since the time window expires by timestamp.
+    """
+
+    def __init__(self, time_window=2.0, connection_window=100):
+        self.time_window = time_window
+        self.connection_window = connection_window
+        self.time_counters = _TimeOrderedCounters()
+        self.conn_counters = _WindowCounters()
+        self.latest_time = 0.0
+        self.total_connections = 0
+        self.lock = threading.Lock()
+
+    def add_connection(self, timestamp, dst_host, service, src_port=0,
+                       serror=False, rerror=False):
+        """Record a connection and return its traffic-window features"""
+        record = (timestamp, dst_host, service, src_port, bool(serror), bool(rerror))
+
+        with self.lock:
+            self.total_connections += 1
+
+            # Connections can complete out of order; the window trails the newest one
+            if timestamp > self.latest_time:
+                self.latest_time = timestamp
+            horizon = self.latest_time - self.time_window
+
+            tc = self.time_counters
+            tc.add(record)
+            while tc.records and tc.oldest_time() < horizon:
+                tc.pop_oldest()
+
+            cc = self.conn_counters
+            cc.add(record)
+            while len(cc) > self.connection_window:
+                cc.pop_oldest()
+
+            return self._features(dst_host, service, src_port)
+
+    def _features(self, host, service, src_port):
+        tc = self.time_counters
+        count, serror, rerror = tc.host.get(host, (0, 0, 0))
+        srv_count, srv_serror, srv_rerror = tc.service.get(service, (0, 0, 0))
+        same_host_srv = tc.host_service.get((host, service), 0)
+
+        cc = self.conn_counters
+        dh_count, dh_serror, dh_rerror = cc.host.get(host, (0, 0, 0))
+        dh_srv_count, dh_srv_serror, dh_srv_rerror = cc.service.get(service, (0, 0, 0))
+        dh_same_srv = cc.host_service.get((host, service), 0)
+        dh_same_src_port = cc.host_src_port.get((host, src_port), 0)
+
+        same_srv_rate = _rate(same_host_srv, count)
+        dst_host_same_srv_rate = _rate(dh_same_srv, dh_count)
+
+        return {
+            'count': count,
+            'srv_count': srv_count,
+            'serror_rate': _rate(serror, count),
+            'srv_serror_rate': _rate(srv_serror, srv_count),
+            'rerror_rate': _rate(rerror, count),
+            'srv_rerror_rate': _rate(srv_rerror, srv_count),
+            'same_srv_rate': same_srv_rate,
+            'diff_srv_rate': 1.0 - same_srv_rate if count else 0.0,
+            'srv_diff_host_rate': _rate(srv_count - same_host_srv, srv_count),
+            'dst_host_count': dh_count,
+            'dst_host_srv_count': dh_srv_count,
+            'dst_host_same_srv_rate': dst_host_same_srv_rate,
+            'dst_host_diff_srv_rate': 1.0 - dst_host_same_srv_rate if dh_count else 0.0,
+            'dst_host_same_src_port_rate': _rate(dh_same_src_port, dh_count),
+            'dst_host_srv_diff_host_rate': _rate(dh_srv_count - dh_same_srv, dh_srv_count),
+            'dst_host_serror_rate': _rate(dh_serror, dh_count),
+            'dst_host_srv_serror_rate': _rate(dh_srv_serror, dh_srv_count),
+            'dst_host_rerror_rate': _rate(dh_rerror, dh_count),
+            'dst_host_srv_rerror_rate': _rate(dh_srv_rerror, dh_srv_count)
+        }
+
+    def get_stats(self):
+        """Get window sizes and counters"""
+        return {
+            'time_window': self.time_window,
+            'connection_window': self.connection_window,
+            'connections_in_time_window': len(self.time_counters),
+            'tracked_hosts': len(self.conn_counters.host),
+            'total_connections': self.total_connections
+        }
+
+
+def _rate(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
@@ -0,0 +1,296 @@
+import numpy as np
+
+
+class CompiledTreeEnsemble:
+    """A fitted tree ensemble flattened into contiguous NumPy node arrays.
+
+    Every tree of a random forest / decision tree, XGBoost or LightGBM
+    classifier is laid out in one set of arrays: split feature, threshold,
+    child pair (left, right), the direction missing values take, and leaf
+    values. Leaves point to themselves, so all trees of all rows advance one
+    level per step with a handful of vectorized ``take`` calls and no
+    per-tree Python, for one row or a whole batch. Outputs reproduce the
+    source model's ``predict_proba``; ``compile_model`` returns None for
+    models (or features, e.g. categorical splits) it can't reproduce.
+    """
+
+    def __init__(self, source, classes, feature, threshold, children, nan_right, values, roots,
+                 max_depth, link, base=None, strict=False, float32=False, scale=1.0):
+        self.source = source
+        self.classes_ = np.asarray(classes)
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.children = np.asarray(children, dtype=np.intp).ravel()  # [left, right] per node
+        self.nan_right = np.asarray(nan_right, dtype=bool)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.link = link  # 'mean', 'sigmoid' or 'softmax'
+        self.base = np.zeros(self.values.shape[1]) if base is None else np.asarray(base, dtype=np.float64)
+        self.strict = strict  # XGBoost goes left on x < threshold, the others on x <= threshold
+        self.float32 = float32  # Source compares in single precision
+        self.scale = scale
+        self.n_features = None
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def leaves(self, X):
+        """Leaf node reached in every tree for every row: shape (rows, trees)"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.float32:
+            X = X.astype(np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        nodes = np.tile(self.roots, (n_rows, 1))
+        offsets = None if n_rows == 1 else (np.arange(n_rows) * n_features)[:, None]
+        has_nan = np.isnan(flat).any()
+
+        for _ in range(self.max_depth):
+            index = self.feature.take(nodes)
+            if offsets is not None:
+                index += offsets
+            x = flat.take(index)
+            thresholds = self.threshold.take(nodes)
+            right = x >= thresholds if self.strict else x > thresholds
+            if has_nan:
+                missing = np.isnan(x)
+                right[missing] = self.nan_right.take(nodes[missing])
+            nodes *= 2
+            nodes += right
+            nodes = self.children.take(nodes)
+        return nodes
+
+    def predict_proba(self, X):
+        raw = self.values.take(self.leaves(X), axis=0).sum(axis=1)
+        if self.link == 'mean':
+            return raw / len(self.roots)
+        raw = (raw + self.base) * self.scale
+        if self.link == 'sigmoid':
+            positive = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        raw -= raw.max(axis=1, keepdims=True)
+        exp = np.exp(raw)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class CompiledLinearModel:
+    """A fitted logistic regression as a coefficient matrix: one matmul per call.
+
+    Skips the library's per-call input validation, which dominates the cost
+    of scoring a single row.
+    """
+
+    def __init__(self, source, classes, coef, intercept):
+        self.source = source
+        self.classes_ = np.asarray(classes)
+        self.coef = np.asarray(coef, dtype=np.float64).T
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.max_depth = 0
+
+    @property
+    def n_nodes(self):
+        return 0
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        raw = X @ self.coef + self.intercept
+        if raw.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        raw -= raw.max(axis=1, keepdims=True)
+        exp = np.exp(raw)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class _Builder:
+    """Accumulates trees into the flat arrays"""
+
+    def __init__(self, n_outputs):
+        self.n_outputs = n_outputs
+        self.feature, self.threshold, self.children, self.nan_right, self.values = [], [], [], [], []
+        self.roots = []
+        self.max_depth = 0
+        self.size = 0
+
+    def add_tree(self, feature, threshold, left, right, nan_right, values, depth):
+        """Add one tree given per-node arrays (local ids, -1 children for leaves)"""
+        offset = self.size
+        n = len(feature)
+        local = np.arange(n)
+        is_leaf = np.asarray(left) < 0
+        left = np.where(is_leaf, local, left) + offset
+        right = np.where(is_leaf, local, right) + offset
+        self.feature.append(np.where(is_leaf, 0, feature))
+        self.threshold.append(np.where(is_leaf, 0.0, threshold))
+        self.children.append(np.column_stack([left, right]))
+        self.nan_right.append(np.asarray(nan_right, dtype=bool))
+        self.values.append(np.asarray(values, dtype=np.float64).reshape(n, self.n_outputs))
+        self.roots.append(offset)
+        self.max_depth = max(self.max_depth, depth)
+        self.size += n
+
+    def build(self, source, classes, link, **kwargs):
+        return CompiledTreeEnsemble(
+            source, classes,
+            np.concatenate(self.feature), np.concatenate(self.threshold),
+            np.concatenate(self.children), np.concatenate(self.nan_right),
+            np.concatenate(self.values), self.roots, self.max_depth, link, **kwargs
+        )
+
+
+def _compile_sklearn(model):
+    trees = model.estimators_ if hasattr(model, 'estimators_') else [model]
+    builder = _Builder(len(model.classes_))
+    for estimator in trees:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :]
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+        missing_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool))
+        builder.add_tree(tree.feature, tree.threshold, tree.children_left, tree.children_right,
+                         ~np.asarray(missing_left, dtype=bool), value, tree.max_depth)
+    # sklearn casts inputs to float32 and compares them with float64 thresholds
+    return builder.build(model, model.classes_, 'mean', float32=True)
+
+
+def _flatten_nodes(root, is_leaf, children_of):
+    """Breadth-first local numbering of a nested tree; returns (nodes, depth)"""
+    nodes = [root]
+    depths = [0]
+    ids = {id(root): 0}
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        if not is_leaf(node):
+            for child in children_of(node):
+                ids[id(child)] = len(nodes)
+                nodes.append(child)
+                depths.append(depths[i] + 1)
+        i += 1
+    return nodes, ids, max(depths)
+
+
+def _compile_lightgbm(model):
+    dump = model.booster_.dump_model()
+    objective = dump.get('objective', '')
+    n_classes = len(model.classes_)
+    if objective.startswith('binary'):
+        link, n_outputs = 'sigmoid', 1
+        scale = 1.0
+        for part in objective.split():
+            if part.startswith('sigmoid:'):
+                scale = float(part.split(':', 1)[1])
+    elif objective.startswith('multiclass') and not objective.startswith('multiclassova'):
+        link, n_outputs, scale = 'softmax', n_classes, 1.0
+    else:
+        return None
+    per_iteration = dump.get('num_tree_per_iteration', 1)
+
+    builder = _Builder(n_outputs)
+    for t, info in enumerate(dump['tree_info']):
+        nodes, ids, depth = _flatten_nodes(info['tree_structure'], lambda n: 'leaf_value' in n,
+                                           lambda n: (n['left_child'], n['right_child']))
+        n = len(nodes)
+        feature, threshold = np.zeros(n, dtype=np.intp), np.zeros(n)
+        left, right = np.full(n, -1), np.full(n, -1)
+        nan_right = np.zeros(n, dtype=bool)
+        values = np.zeros((n, n_outputs))
+        for i, node in enumerate(nodes):
+            if 'leaf_value' in node:
+                values[i, t % per_iteration if n_outputs > 1 else 0] = node['leaf_value']
+                continue
+            if node.get('decision_type') != '<=' or node.get('missing_type') == 'Zero':
+                return None  # Categorical splits / zero-as-missing aren't reproduced
+            feature[i] = node['split_feature']
+            threshold[i] = node['threshold']
+            left[i], right[i] = ids[id(node['left_child'])], ids[id(node['right_child'])]
+            if node.get('missing_type') == 'NaN':
+                nan_right[i] = not node.get('default_left', True)
+            else:
+                # No missing values seen in training: NaN is treated as 0.0
+                nan_right[i] = not 0.0 <= node['threshold']
+        builder.add_tree(feature, threshold, left, right, nan_right, values, depth)
+    return builder.build(model, model.classes_, link, scale=scale)
+
+
+def _compile_xgboost(model):
+    import json
+    booster = model.get_booster()
+    n_classes = len(model.classes_)
+    n_outputs = 1 if n_classes == 2 else n_classes
+    names = booster.feature_names
+    index_of = {name: i for i, name in enumerate(names)} if names else {}
+
+    def feature_index(split):
+        if split in index_of:
+            return index_of[split]
+        return int(split[1:]) if split.startswith('f') and split[1:].isdigit() else int(split)
+
+    builder = _Builder(n_outputs)
+    for t, text in enumerate(booster.get_dump(dump_format='json')):
+        tree = json.loads(text)
+        nodes, ids, depth = _flatten_nodes(tree, lambda n: 'leaf' in n, lambda n: n['children'])
+        by_nodeid = {node['nodeid']: ids[id(node)] for node in nodes}
+        n = len(nodes)
+        feature, threshold = np.zeros(n, dtype=np.intp), np.zeros(n)
+        left, right = np.full(n, -1), np.full(n, -1)
+        nan_right = np.zeros(n, dtype=bool)
+        values = np.zeros((n, n_outputs))
+        for i, node in enumerate(nodes):
+            if 'leaf' in node:
+                values[i, t % n_outputs] = node['leaf']
+                continue
+            if 'split_condition' not in node:
+                return None  # Categorical split
+            feature[i] = feature_index(node['split'])
+            threshold[i] = np.float32(node['split_condition'])
+            left[i], right[i] = by_nodeid[node['yes']], by_nodeid[node['no']]
+            nan_right[i] = node['missing'] != node['yes']
+        builder.add_tree(feature, threshold, left, right, nan_right, values, depth)
+
+    compiled = builder.build(model, model.classes_, 'sigmoid' if n_outputs == 1 else 'softmax',
+                             strict=True, float32=True)
+    # The base margin (base_score) is whatever the booster adds on top of the leaves
+    probe = np.zeros((1, booster.num_features()))
+    import xgboost as xgb
+    margin = booster.predict(xgb.DMatrix(probe, feature_names=names), output_margin=True)
+    leaves = compiled.values.take(compiled.leaves(probe), axis=0).sum(axis=1)
+    compiled.base = np.asarray(margin, dtype=np.float64).reshape(1, -1)[0] - leaves[0]
+    return compiled
+
+
+def compile_model(model):
+    """Compile a fitted tree classifier (or logistic regression), or return None if unsupported"""
+    module = type(model).__module__
+    try:
+        name = type(model).__name__
+        if name in ('LogisticRegression', 'SGDClassifier') and module.startswith('sklearn'):
+            if len(model.classes_) > 2 and (getattr(model, 'multi_class', 'auto') == 'ovr' or
+                                            name == 'SGDClassifier'):
+                return None  # One-vs-rest probabilities aren't a softmax
+            if name == 'SGDClassifier' and model.loss != 'log_loss':
+                return None
+            return CompiledLinearModel(model, model.classes_, model.coef_, model.intercept_)
+        if module.startswith('sklearn') and (hasattr(model, 'tree_') or (
+                hasattr(model, 'estimators_') and hasattr(np.ravel(model.estimators_)[0], 'tree_'))):
+            if getattr(model, 'n_outputs_', 1) != 1:
+                return None
+            return _compile_sklearn(model)
+        if module.startswith('lightgbm') or type(getattr(model, 'booster_', None)).__module__.startswith('lightgbm'):
+            return _compile_lightgbm(model)
+        if module.startswith('xgboost'):
+            return _compile_xgboost(model)
+    except Exception as e:
+        print(f"Tree compilation error for {type(model).__name__}: {e}")
+    return None